@@ -0,0 +1,224 @@
+from collections import deque
+from typing import Deque, Dict, List, Optional
+import math
+import time
+
+
+# wall clock epoch sampled once, advanced by the monotonic clock. Server time
+# can't step backwards or jump when the OS adjusts its clock mid session.
+_ANCHOR_WALL_NS = time.time_ns()
+_ANCHOR_MONO_NS = time.monotonic_ns()
+
+def now_us() -> int:
+    return (_ANCHOR_WALL_NS + time.monotonic_ns() - _ANCHOR_MONO_NS) // 1_000
+
+
+
+HISTORY_LEN = 64 # samples kept per session
+FILTER_LEN = 8 # like NTP's clock filter, the best of the last 8 samples wins
+MIN_DRIFT_SPAN_MS = 30_000 # drift is not estimated over shorter windows
+MAX_DRIFT_PPM = 500 # anything beyond this is noise, not a crystal
+ERROR_REF_MS = 5.0 # error at which confidence drops to one half
+DELIVERY_PROBABILITY = 0.999 # that every START of a group arrives before its trigger time
+MAX_SYNC_AGE_MS = 10_000 # older estimates don't count, their recorder is stale
+SAFETY_MS = 30 # fan-out and recorder-side scheduling
+
+
+class SyncSample:
+    __slots__ = ('t', 'theta', 'rtt')
+    def __init__(self, t: int, theta: float, rtt: float):
+        self.t: int = t # server time the report arrived, ms
+        self.theta: float = theta
+        self.rtt: float = rtt
+
+
+class SyncEstimate:
+    __slots__ = ('t', 'updated', 'theta', 'rtt', 'rtt_p50', 'rtt_p99', 'drift_ppm', 'error_ms', 'confidence', 'samples')
+    def __init__(
+        self,
+        t: int,
+        updated: int,
+        theta: float,
+        rtt: float,
+        rtt_p50: float,
+        rtt_p99: float,
+        drift_ppm: float,
+        error_ms: float,
+        confidence: float,
+        samples: int
+    ):
+        self.t: int = t # server time of the selected sample
+        self.updated: int = updated # server time of the newest sample
+        self.theta: float = theta
+        self.rtt: float = rtt # of the selected sample
+        self.rtt_p50: float = rtt_p50 # over the whole history
+        self.rtt_p99: float = rtt_p99
+        self.drift_ppm: float = drift_ppm
+        self.error_ms: float = error_ms
+        self.confidence: float = confidence
+        self.samples: int = samples
+
+
+    # offset extrapolated to server time `at` using the drift estimate
+    def theta_at(self, at: int) -> float:
+        return self.theta + self.drift_ppm * 1e-6 * (at - self.t)
+
+
+
+# keeps a ring buffer of (theta, rtt) reports of one recorder and turns them
+# into a filtered offset, a drift rate and a confidence figure.
+class ClockEstimator:
+    def __init__(self, history: int = HISTORY_LEN):
+        self._samples: Deque[SyncSample] = deque(maxlen=history)
+        self.estimate: Optional[SyncEstimate] = None
+
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+
+    def add(self, t: int, theta: float, rtt: float) -> Optional[SyncEstimate]:
+        if rtt < 0 or not math.isfinite(theta) or not math.isfinite(rtt):
+            return self.estimate
+        self._samples.append(SyncSample(t, theta, rtt))
+        self.estimate = self._evaluate()
+        return self.estimate
+
+
+    def _evaluate(self) -> SyncEstimate:
+        recent = list(self._samples)[-FILTER_LEN:]
+        # the sample with the smallest rtt had the least queuing delay, so its
+        # theta carries the smallest asymmetry error
+        best = min(recent, key=lambda s: s.rtt)
+        drift = self._drift()
+        rtts = sorted(s.rtt for s in self._samples)
+
+        jitter = math.sqrt(
+            sum((s.theta - best.theta) ** 2 for s in recent) / len(recent)
+        )
+        error = best.rtt / 2 + jitter
+        confidence = (
+            min(1.0, len(recent) / FILTER_LEN)
+            * ERROR_REF_MS / (ERROR_REF_MS + error)
+        )
+
+        return SyncEstimate(
+            t=best.t,
+            updated=recent[-1].t,
+            theta=best.theta,
+            rtt=best.rtt,
+            rtt_p50=_percentile(rtts, 0.50),
+            rtt_p99=_percentile(rtts, 0.99),
+            drift_ppm=drift,
+            error_ms=error,
+            confidence=confidence,
+            samples=len(self._samples)
+        )
+
+
+    # least squares slope of theta over time, fitted only on the minimum-rtt
+    # sample of every FILTER_LEN block so congested samples don't bias it
+    def _drift(self) -> float:
+        samples = list(self._samples)
+        points: List[SyncSample] = [
+            min(samples[i:i + FILTER_LEN], key=lambda s: s.rtt)
+            for i in range(0, len(samples), FILTER_LEN)
+        ]
+        if len(points) < 3 or points[-1].t - points[0].t < MIN_DRIFT_SPAN_MS:
+            return 0.0
+
+        n = len(points)
+        mean_t = sum(p.t for p in points) / n
+        mean_theta = sum(p.theta for p in points) / n
+        var = sum((p.t - mean_t) ** 2 for p in points)
+        if var == 0:
+            return 0.0
+        cov = sum((p.t - mean_t) * (p.theta - mean_theta) for p in points)
+
+        ppm = cov / var * 1e6
+        return max(-MAX_DRIFT_PPM, min(MAX_DRIFT_PPM, ppm))
+
+
+
+def _percentile(ordered: List[float], q: float) -> float:
+    pos = q * (len(ordered) - 1)
+    lo = int(pos)
+    hi = min(lo + 1, len(ordered) - 1)
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (pos - lo)
+
+
+
+class TriggerPlan:
+    __slots__ = ('trigger_time', 'lead_ms', 'stale')
+    def __init__(self, trigger_time: int, lead_ms: int, stale: List[str]):
+        self.trigger_time: int = trigger_time
+        self.lead_ms: int = lead_ms
+        self.stale: List[str] = stale # targeted, but unsynced or synced too long ago
+
+
+
+# picks the smallest lead time for which every targeted recorder receives the
+# START before its trigger time with at least `delivery_probability`. A stale
+# target has no estimate to go by: any group with one gets default_lead_ms
+# at least, whatever its synced members would need.
+class TriggerScheduler:
+    def __init__(
+        self,
+        delivery_probability: float = DELIVERY_PROBABILITY,
+        max_sync_age_ms: int = MAX_SYNC_AGE_MS,
+        min_samples: int = 4,
+        safety_ms: int = SAFETY_MS,
+        min_lead_ms: int = 100,
+        default_lead_ms: int = 800, # used for stale targets
+    ):
+        self.delivery_probability = delivery_probability
+        self.max_sync_age_ms = max_sync_age_ms
+        self.min_samples = min_samples
+        self.safety_ms = safety_ms
+        self.min_lead_ms = min_lead_ms
+        self.default_lead_ms = default_lead_ms
+
+
+    def plan(
+        self,
+        now: int,
+        session_ids: List[str],
+        estimates: Dict[str, SyncEstimate]
+    ) -> TriggerPlan:
+        usable: List[SyncEstimate] = []
+        stale: List[str] = []
+        for sid in session_ids:
+            est = estimates.get(sid)
+            if (
+                not est
+                or est.samples < self.min_samples
+                or now - est.updated > self.max_sync_age_ms
+            ):
+                stale.append(sid)
+            else:
+                usable.append(est)
+
+        if not usable:
+            lead = self.default_lead_ms
+        else:
+            # independent deliveries: all n succeed with p when each succeeds with p^(1/n)
+            q = self.delivery_probability ** (1 / len(usable))
+            lead = max(self._lead(est, q) for est in usable)
+            lead = max(self.min_lead_ms, math.ceil(lead + self.safety_ms))
+            if stale:
+                lead = max(lead, self.default_lead_ms)
+
+        return TriggerPlan(trigger_time=now + lead, lead_ms=lead, stale=stale)
+
+
+    # one-way delay quantile from a shifted exponential tail fitted through
+    # the p50 and p99 of rtt/2, plus the offset error of the recorder's clock
+    @staticmethod
+    def _lead(est: SyncEstimate, q: float) -> float:
+        p50 = est.rtt_p50 / 2
+        p99 = est.rtt_p99 / 2
+        if q <= 0.5:
+            delay = p50
+        else:
+            delay = p50 + (p99 - p50) * math.log(0.5 / (1 - q)) / math.log(50)
+        return delay + est.error_ms
@@ -0,0 +1,108 @@
+import os
+import shutil
+import struct
+import subprocess
+import wave
+import numpy as np
+from backend.enhance import EnhanceLevel
+from backend.audio import pcm_to_mono
+from backend.merge import wav_info
+
+# the worker process side of backend.enhance: a spectral gate, one chunk of
+# a recording at a time
+
+NOISE_PROFILE_S = 30 # audio analysed for the noise floor
+N_FFT = 1024
+HOP = N_FFT // 4
+HIGHPASS_HZ = 80
+
+# (noise over-subtraction, gain floor) of the spectral gate
+_LEVELS = {
+    EnhanceLevel.LOW: (1.0, 0.30),
+    EnhanceLevel.MEDIUM: (1.5, 0.15),
+    EnhanceLevel.HIGH: (2.0, 0.08),
+}
+
+
+def _wav_header(rate: int, frames: int) -> bytes:
+    data = frames * 2
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 36 + data, b"WAVE",
+        b"fmt ", 16, 1, 1, rate, rate * 2, 2, 16,
+        b"data", data
+    )
+
+_HEADER_SIZE = len(_wav_header(0, 0))
+
+
+def _read(path: str, start: int, frames: int) -> np.ndarray:
+    with wave.open(path, "rb") as w:
+        start = min(start, w.getnframes())
+        w.setpos(start)
+        return pcm_to_mono(w.readframes(frames), w.getsampwidth(), w.getnchannels())
+
+
+def _stft(x: np.ndarray) -> np.ndarray:
+    if len(x) < N_FFT:
+        x = np.pad(x, (0, N_FFT - len(x)))
+    frames = np.lib.stride_tricks.sliding_window_view(x, N_FFT)[::HOP]
+    return np.fft.rfft(frames * np.hanning(N_FFT), axis=1)
+
+
+def _istft(spec: np.ndarray, length: int) -> np.ndarray:
+    win = np.hanning(N_FFT)
+    frames = np.fft.irfft(spec, N_FFT, axis=1) * win
+    size = max(length, (len(frames) - 1) * HOP + N_FFT)
+    out = np.zeros(size)
+    norm = np.zeros(size)
+    for i, frame in enumerate(frames):
+        out[i * HOP: i * HOP + N_FFT] += frame
+        norm[i * HOP: i * HOP + N_FFT] += win ** 2
+    return (out / np.maximum(norm, 1e-8))[:length]
+
+
+# decodes the source to a wav the chunks can seek in and estimates the
+# noise floor from the quietest frames of its beginning
+def prepare(src: str, decoded: str, out: str):
+    info = wav_info(src)
+    if info is None:
+        ffmpeg = shutil.which("ffmpeg")
+        if not ffmpeg:
+            raise RuntimeError(f"ffmpeg is needed to decode {os.path.basename(src)}")
+        subprocess.run([ffmpeg, "-v", "error", "-y", "-i", src, "-ac", "1", "-c:a", "pcm_s16le", decoded], check=True)
+        src = decoded
+        info = wav_info(src)
+        assert info
+
+    rate = info[0]
+    with wave.open(src, "rb") as w:
+        frames = w.getnframes()
+
+    mag = np.abs(_stft(_read(src, 0, NOISE_PROFILE_S * rate)))
+    noise = np.percentile(mag, 10, axis=0)
+
+    # the output is written in place by the chunks, in any order
+    with open(out, "wb") as f:
+        f.write(_wav_header(rate, frames))
+        f.truncate(_HEADER_SIZE + frames * 2)
+    return src, rate, frames, noise
+
+
+def enhance_chunk(src: str, out: str, rate: int, start: int, length: int, noise: np.ndarray, level: EnhanceLevel):
+    # read a little around the chunk so its edges get full overlap-add
+    pad = N_FFT
+    begin = max(0, start - pad)
+    x = _read(src, begin, start - begin + length + pad).astype(np.float64)
+
+    spec = _stft(x)
+    over, floor = _LEVELS[level]
+    mag = np.abs(spec)
+    mask = np.clip((mag - over * noise) / np.maximum(mag, 1e-12), floor, 1.0)
+    mask[:, : int(HIGHPASS_HZ * N_FFT / rate) + 1] = 0
+    y = _istft(spec * mask, len(x))[start - begin: start - begin + length]
+
+    pcm = (np.clip(y, -1.0, 1.0) * 32767).astype("<i2")
+    with open(out, "r+b") as f:
+        f.seek(_HEADER_SIZE + start * 2)
+        f.write(pcm.tobytes())
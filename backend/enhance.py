@@ -0,0 +1,280 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from enum import Enum
+from typing import TYPE_CHECKING, Awaitable, Callable, Dict, List, Optional, Tuple
+import asyncio
+import math
+import multiprocessing
+import os
+import time
+import uuid
+from pydantic import BaseModel
+from backend.recordings import JobStatus
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+CHUNK_S = 10 # seconds of audio per unit of work, the granularity of progress and preemption
+
+
+class EnhanceLevel(str, Enum):
+    LOW = "low"
+    MEDIUM = "medium"
+    HIGH = "high"
+
+
+class EnhanceLane(str, Enum):
+    INTERACTIVE = "interactive" # a single recording the user is waiting for
+    BATCH = "batch" # "enhance all", runs when nothing interactive is queued
+
+_LANES = (EnhanceLane.INTERACTIVE, EnhanceLane.BATCH)
+
+
+class EnhanceRequest(BaseModel):
+    level: EnhanceLevel = EnhanceLevel.MEDIUM
+
+
+class EnhanceJob(BaseModel):
+    id: str
+    recording_id: str
+    lane: EnhanceLane
+    level: EnhanceLevel
+    status: JobStatus = JobStatus.QUEUED
+    progress: float = 0 # 0..1
+    chunks_done: int = 0
+    chunks: int = 0
+    error: Optional[str] = None
+    created: int
+    finished: Optional[int] = None
+
+
+
+_PREPARE = -1 # unit of work that comes before the chunks
+
+class _Enhancement:
+    __slots__ = ('job', 'src', 'out', 'decoded', 'input', 'rate', 'frames', 'noise', 'next_chunk', 'in_flight')
+    def __init__(self, job: EnhanceJob, src: str, out: str):
+        self.job: EnhanceJob = job
+        self.src: str = src
+        self.out: str = out
+        # per job, a cancelled job's last chunk may still be writing
+        self.decoded: str = f"{out}.{job.id}.decoded.wav"
+        self.input: str = src # what the chunks read, src or its decoded copy
+        self.rate: int = 0
+        self.frames: int = 0
+        self.noise: Optional["np.ndarray"] = None
+        self.next_chunk: Optional[int] = None # None until prepared
+        self.in_flight: int = 0
+
+
+    @property
+    def part(self) -> str:
+        return f"{self.out}.{self.job.id}.part"
+
+
+    @property
+    def active(self) -> bool:
+        return self.job.status in (JobStatus.QUEUED, JobStatus.PROCESSING)
+
+
+OnUpdate = Callable[[EnhanceJob], Awaitable[None]]
+
+# runs enhancements chunk by chunk on a pool of worker processes. Workers
+# always take the next chunk of the oldest interactive job before any batch
+# job, so a single file jumps ahead of a running "enhance all" within one
+# chunk, and a cancelled job stops at its next chunk. The audio work itself
+# is in backend.denoise.
+class EnhanceScheduler:
+    def __init__(self, on_update: OnUpdate, workers: Optional[int] = None):
+        self.on_update = on_update
+        # leaves a core to the event loop
+        self.workers = workers or max(1, (os.cpu_count() or 1) - 1)
+        self._jobs: Dict[str, _Enhancement] = {} # recording id -> latest job
+        self._queue: List[_Enhancement] = [] # active jobs, oldest first
+        self._cond: Optional[asyncio.Condition] = None
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._dispatchers: List[asyncio.Task] = []
+
+
+    # the pool is created on the first job, not at startup
+    def _ensure_pool(self):
+        if self._pool:
+            return
+        self._cond = asyncio.Condition()
+        self._pool = self._new_pool()
+        self._dispatchers = [asyncio.create_task(self._dispatch()) for _ in range(self.workers)]
+
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+
+    def get(self, rec_id: str) -> Optional[EnhanceJob]:
+        e = self._jobs.get(rec_id)
+        return e.job.model_copy() if e else None
+
+
+    # a recording already being enhanced keeps its job, moved to the
+    # interactive lane if that is where the new request came from
+    async def submit(self, rec_id: str, src: str, out: str, lane: EnhanceLane, level: EnhanceLevel) -> EnhanceJob:
+        self._ensure_pool()
+        assert self._cond
+
+        current = self._jobs.get(rec_id)
+        if current and current.active:
+            if lane == EnhanceLane.INTERACTIVE and current.job.lane != lane:
+                current.job.lane = lane
+                await self.on_update(current.job.model_copy())
+            return current.job.model_copy()
+
+        job = EnhanceJob(
+            id=str(uuid.uuid4()),
+            recording_id=rec_id,
+            lane=lane,
+            level=level,
+            created=int(time.time() * 1000)
+        )
+        e = self._jobs[rec_id] = _Enhancement(job, src, out)
+        async with self._cond:
+            self._queue.append(e)
+            self._cond.notify_all()
+        await self.on_update(job.model_copy())
+        return job.model_copy()
+
+
+    async def cancel(self, rec_id: str) -> Optional[EnhanceJob]:
+        e = self._jobs.get(rec_id)
+        if not e or not e.active:
+            return None
+        await self._end(e, JobStatus.CANCELLED)
+        if e.in_flight == 0:
+            await asyncio.to_thread(self._discard, e)
+        return e.job.model_copy()
+
+
+    # next unit of work, interactive lane first
+    def _claim(self) -> Optional[Tuple[_Enhancement, int]]:
+        for lane in _LANES:
+            for e in self._queue:
+                if e.job.lane != lane:
+                    continue
+                if e.job.status == JobStatus.QUEUED and e.in_flight == 0:
+                    return e, _PREPARE
+                if e.next_chunk is not None and e.next_chunk < e.job.chunks:
+                    e.next_chunk += 1
+                    return e, e.next_chunk - 1
+        return None
+
+
+    async def _dispatch(self):
+        assert self._cond
+        while True:
+            async with self._cond:
+                while not (work := self._claim()):
+                    await self._cond.wait()
+                e, unit = work
+                e.in_flight += 1
+            try:
+                await self._execute(e, unit)
+            except Exception as ex:
+                if e.active:
+                    print(f"[enhance] {e.job.recording_id} failed: {ex}")
+                    e.job.error = str(ex)
+                    await self._end(e, JobStatus.FAILED)
+            finally:
+                e.in_flight -= 1
+                if not e.active and e.job.status != JobStatus.DONE and e.in_flight == 0:
+                    await asyncio.to_thread(self._discard, e)
+                async with self._cond:
+                    self._cond.notify_all()
+
+
+    # a worker that died (killed, out of memory) breaks the whole pool: the
+    # work in it fails and whatever comes next gets a new one
+    async def _run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        try:
+            future = loop.run_in_executor(self._pool, fn, *args)
+        except BrokenProcessPool:
+            self._renew_pool(self._pool) # broke while idle, nothing was lost
+            future = loop.run_in_executor(self._pool, fn, *args)
+        pool = self._pool
+        try:
+            return await future
+        except BrokenProcessPool:
+            self._renew_pool(pool)
+            raise
+
+
+    def _renew_pool(self, broken: Optional[ProcessPoolExecutor]):
+        if self._pool is not broken or not broken:
+            return # another unit already replaced it
+        print("[enhance] worker pool broke, starting a new one")
+        broken.shutdown(wait=False, cancel_futures=True)
+        self._pool = self._new_pool()
+
+
+    async def _execute(self, e: _Enhancement, unit: int):
+        from backend.denoise import prepare, enhance_chunk # numpy, loaded by the first job
+        if not e.active:
+            return
+        job = e.job
+
+        if unit == _PREPARE:
+            job.status = JobStatus.PROCESSING
+            await self.on_update(job.model_copy())
+            e.input, e.rate, e.frames, e.noise = await self._run(prepare, e.src, e.decoded, e.part)
+            job.chunks = max(1, math.ceil(e.frames / (CHUNK_S * e.rate)))
+            e.next_chunk = 0
+            return
+
+        chunk = CHUNK_S * e.rate
+        start = unit * chunk
+        await self._run(enhance_chunk, e.input, e.part, e.rate, start, min(chunk, e.frames - start), e.noise, job.level)
+        if not e.active:
+            return
+
+        job.chunks_done += 1
+        job.progress = round(job.chunks_done / job.chunks, 3)
+        if job.chunks_done == job.chunks:
+            await asyncio.to_thread(self._complete, e)
+            await self._end(e, JobStatus.DONE)
+        else:
+            await self.on_update(job.model_copy())
+
+
+    async def _end(self, e: _Enhancement, status: JobStatus):
+        e.job.status = status
+        e.job.finished = int(time.time() * 1000)
+        if e in self._queue:
+            self._queue.remove(e)
+        await self.on_update(e.job.model_copy())
+
+
+    @staticmethod
+    def _complete(e: _Enhancement):
+        os.replace(e.part, e.out)
+        if e.input == e.decoded:
+            os.remove(e.decoded)
+
+
+    @staticmethod
+    def _discard(e: _Enhancement):
+        for p in (e.part, e.decoded):
+            try:
+                os.remove(p)
+            except FileNotFoundError:
+                pass
+
+
+    async def forget(self, rec_id: str):
+        await self.cancel(rec_id)
+        self._jobs.pop(rec_id, None)
+
+
+    def close(self):
+        for task in self._dispatchers:
+            task.cancel()
+        if self._pool:
+            self._pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,118 @@
+from typing import Optional, Tuple
+import math
+import struct
+import numpy as np
+from backend.audio import pcm_to_mono
+
+
+SILENCE_DB = -120.0
+WAV_HEADER_MAX = 4096 # bytes searched for the data chunk of a wav
+
+
+# (offset of the samples, sample width, channels) from the start of a wav,
+# None if more of it is needed
+def _wav_format(head: bytes) -> Optional[Tuple[int, int, int]]:
+    if len(head) >= 4 and head[:4] != b"RIFF" or len(head) >= 12 and head[8:12] != b"WAVE":
+        raise ValueError("not a wav")
+    pos = 12
+    fmt: Optional[Tuple[int, int]] = None
+    while pos + 8 <= len(head):
+        cid, size = struct.unpack_from("<4sI", head, pos)
+        body = pos + 8
+        if cid == b"fmt ":
+            if body + 16 > len(head):
+                return None
+            tag, channels, _, _, _, bits = struct.unpack_from("<HHIIHH", head, body)
+            if tag not in (1, 0xFFFE): # integer pcm
+                raise ValueError(f"unsupported wav format {tag}")
+            if channels < 1 or not 1 <= bits // 8 <= 4:
+                raise ValueError(f"unsupported wav layout: {channels} channels of {bits} bits")
+            fmt = (bits // 8, channels)
+        elif cid == b"data":
+            if not fmt:
+                raise ValueError("wav data before fmt")
+            return body, fmt[0], fmt[1]
+        pos = body + size + (size & 1)
+    return None
+
+
+def _db(x: float) -> float:
+    return round(max(SILENCE_DB, 20 * math.log10(x)), 1) if x > 0 else SILENCE_DB
+
+
+# RMS and peak of a take as its bytes go by. Only wav takes are measured,
+# their samples are found from the header; anything else has no levels.
+class LevelMeter:
+    __slots__ = ('pos', '_head', '_format', '_dead', '_rest', '_sq', '_n', '_peak')
+    def __init__(self):
+        self.pos: int = 0 # bytes of the file seen or skipped
+        self._head: bytearray = bytearray() # start of the file until the format is known
+        self._format: Optional[Tuple[int, int, int]] = None
+        self._dead: bool = False
+        self._rest: bytes = b"" # incomplete sample frame
+        self._sq: float = 0.0
+        self._n: int = 0
+        self._peak: float = 0.0
+
+
+    # continue at pos, after a resumed take fed its header
+    def seek(self, pos: int):
+        self.pos = pos
+        self._rest = b""
+        self.take()
+
+
+    # no more levels for this take
+    def stop(self):
+        self._dead = True
+        self._rest = b""
+        self.take()
+
+
+    def feed(self, data: bytes):
+        start = self.pos
+        self.pos += len(data)
+        if self._dead:
+            return
+        if not self._format:
+            if start == len(self._head) < WAV_HEADER_MAX:
+                self._head += data[: WAV_HEADER_MAX - start]
+            try:
+                self._format = _wav_format(bytes(self._head))
+            except ValueError:
+                self._dead = True
+                return
+            if not self._format:
+                self._dead = len(self._head) >= WAV_HEADER_MAX
+                return
+            self._head = bytearray()
+
+        skip = max(0, self._format[0] - start)
+        if skip < len(data):
+            self._measure(data[skip:], start + skip)
+
+
+    def _measure(self, pcm: bytes, offset: int):
+        data_start, width, channels = self._format
+        frame = width * channels
+        if self._rest:
+            pcm = self._rest + pcm
+        else:
+            pcm = pcm[-(offset - data_start) % frame:]
+        n = len(pcm) // frame * frame
+        self._rest = pcm[n:]
+        if not n:
+            return
+        x = pcm_to_mono(pcm[:n], width, 1) # every channel's samples count
+        self._sq += float(np.dot(x, x))
+        self._n += len(x)
+        self._peak = max(self._peak, float(np.abs(x).max()))
+
+
+    # (rms, peak) in dBFS since the last call, None without new samples
+    def take(self) -> Optional[Tuple[float, float]]:
+        if not self._n:
+            return None
+        levels = _db(math.sqrt(self._sq / self._n)), _db(self._peak)
+        self._sq, self._n, self._peak = 0.0, 0, 0.0
+        return levels
@@ -0,0 +1,200 @@
+from typing import TYPE_CHECKING, Awaitable, Callable, Optional
+import asyncio
+import json
+from fastapi import WebSocket, WebSocketDisconnect
+from pydantic import BaseModel, Field, ValidationError
+from backend.recordings import RecordingsHandler, Recording, Upload
+from backend import wire
+
+if TYPE_CHECKING:
+    from backend.levels import LevelMeter
+
+
+RING_BYTES = 4 << 20 # audio buffered between the socket and the disk, ~40s of 48kHz 16 bit mono
+DRAIN_BYTES = 256 << 10 # most bytes written to disk at once
+LEVELS_HZ = 10 # level updates per take and second
+
+
+class LiveLevels(BaseModel):
+    recording_id: str
+    session_id: str
+    rms_db: float # dBFS, since the previous update
+    peak_db: float
+    received: int # bytes of the take on the server
+
+
+# recorder -> server, a text frame after the last chunk of the take
+class LiveEnd(BaseModel):
+    size: int = Field(ge=0)
+    sha256: Optional[str] = None
+
+
+
+# fixed size byte ring between the socket reader and the disk writer. A full
+# ring stops the reader, which stops reading the socket, which makes the
+# recorder wait: the take is never held in memory past `capacity`.
+class RingBuffer:
+    __slots__ = ('capacity', '_buf', '_head', '_len', '_closed', '_readable', '_writable')
+    def __init__(self, capacity: int = RING_BYTES):
+        self.capacity: int = capacity
+        self._buf: bytearray = bytearray(capacity)
+        self._head: int = 0 # read position
+        self._len: int = 0
+        self._closed: bool = False
+        self._readable: asyncio.Event = asyncio.Event()
+        self._writable: asyncio.Event = asyncio.Event()
+
+
+    def __len__(self) -> int:
+        return self._len
+
+
+    # False once the ring is closed, what was not put is lost
+    async def put(self, data: bytes) -> bool:
+        view = memoryview(data)
+        while view:
+            while self._len == self.capacity and not self._closed:
+                self._writable.clear()
+                await self._writable.wait()
+            if self._closed:
+                return False
+            n = min(len(view), self.capacity - self._len)
+            tail = (self._head + self._len) % self.capacity
+            first = min(n, self.capacity - tail)
+            self._buf[tail: tail + first] = view[:first]
+            self._buf[: n - first] = view[first:n]
+            self._len += n
+            view = view[n:]
+            self._readable.set()
+        return True
+
+
+    # up to max_bytes, waiting for some. b"" once closed and empty.
+    async def get(self, max_bytes: int) -> bytes:
+        while self._len == 0:
+            if self._closed:
+                return b""
+            self._readable.clear()
+            await self._readable.wait()
+        n = min(max_bytes, self._len)
+        first = min(n, self.capacity - self._head)
+        out = bytes(self._buf[self._head: self._head + first]) + bytes(self._buf[: n - first])
+        self._head = (self._head + n) % self.capacity
+        self._len -= n
+        self._writable.set()
+        return out
+
+
+    # the rest can still be read
+    def close(self):
+        self._closed = True
+        self._readable.set()
+        self._writable.set()
+
+
+
+OnLevels = Callable[[LiveLevels], Awaitable[None]]
+
+# /ws/audio/{rec_id}: the recorder streams the take's file while it records.
+# The server answers {"offset": n}, the recorder sends binary frames with the
+# file's bytes from n on and, after STOP, {"size": ..., "sha256": ...}. The
+# server replies {"offset": ..., "status": ...} and closes. A take whose
+# stream broke off is finished with HEAD and PUT like any other upload.
+class LiveIngest:
+    def __init__(self, recordings: RecordingsHandler, on_levels: OnLevels, ring_bytes: int = RING_BYTES):
+        self.recordings = recordings
+        self.on_levels = on_levels
+        self.ring_bytes = ring_bytes
+
+
+    # raises UploadError when the recording can't take a live stream
+    async def run(self, ws: WebSocket, rec_id: str) -> Recording:
+        upload = await self.recordings.begin_live(rec_id)
+        try:
+            f = await self.recordings.open_part(upload)
+        except BaseException:
+            upload.lock.release()
+            raise
+
+        from backend.levels import LevelMeter, WAV_HEADER_MAX # numpy, loaded by the first stream
+        meter = LevelMeter()
+        if upload.rec.received:
+            head = await asyncio.to_thread(_read_head, self.recordings.path(upload.rec), WAV_HEADER_MAX)
+            _feed(meter, head)
+            meter.seek(upload.rec.received)
+
+        ring = RingBuffer(self.ring_bytes)
+        drain = asyncio.create_task(self._drain(upload, f, ring, meter))
+        try:
+            await wire.send(ws, json.dumps({"offset": upload.rec.received}))
+            try:
+                end = await self._receive(ws, ring)
+            except WebSocketDisconnect:
+                end = None
+            ring.close()
+            await drain
+        except BaseException:
+            # keep what made it to disk, the take stays resumable
+            ring.close()
+            try:
+                await drain
+            except Exception:
+                pass
+            await self.recordings.end_live(upload, f)
+            raise
+        return await self.recordings.end_live(upload, f, end and end.size, end and end.sha256)
+
+
+    @staticmethod
+    async def _receive(ws: WebSocket, ring: RingBuffer) -> Optional[LiveEnd]:
+        while True:
+            msg = await wire.receive(ws)
+            if msg.get("bytes") is not None:
+                if not await ring.put(msg["bytes"]):
+                    return None
+                continue
+            try:
+                return LiveEnd.model_validate_json(msg.get("text") or "")
+            except ValidationError as e:
+                print(f"[live] invalid end of take: {e}")
+
+
+    async def _drain(self, upload: Upload, f, ring: RingBuffer, meter: "LevelMeter"):
+        rec = upload.rec
+        loop = asyncio.get_running_loop()
+        interval = 1 / LEVELS_HZ
+        last = 0.0
+        try:
+            while block := await ring.get(DRAIN_BYTES):
+                await self.recordings.append(upload, f, block)
+                _feed(meter, block)
+                now = loop.time()
+                if now - last < interval:
+                    continue
+                levels = meter.take()
+                if levels:
+                    last = now
+                    await self.on_levels(LiveLevels(
+                        recording_id=rec.id,
+                        session_id=rec.session_id,
+                        rms_db=levels[0],
+                        peak_db=levels[1],
+                        received=rec.received
+                    ))
+        finally:
+            ring.close() # stops the reader if the disk side failed
+
+
+
+# levels are a bonus: a take whose samples can't be measured is still written
+def _feed(meter: "LevelMeter", data: bytes):
+    try:
+        meter.feed(data)
+    except Exception as e:
+        print(f"[live] level meter stopped: {e!r}")
+        meter.stop()
+
+
+def _read_head(path: str, size: int) -> bytes:
+    with open(path, "rb") as f:
+        return f.read(size)
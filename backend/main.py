@@ -1,70 +1,118 @@
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, FastAPI, WebSocket, WebSocketDisconnect, Request, Response, HTTPException, Query
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
-from pydantic import ValidationError
-from typing import List
+from pydantic import TypeAdapter, ValidationError
+from typing import List, Literal, Optional, Tuple
+import json
+import os
 import uuid
-import qrcode
-import io
 
 from backend.protocols import (
     AppState, 
     SessionStageRequestMsg, 
     SessionStageResponseMsg, 
     SessionMetadata,
-    SyncRequest, 
     SyncReport,
+    RESUME_GRACE_S,
     ServerInfo,
-    WSPayload,
-    WSKind,
-    WSEvents,
-    WSErrors,
     QRData,
-    send_error,
+    now_ms,
 )
+from backend.clock import now_us, DELIVERY_PROBABILITY, MAX_SYNC_AGE_MS, SAFETY_MS
+from backend import metrics, wire
+from backend.utils import spawn
+from backend.recordings import Recording, RecordingCreateRequest, RecordingStatus, UploadError
+from backend.transcription import Transcript, TranscriptJob, MergeTranscriptRequest, MergedTranscript
+from backend.waveform import Waveform, MAX_WIDTH
+from backend.media import MediaFileResponse, PreviewError, media_type
+from backend.enhance import EnhanceRequest, EnhanceJob, EnhanceLane
+from backend.merge import MergeRequest, MergeJob, MergeError, Track
+from backend.qr import QR_FORMATS, MIN_BOX_SIZE, MAX_BOX_SIZE, DEFAULT_BOX_SIZE
 
 
-app = AppState(port = 6210) # source of truth
+DEFAULT_PORT = 6210
+
+# source of truth, made by create_app. Importing this module builds nothing:
+# no address lookup, no name file, no mDNS, no numpy.
+app: AppState = None # ty:ignore[invalid-assignment]
+
+# recordings with a complete file on disk
+PLAYABLE = (RecordingStatus.ORIGINAL, RecordingStatus.PROCESSING, RecordingStatus.ENHANCED)
 
 
 @asynccontextmanager
 async def lifespan(api: FastAPI):
-    await app.start_mdns()
+    app.recordings.load()
+    await app.start_mdns() # zeroconf belongs to the server's loop
     yield
     await app.shutdown()
 
 
-api = FastAPI(lifespan=lifespan)
-api.add_middleware(
-    CORSMiddleware,  # ty:ignore[invalid-argument-type]
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+router = APIRouter()
+
+
+# uvicorn --factory backend.main:create_app. One app per process, the
+# routes share the module's `app`.
+def create_app(
+    port: int = DEFAULT_PORT,
+    ip: Optional[str] = None,
+    server_name: Optional[str] = None,
+    storage_dir: str = "recordings",
+    resume_grace_s: float = RESUME_GRACE_S,
+    delivery_probability: float = DELIVERY_PROBABILITY,
+    safety_ms: int = SAFETY_MS,
+    max_sync_age_ms: int = MAX_SYNC_AGE_MS
+) -> FastAPI:
+    global app
+    app = AppState(
+        port=port,
+        ip=ip,
+        server_name=server_name,
+        storage_dir=storage_dir,
+        resume_grace_s=resume_grace_s,
+        delivery_probability=delivery_probability,
+        safety_ms=safety_ms,
+        max_sync_age_ms=max_sync_age_ms
+    )
+    api = FastAPI(lifespan=lifespan)
+    api.add_middleware(
+        CORSMiddleware,  # ty:ignore[invalid-argument-type]
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+    )
+    api.include_router(router)
+    return api
 
 
+# `uvicorn backend.main:api` keeps working, the app is made on first access
+def __getattr__(name: str):
+    if name == "api":
+        api = globals()["api"] = create_app()
+        return api
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
-@api.websocket("/ws/control")
+
+
+CONTROL_DECODE_ERRORS = metrics.counter("vocalink_control_decode_errors_total", "undecodable /ws/control frames").labels()
+
+@router.websocket("/ws/control")
 async def orchistrate_messages(ws: WebSocket):
+    if not wire.available(wire.encoding_of(ws)):
+        await ws.close(code=1003, reason="msgpack is not available")
+        return
     await ws.accept()
     try:
         while True:
             try:
-                raw = WSPayload.model_validate(await ws.receive_json())
-            except ValidationError as e:
+                data = wire.decode(await wire.receive(ws))
+            except wire.WireError as e:
+                CONTROL_DECODE_ERRORS.inc()
                 print(e)
                 continue
-
-            if raw.kind == WSKind.ACTION:
-                await app.handle_ws_actions(raw, ws)
-            elif raw.kind == WSKind.EVENT:
-                await app.handle_ws_events(raw, ws)
-            elif raw.kind == WSKind.ERROR:
-                pass # todo
-            else:
-                await send_error(ws, WSErrors.INVALID_KIND)
+            await app.dispatch(data, ws)
                 
     except WebSocketDisconnect:
         await app.handle_disconnect(ws)
@@ -74,44 +122,75 @@ async def orchistrate_messages(ws: WebSocket):
             await ws.close()
         except Exception:
             pass
+        await app.handle_disconnect(ws)
 
 
 
-@api.websocket("/ws/sync/{session_id}")
-async def sync_endpoint(ws: WebSocket, session_id: str):
-    if not await app.sessions.is_active(session_id):
+async def _apply_sync_report(session_id: str, report: SyncReport, micros: bool):
+    if micros:
+        report.theta /= 1_000
+        report.rtt /= 1_000
+    meta = await app.sessions.update_sync(session_id, report)
+    if meta:
+        app.dashboard.update(meta)
+
+
+SYNC_T1 = TypeAdapter(int) # pings' t1, validated as SyncRequest did
+
+@router.websocket("/ws/sync/{session_id}")
+async def sync_endpoint(ws: WebSocket, session_id: str, precision: str = "ms", encoding: str = "json"):
+    # a suspended session keeps syncing, so it resumes with a warm clock
+    if not await app.sessions.is_active(session_id) and not await app.sessions.is_suspended(session_id):
         await ws.close(code=4003)
         return
 
+    micros = precision == "us"
+    binary = encoding == "binary"
     await ws.accept()
-    await app.clock.add(session_id, ws)
+    await app.clock.add(session_id, ws, micros=micros, binary=binary)
     
     try:
         while True:
             if not await app.clock.get(session_id):
                 break
 
-            data = await ws.receive_json()
+            msg = await ws.receive()
+            t2_us = now_us() # before any decoding, so parsing doesn't count as network delay
+            if msg["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(msg.get("code", 1000))
+
+            raw = msg.get("bytes")
+            if binary and raw is not None:
+                if len(raw) == wire.SYNC_PING.size:
+                    await app.clock.handle_ping(session_id, wire.SYNC_PING.unpack(raw)[0], t2_us)
+                elif len(raw) == wire.SYNC_REPORT.size:
+                    theta, rtt = wire.SYNC_REPORT.unpack(raw)
+                    await _apply_sync_report(session_id, SyncReport(theta=theta, rtt=rtt), micros)
+                continue
+
+            try:
+                data = json.loads(msg.get("text") or msg.get("bytes") or b"")
+            except ValueError:
+                continue
+            if not isinstance(data, dict):
+                continue
             
             if "t1" in data:
-                try:
-                    req = SyncRequest.model_validate(data)
-                    await app.clock.handle_ping(session_id, req)
-                except ValidationError:
-                    continue
+                t1 = data["t1"]
+                if type(t1) is not int:
+                    # 123.0 and "123" from JS recorders were always accepted
+                    try:
+                        t1 = SYNC_T1.validate_python(t1)
+                    except ValidationError:
+                        await ws.send_json({"error": "MALFORMED_T1"})
+                        continue
+                await app.clock.handle_ping(session_id, t1, t2_us)
             elif "theta" in data:
                 try:
                     report = SyncReport.model_validate(data)
-                    meta = await app.sessions.update_sync(session_id, report)
-                    if meta:
-                        update = WSPayload(
-                            kind=WSKind.EVENT, 
-                            msg_type=WSEvents.SESSION_UPDATE, 
-                            body=meta
-                        )
-                        await app.dashboard.notify(update)
                 except ValidationError:
                     continue
+                await _apply_sync_report(session_id, report, micros)
     except WebSocketDisconnect:
         meta = await app.sessions.getMetaFromActive(session_id)
         print(f"Sync disconnected: {meta and meta.name}")
@@ -121,41 +200,356 @@ async def sync_endpoint(ws: WebSocket, session_id: str):
 
 
 
-@api.post("/sessions", response_model=SessionStageResponseMsg)
+# a take streamed while it records, see backend.live. Upload errors close
+# the socket with 4000 + their http status.
+@router.websocket("/ws/audio/{rec_id}")
+async def live_audio(ws: WebSocket, rec_id: str):
+    rec = await app.recordings.get(rec_id)
+    if not rec or not await app.sessions.is_active(rec.session_id):
+        await ws.close(code=4003)
+        return
+
+    await ws.accept()
+    try:
+        rec = await app.live.run(ws, rec_id)
+    except UploadError as e:
+        await ws.close(code=4000 + e.status_code, reason=e.detail)
+        return
+    except WebSocketDisconnect:
+        return
+
+    if rec.status != RecordingStatus.UPLOADING:
+        await app.notify_recording(rec)
+    if rec.status == RecordingStatus.ORIGINAL:
+        spawn(app.index_waveform(rec))
+    try:
+        await ws.send_text(json.dumps({"offset": rec.received, "status": rec.status.value}))
+        await ws.close()
+    except Exception:
+        pass
+
+
+
+@router.post("/sessions", response_model=SessionStageResponseMsg)
 async def stage_session(req: SessionStageRequestMsg):
-    req.body.id = str(uuid.uuid4())
-    await app.sessions.stage(req.body)
-    return SessionStageResponseMsg(body=req.body).model_dump()
+    meta = req.body.model_copy(update={"id": str(uuid.uuid4())})
+    token = await app.sessions.stage(meta)
+    return SessionStageResponseMsg(body=meta, resume_token=token).model_dump()
 
 
-@api.get("/sessions", response_model=List[SessionMetadata])
+@router.get("/sessions", response_model=List[SessionMetadata])
 async def list_sessions():
     return await app.sessions.getMetaFromAllActive()
 
 
 
-@api.get("/dashboard", response_model=ServerInfo)
+# Prometheus text format, see backend.metrics
+@router.get("/metrics")
+async def get_metrics():
+    return Response(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+
+@router.get("/dashboard", response_model=ServerInfo)
 async def getServerInfo():
     return await app.server_info()
 
 
 
-@api.get("/dashboard/qr")
-async def get_server_qr():
+@router.get("/dashboard/qr")
+async def get_server_qr(request: Request, format: str = "png", size: int = DEFAULT_BOX_SIZE):
+    if format not in QR_FORMATS:
+        raise HTTPException(status_code=400, detail=f"format must be one of {list(QR_FORMATS)}")
+    size = max(MIN_BOX_SIZE, min(MAX_BOX_SIZE, size))
+
     payload = QRData(name=app.name, ip=app.ip)
-    qr = qrcode.QRCode(
-        version=1,
-        error_correction=qrcode.constants.ERROR_CORRECT_M,
-        box_size=20,
-        border=2
+    image = await app.qr.get(
+        app.name, app.ip, app.port,
+        data=str(payload.model_dump()),
+        fmt=format,
+        box_size=size
+    )
+
+    headers = {"ETag": image.etag, "Cache-Control": "no-cache"}
+    if request.headers.get("if-none-match") == image.etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=image.body, media_type=image.media_type, headers=headers)
+
+
+
+def _upload_error(e: UploadError) -> JSONResponse:
+    headers = {} if e.offset is None else {"Upload-Offset": str(e.offset)}
+    if e.retry_after is not None:
+        headers["Retry-After"] = str(e.retry_after)
+    return JSONResponse(status_code=e.status_code, content={"detail": e.detail}, headers=headers)
+
+
+@router.post("/recordings", response_model=Recording, status_code=201)
+async def create_recording(req: RecordingCreateRequest):
+    meta = await app.sessions.getMetaFromActive(req.session_id)
+    take = app.takes.get(req.session_id)
+    if req.trigger_time is None and take:
+        req.trigger_time = take.trigger_time
+    theta = take.theta if take and take.trigger_time == req.trigger_time else None
+
+    rec = await app.recordings.create(
+        req,
+        created=now_ms(),
+        session_name=meta.name if meta else None,
+        theta=theta
+    )
+    await app.notify_recording(rec)
+    return rec
+
+
+# resumable upload: the client asks for the offset and PUTs the rest from there
+@router.head("/recordings/{rec_id}")
+async def recording_offset(rec_id: str):
+    rec = await app.recordings.get(rec_id)
+    if not rec:
+        raise HTTPException(status_code=404, detail="recording not found")
+    length = {"Upload-Length": str(rec.size)} if rec.size is not None else {"Upload-Defer-Length": "1"}
+    return Response(headers={
+        "Upload-Offset": str(rec.received),
+        **length,
+        "Cache-Control": "no-store"
+    })
+
+
+@router.put("/recordings/{rec_id}", response_model=Recording)
+async def upload_recording(rec_id: str, request: Request):
+    try:
+        rec = await app.recordings.write(
+            rec_id,
+            request.stream(),
+            content_range=request.headers.get("content-range"),
+            chunk_sha256=request.headers.get("x-chunk-sha256")
+        )
+    except UploadError as e:
+        return _upload_error(e)
+
+    if rec.status != RecordingStatus.UPLOADING:
+        await app.notify_recording(rec)
+    if rec.status == RecordingStatus.ORIGINAL:
+        spawn(app.index_waveform(rec))
+    return rec
+
+
+@router.get("/recordings", response_model=List[Recording])
+async def list_recordings():
+    return await app.recordings.list()
+
+
+@router.get("/recordings/{rec_id}", response_model=Recording)
+async def get_recording(rec_id: str):
+    rec = await app.recordings.get(rec_id)
+    if not rec:
+        raise HTTPException(status_code=404, detail="recording not found")
+    return rec
+
+
+@router.delete("/recordings/{rec_id}", status_code=204)
+async def delete_recording(rec_id: str):
+    await app.enhancer.forget(rec_id)
+    if not await app.recordings.delete(rec_id):
+        raise HTTPException(status_code=404, detail="recording not found")
+    app.transcripts.delete(rec_id)
+    app.previews.discard(rec_id)
+
+
+@router.delete("/recordings", status_code=204)
+async def delete_all_recordings():
+    for rec in await app.recordings.list():
+        await app.enhancer.forget(rec.id)
+        app.transcripts.delete(rec.id)
+        app.previews.discard(rec.id)
+    await app.recordings.delete_all()
+
+
+# picks the file of a finished recording: the enhanced one if asked for (or,
+# with `version` None, if there is one), else the original
+async def _recording_file(rec_id: str, version: Optional[str]) -> Tuple[Recording, str]:
+    rec = await app.recordings.get(rec_id)
+    if not rec:
+        raise HTTPException(status_code=404, detail="recording not found")
+    if rec.status not in PLAYABLE:
+        raise HTTPException(status_code=409, detail=f"recording is {rec.status.value}")
+    if version == "enhanced" and rec.status != RecordingStatus.ENHANCED:
+        raise HTTPException(status_code=404, detail="recording is not enhanced")
+    if version == "original":
+        return rec, app.recordings.path(rec)
+    return rec, app.recordings.audio_path(rec)
+
+
+# inline, for the dashboard's player. Range requests get 206, so seeking
+# in an hour long wav only reads the bytes around the playhead.
+@router.get("/recordings/{rec_id}/stream")
+async def stream_recording(rec_id: str, version: Optional[Literal["original", "enhanced"]] = None, preview: bool = False):
+    rec, path = await _recording_file(rec_id, version)
+    if preview:
+        try:
+            path = await app.previews.get(rec.id, path)
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="recording file not found")
+        except PreviewError as e:
+            raise HTTPException(status_code=503, detail=str(e))
+    return MediaFileResponse(path, media_type=media_type(path), content_disposition_type="inline")
+
+
+@router.get("/recordings/{rec_id}/download")
+async def download_recording(rec_id: str, version: Literal["original", "enhanced"] = "original"):
+    rec, path = await _recording_file(rec_id, version)
+    filename = rec.filename
+    if version == "enhanced":
+        filename = os.path.splitext(rec.filename)[0] + ".enhanced.wav"
+    return MediaFileResponse(path, media_type=media_type(path), filename=filename)
+
+
+# min/max pairs for drawing [start, end) seconds about `width` pixels wide,
+# read from the peak index built at upload
+@router.get("/recordings/{rec_id}/waveform", response_model=Waveform)
+async def recording_waveform(
+    rec_id: str,
+    start: float = Query(0, ge=0),
+    end: Optional[float] = Query(None, gt=0),
+    width: int = Query(1000, ge=1, le=MAX_WIDTH),
+    version: Optional[Literal["original", "enhanced"]] = None
+):
+    rec, path = await _recording_file(rec_id, version)
+    enhanced = path == app.recordings.enhanced_path(rec.id)
+    try:
+        return await app.waveforms.get(rec.id, path, app.recordings.peaks_path(rec.id, enhanced), start, end, width)
+    except MergeError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="recording file not found")
+    except (OSError, ValueError) as e:
+        raise HTTPException(status_code=409, detail=f"waveform unavailable: {e}")
+
+
+# enhancement runs in the background, progress reaches the dashboard as
+# ENHANCE_UPDATE events. "Enhance all" queues behind single recordings.
+async def _enhance(rec: Recording, lane: EnhanceLane, req: EnhanceRequest) -> EnhanceJob:
+    return await app.enhancer.submit(
+        rec.id,
+        app.recordings.path(rec), # always from the original
+        app.recordings.enhanced_path(rec.id),
+        lane,
+        req.level
     )
-    qr.add_data(payload.model_dump())
-    qr.make(fit=True)
-   
-    img = qr.make_image(fill_color="black", back_color="white")
 
-    buf = io.BytesIO()
-    img.save(buf, format="PNG")
-    buf.seek(0)
 
-    return StreamingResponse(buf, media_type="image/png")
+@router.post("/recordings/enhance", response_model=List[EnhanceJob], status_code=202)
+async def enhance_all(req: Optional[EnhanceRequest] = None):
+    recs = [r for r in await app.recordings.list() if r.status == RecordingStatus.ORIGINAL]
+    recs.sort(key=lambda r: r.created)
+    return [await _enhance(r, EnhanceLane.BATCH, req or EnhanceRequest()) for r in recs]
+
+
+@router.post("/recordings/{rec_id}/enhance", response_model=EnhanceJob, status_code=202)
+async def enhance_recording(rec_id: str, req: Optional[EnhanceRequest] = None):
+    rec = await app.recordings.get(rec_id)
+    if not rec:
+        raise HTTPException(status_code=404, detail="recording not found")
+    if rec.status not in PLAYABLE:
+        raise HTTPException(status_code=409, detail=f"recording is {rec.status.value}")
+    return await _enhance(rec, EnhanceLane.INTERACTIVE, req or EnhanceRequest())
+
+
+@router.get("/recordings/{rec_id}/enhance", response_model=EnhanceJob)
+async def get_enhancement(rec_id: str):
+    job = app.enhancer.get(rec_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="not enhanced")
+    return job
+
+
+@router.delete("/recordings/{rec_id}/enhance", response_model=EnhanceJob)
+async def cancel_enhancement(rec_id: str):
+    job = await app.enhancer.cancel(rec_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="no enhancement running")
+    return job
+
+
+# queues the recording for transcription, segments reach the dashboard as
+# TRANSCRIPT_SEGMENT events while it runs
+@router.post("/recordings/{rec_id}/transcribe", response_model=TranscriptJob, status_code=202)
+async def transcribe_recording(rec_id: str, language: Optional[str] = "en"):
+    rec = await app.recordings.get(rec_id)
+    if not rec:
+        raise HTTPException(status_code=404, detail="recording not found")
+    if rec.status not in PLAYABLE:
+        raise HTTPException(status_code=409, detail=f"recording is {rec.status.value}")
+    return await app.transcripts.submit(rec.id, app.recordings.audio_path(rec), language or None)
+
+
+@router.get("/recordings/{rec_id}/transcript", response_model=Transcript)
+async def get_transcript(rec_id: str):
+    transcript = await app.transcripts.transcript(rec_id)
+    if not transcript:
+        raise HTTPException(status_code=404, detail="no transcript")
+    return transcript
+
+
+
+# the finished recordings among `ids`, or all of them
+async def _finished_recordings(ids: Optional[List[str]]) -> List[Recording]:
+    recs = await app.recordings.list()
+    if ids is not None:
+        by_id = {r.id: r for r in recs}
+        missing = [rid for rid in ids if rid not in by_id]
+        if missing:
+            raise HTTPException(status_code=404, detail=f"recordings not found: {missing}")
+        recs = [by_id[rid] for rid in dict.fromkeys(ids)]
+    return [r for r in recs if r.status in PLAYABLE]
+
+
+# the mixdown runs in the background, progress and the result reach the
+# dashboard as MERGE_UPDATE events
+@router.post("/export/merge", response_model=MergeJob, status_code=202)
+async def export_merge(req: MergeRequest):
+    recs = await _finished_recordings(req.recording_ids)
+    if not recs:
+        raise HTTPException(status_code=422, detail="nothing to merge")
+    tracks = [Track(r.id, app.recordings.audio_path(r), r.start_ms()) for r in recs]
+    return await app.exports.merge(tracks, req)
+
+
+@router.get("/export/merge", response_model=MergeJob)
+async def get_merge():
+    job = app.exports.job
+    if not job:
+        raise HTTPException(status_code=404, detail="nothing merged yet")
+    return job
+
+
+@router.get("/export/latest")
+async def export_latest():
+    latest = app.exports.latest
+    if not latest:
+        raise HTTPException(status_code=404, detail="nothing merged yet")
+    return MediaFileResponse(app.exports.path(latest), media_type="audio/wav", filename=latest.filename)
+
+
+# one transcript of every track, each labeled with its recorder's name.
+# Progress and the result reach the dashboard as TRANSCRIPT_MERGED events.
+@router.post("/export/transcript", response_model=MergedTranscript, status_code=202)
+async def export_transcript(req: MergeTranscriptRequest):
+    recs = await _finished_recordings(req.recording_ids)
+    if not recs:
+        raise HTTPException(status_code=422, detail="nothing to transcribe")
+
+    speakers = {}
+    for r in recs:
+        meta = await app.sessions.getMetaFromActive(r.session_id)
+        speakers[r.id] = meta.name if meta else (r.session_name or r.session_id)
+    tracks = [(r, app.recordings.audio_path(r)) for r in recs]
+    return await app.transcripts.merge(tracks, speakers, req.language or None)
+
+
+@router.get("/export/transcript/latest", response_model=MergedTranscript)
+async def export_transcript_latest():
+    merged = app.transcripts.merged
+    if not merged:
+        raise HTTPException(status_code=404, detail="nothing transcribed yet")
+    return merged
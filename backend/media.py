@@ -0,0 +1,129 @@
+from typing import Dict
+import asyncio
+import os
+import shutil
+from fastapi.responses import FileResponse
+
+
+STREAM_CHUNK_SIZE = 1 << 20 # bytes per read when the server can't send the file itself
+PREVIEW_BITRATE = "32k"
+PREVIEW_RATE = 24_000
+PREVIEW_CACHE_BYTES = 512 << 20
+
+MEDIA_TYPES = {
+    ".wav": "audio/wav",
+    ".mp3": "audio/mpeg",
+    ".m4a": "audio/mp4",
+    ".aac": "audio/aac",
+    ".ogg": "audio/ogg",
+    ".opus": "audio/ogg",
+    ".flac": "audio/flac",
+    ".webm": "audio/webm",
+}
+
+
+def media_type(path: str) -> str:
+    return MEDIA_TYPES.get(os.path.splitext(path)[1].lower(), "application/octet-stream")
+
+
+# FileResponse already answers Range/If-Range with 206, and hands whole files
+# to the server (http.response.pathsend) when it can sendfile them. Ranges
+# are still read by Starlette, a MiB at a time instead of 64 KiB.
+class MediaFileResponse(FileResponse):
+    chunk_size = STREAM_CHUNK_SIZE
+
+
+
+class PreviewError(Exception):
+    pass
+
+
+# low bitrate opus copies of recordings for scrubbing on the dashboard. A
+# preview is keyed by its source's size and mtime, so a recording that gets
+# enhanced gets a new one; the least recently used are dropped past max_bytes.
+class PreviewCache:
+    def __init__(self, root: str, max_bytes: int = PREVIEW_CACHE_BYTES):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._pending: Dict[str, asyncio.Task] = {} # preview path -> transcode
+
+
+    def _path(self, rec_id: str, src: str) -> str:
+        st = os.stat(src)
+        return os.path.join(self.root, f"{rec_id}-{st.st_size}-{st.st_mtime_ns}.ogg")
+
+
+    # FileNotFoundError if src is gone
+    async def get(self, rec_id: str, src: str) -> str:
+        path = self._path(rec_id, src)
+        if os.path.exists(path):
+            os.utime(path) # for the LRU
+            return path
+
+        task = self._pending.get(path)
+        if not task:
+            task = self._pending[path] = asyncio.create_task(self._transcode(rec_id, src, path))
+            task.add_done_callback(lambda _: self._pending.pop(path, None))
+        await asyncio.shield(task)
+        return path
+
+
+    async def _transcode(self, rec_id: str, src: str, path: str):
+        ffmpeg = shutil.which("ffmpeg")
+        if not ffmpeg:
+            raise PreviewError("ffmpeg is needed for previews")
+
+        os.makedirs(self.root, exist_ok=True)
+        tmp = path + ".part"
+        proc = await asyncio.create_subprocess_exec(
+            ffmpeg, "-v", "error", "-y", "-i", src,
+            "-ac", "1", "-ar", str(PREVIEW_RATE), "-c:a", "libopus", "-b:a", PREVIEW_BITRATE,
+            "-f", "ogg", tmp,
+            stdout=asyncio.subprocess.DEVNULL,
+            stderr=asyncio.subprocess.PIPE
+        )
+        _, err = await proc.communicate()
+        if proc.returncode != 0:
+            await asyncio.to_thread(_remove, tmp)
+            raise PreviewError(f"transcode failed: {err.decode(errors='replace').strip()}")
+
+        os.replace(tmp, path)
+        await asyncio.to_thread(self._prune, rec_id, path)
+
+
+    # drops older previews of the same recording, then the least recently
+    # used ones until the cache fits
+    def _prune(self, rec_id: str, keep: str):
+        entries = []
+        for entry in os.scandir(self.root):
+            if not entry.name.endswith(".ogg") or entry.path == keep:
+                continue
+            if entry.name.startswith(rec_id + "-"):
+                _remove(entry.path)
+                continue
+            st = entry.stat()
+            entries.append((st.st_mtime, st.st_size, entry.path))
+
+        total = os.path.getsize(keep) + sum(size for _, size, _ in entries)
+        for _, size, p in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            _remove(p)
+            total -= size
+
+
+    def discard(self, rec_id: str):
+        if not os.path.isdir(self.root):
+            return
+        for entry in os.scandir(self.root):
+            if entry.name.startswith(rec_id + "-"):
+                _remove(entry.path)
+
+
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
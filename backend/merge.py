@@ -0,0 +1,132 @@
+from typing import Awaitable, Callable, Dict, List, Optional
+import asyncio
+import os
+import time
+import uuid
+import wave
+from pydantic import BaseModel
+from backend.recordings import JobStatus
+from backend.utils import spawn
+
+
+DEFAULT_RATE = 48_000 # for merges that contain no wav track
+PROGRESS_STEP = 0.01 # smaller advances are not notified
+
+
+class MergeRequest(BaseModel):
+    recording_ids: Optional[List[str]] = None # None merges every finished recording
+    refine: bool = False # cross-correlate tracks to correct residual offsets
+    max_lag_ms: float = 200 # search range of the refinement
+    normalize: bool = True
+
+
+class MergeResult(BaseModel):
+    id: str
+    filename: str
+    sample_rate: int
+    duration_s: float
+    offsets_ms: Dict[str, float] # recording id -> start within the merge
+    refined_ms: Dict[str, float] = {} # correction applied by cross-correlation
+    elapsed_s: float
+    created: int
+
+
+class MergeJob(BaseModel):
+    id: str
+    status: JobStatus = JobStatus.QUEUED
+    recording_ids: List[str]
+    progress: float = 0 # 0..1
+    result: Optional[MergeResult] = None
+    error: Optional[str] = None
+    created: int
+    finished: Optional[int] = None
+
+
+class MergeError(Exception):
+    pass
+
+
+class Track:
+    __slots__ = ('rec_id', 'path', 'start_ms')
+    def __init__(self, rec_id: str, path: str, start_ms: float):
+        self.rec_id: str = rec_id
+        self.path: str = path
+        self.start_ms: float = start_ms # server time of the first sample
+
+
+
+def wav_info(path: str):
+    try:
+        with wave.open(path, "rb") as w:
+            return w.getframerate(), w.getnchannels(), w.getsampwidth()
+    except (wave.Error, EOFError, OSError):
+        return None
+
+
+
+OnUpdate = Callable[[MergeJob], Awaitable[None]]
+
+# runs merges in the background, one at a time in a worker thread, and
+# remembers the latest. Progress is reported per mixed block.
+class Exporter:
+    def __init__(self, root: str, on_update: OnUpdate):
+        self.root = root
+        self.on_update = on_update
+        self.job: Optional[MergeJob] = None # the latest, running or not
+        self.latest: Optional[MergeResult] = None # the latest that finished
+        self._lock = asyncio.Lock()
+
+
+    def path(self, result: MergeResult) -> str:
+        return os.path.join(self.root, result.filename)
+
+
+    async def merge(self, tracks: List[Track], req: MergeRequest) -> MergeJob:
+        job = MergeJob(
+            id=str(uuid.uuid4()),
+            recording_ids=[t.rec_id for t in tracks],
+            created=int(time.time() * 1000)
+        )
+        self.job = job
+        await self.on_update(job.model_copy())
+        spawn(self._merge(job, tracks, req))
+        return job.model_copy()
+
+
+    async def _merge(self, job: MergeJob, tracks: List[Track], req: MergeRequest):
+        from backend.mixdown import merge_tracks # numpy, loaded by the first merge
+        loop = asyncio.get_running_loop()
+        # called from the worker thread
+        def progress(done: float):
+            loop.call_soon_threadsafe(self._advance, job, done)
+
+        async with self._lock:
+            job.status = JobStatus.PROCESSING
+            await self.on_update(job.model_copy())
+            try:
+                os.makedirs(self.root, exist_ok=True)
+                out_path = os.path.join(self.root, f"merge-{int(time.time() * 1000)}.wav")
+                job.result = await asyncio.to_thread(
+                    merge_tracks, tracks, out_path,
+                    refine=req.refine,
+                    max_lag_ms=req.max_lag_ms,
+                    normalize=req.normalize,
+                    progress=progress
+                )
+                self.latest = job.result
+                job.progress = 1
+                job.status = JobStatus.DONE
+            except Exception as e:
+                print(f"[export] merge failed: {e}")
+                job.error = str(e)
+                job.status = JobStatus.FAILED
+
+            job.finished = int(time.time() * 1000)
+            await self.on_update(job.model_copy())
+
+
+    def _advance(self, job: MergeJob, done: float):
+        if job.status != JobStatus.PROCESSING or done - job.progress < PROGRESS_STEP:
+            return
+        job.progress = round(done, 3)
+        spawn(self.on_update(job.model_copy()))
@@ -0,0 +1,225 @@
+from typing import Callable, Dict, List, Optional, Tuple, Union
+import math
+import time
+
+
+# histograms count integer microseconds in log-linear buckets like
+# HdrHistogram: every power of two is split into 2^SUB_BITS buckets, so a
+# recorded value is off by at most 1/2^SUB_BITS (~6%) whatever its size
+SUB_BITS = 4
+_SUB = 1 << SUB_BITS
+MAX_US = 1 << 36 # ~19h, larger values land in the last bucket
+_BUCKETS = (36 - SUB_BITS + 2) << SUB_BITS
+EXPORT_BOUNDS_US = [1 << e for e in range(26)] # le buckets in /metrics: 1us .. ~33s, powers of two
+QUANTILES = (0.5, 0.9, 0.99, 0.999)
+
+LabelValues = Tuple[str, ...]
+
+
+def _index(us: int) -> int:
+    if us < _SUB:
+        return max(0, us)
+    us = min(us, MAX_US - 1)
+    e = us.bit_length() - 1
+    return ((e - SUB_BITS + 1) << SUB_BITS) + (us >> (e - SUB_BITS)) - _SUB
+
+
+# [lower, upper) of a bucket, in us
+def _bounds(index: int) -> Tuple[int, int]:
+    if index < _SUB:
+        return index, index + 1
+    block, m = index >> SUB_BITS, (index & (_SUB - 1)) + _SUB
+    return m << (block - 1), (m + 1) << (block - 1)
+
+
+def _fmt(v: float) -> str:
+    if v == math.inf:
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+def _labels(names: Tuple[str, ...], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{n}="{v}"' for n, v in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+
+class Counter:
+    __slots__ = ('value',)
+    def __init__(self):
+        self.value: int = 0
+
+
+    def inc(self, n: int = 1):
+        self.value += n
+
+
+
+class Histogram:
+    __slots__ = ('counts', 'count', 'sum_us')
+    def __init__(self):
+        self.counts: List[int] = [0] * _BUCKETS
+        self.count: int = 0
+        self.sum_us: int = 0
+
+
+    def record_us(self, us: int):
+        self.counts[_index(us)] += 1
+        self.count += 1
+        self.sum_us += us
+
+
+    def record_s(self, seconds: float):
+        self.record_us(int(seconds * 1_000_000))
+
+
+    # with HIST.time(): ...
+    def time(self) -> "_Timer":
+        return _Timer(self)
+
+
+    # upper bound of the bucket holding the q-th value, in us
+    def quantile_us(self, q: float) -> int:
+        if not self.count:
+            return 0
+        rank = max(1, math.ceil(q * self.count))
+        seen = 0
+        for i, n in enumerate(self.counts):
+            seen += n
+            if seen >= rank:
+                return _bounds(i)[1]
+        return MAX_US
+
+
+    def cumulative_us(self, bounds: List[int]) -> List[int]:
+        out, seen, i = [], 0, 0
+        for bound in bounds:
+            # buckets never straddle a power of two, so `le` bounds are exact
+            while i < _BUCKETS and _bounds(i)[1] <= bound:
+                seen += self.counts[i]
+                i += 1
+            out.append(seen)
+        return out
+
+
+class _Timer:
+    __slots__ = ('hist', 'began')
+    def __init__(self, hist: Histogram):
+        self.hist: Histogram = hist
+        self.began: int = 0
+
+
+    def __enter__(self):
+        self.began = time.perf_counter_ns()
+        return self
+
+
+    def __exit__(self, *exc):
+        self.hist.record_us((time.perf_counter_ns() - self.began) // 1000)
+        return False
+
+
+
+Metric = Union[Counter, Histogram]
+
+# a metric name with its children, one per combination of label values
+class Family:
+    __slots__ = ('name', 'help', 'kind', 'label_names', 'children', '_make', 'read')
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        kind: str,
+        label_names: Tuple[str, ...] = (),
+        read: Optional[Callable[[], float]] = None
+    ):
+        self.name: str = name
+        self.help: str = help
+        self.kind: str = kind # counter, gauge or histogram
+        self.label_names: Tuple[str, ...] = label_names
+        self.children: Dict[LabelValues, Metric] = {}
+        self._make = Histogram if kind == "histogram" else Counter
+        self.read: Optional[Callable[[], float]] = read # gauges are read at scrape time
+
+
+    def labels(self, *values: str) -> Metric:
+        child = self.children.get(values)
+        if child is None:
+            child = self.children[values] = self._make()
+        return child
+
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        if self.kind == "gauge":
+            assert self.read
+            lines.append(f"{self.name} {_fmt(self.read())}")
+            return lines
+
+        for values, child in sorted(self.children.items()):
+            if isinstance(child, Counter):
+                lines.append(f"{self.name}{_labels(self.label_names, values)} {child.value}")
+                continue
+            counts = child.cumulative_us(EXPORT_BOUNDS_US) + [child.count]
+            for bound, seen in zip(EXPORT_BOUNDS_US + [math.inf], counts):
+                le = 'le="%s"' % _fmt(bound if bound == math.inf else bound / 1e6)
+                lines.append(f"{self.name}_bucket{_labels(self.label_names, values, le)} {seen}")
+            lines.append(f"{self.name}_sum{_labels(self.label_names, values)} {_fmt(child.sum_us / 1e6)}")
+            lines.append(f"{self.name}_count{_labels(self.label_names, values)} {child.count}")
+
+        # what the fine buckets give that the exported ones can't
+        if self.kind == "histogram" and self.children:
+            lines.append(f"# HELP {self.name}_quantile {self.help}, quantiles within ~6%")
+            lines.append(f"# TYPE {self.name}_quantile gauge")
+            for values, child in sorted(self.children.items()):
+                for q in QUANTILES:
+                    label = _labels(self.label_names, values, f'quantile="{q}"')
+                    lines.append(f"{self.name}_quantile{label} {_fmt(child.quantile_us(q) / 1e6)}")
+        return lines
+
+
+
+class Registry:
+    def __init__(self):
+        self._families: Dict[str, Family] = {}
+
+
+    def _family(self, name: str, help: str, kind: str, label_names: Tuple[str, ...], read=None) -> Family:
+        family = self._families.get(name)
+        if family is None:
+            family = self._families[name] = Family(name, help, kind, label_names, read)
+        return family
+
+
+    def counter(self, name: str, help: str, labels: Tuple[str, ...] = ()) -> Family:
+        return self._family(name, help, "counter", labels)
+
+
+    def histogram(self, name: str, help: str, labels: Tuple[str, ...] = ()) -> Family:
+        return self._family(name, help, "histogram", labels)
+
+
+    # the latest read() wins, so a new AppState can rebind it
+    def gauge(self, name: str, help: str, read: Callable[[], float]) -> Family:
+        family = self._family(name, help, "gauge", (), read)
+        family.read = read
+        return family
+
+
+    # Prometheus text format 0.0.4
+    def render(self) -> str:
+        lines: List[str] = []
+        for family in self._families.values():
+            lines.extend(family.render())
+        return "\n".join(lines) + "\n"
+
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+counter = REGISTRY.counter
+histogram = REGISTRY.histogram
+gauge = REGISTRY.gauge
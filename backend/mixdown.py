@@ -0,0 +1,222 @@
+from typing import Callable, Dict, List, Optional
+import os
+import shutil
+import subprocess
+import time
+import wave
+import numpy as np
+from backend.audio import pcm_to_mono
+from backend.merge import MergeError, MergeResult, Track, wav_info, DEFAULT_RATE
+
+
+BLOCK_S = 1.0 # seconds mixed per block
+REFINE_WINDOW_S = 20.0 # audio compared when refining the alignment
+REFINE_MIN_CORR = 0.3 # weaker correlation peaks are ignored
+PEAK_TARGET = 0.98 # of full scale, when normalizing
+
+
+# decodes a track to mono float32 blocks. Wav is read directly, anything
+# else (or a wav at another rate) is piped through ffmpeg.
+class TrackReader:
+    def __init__(self, path: str, rate: int):
+        self.rate = rate
+        self._wav: Optional[wave.Wave_read] = None
+        self._proc: Optional[subprocess.Popen] = None
+
+        info = wav_info(path)
+        if info and info[0] == rate:
+            self._wav = wave.open(path, "rb")
+            self._channels = self._wav.getnchannels()
+            self._width = self._wav.getsampwidth()
+            return
+
+        ffmpeg = shutil.which("ffmpeg")
+        if not ffmpeg:
+            raise MergeError(f"ffmpeg is needed to decode {os.path.basename(path)}")
+        self._proc = subprocess.Popen(
+            [ffmpeg, "-v", "error", "-i", path, "-f", "f32le", "-ac", "1", "-ar", str(rate), "-"],
+            stdout=subprocess.PIPE
+        )
+
+
+    def read(self, frames: int) -> np.ndarray:
+        if self._wav:
+            return pcm_to_mono(self._wav.readframes(frames), self._width, self._channels)
+        assert self._proc and self._proc.stdout
+        # a pipe may return fewer bytes than asked for, even part of a sample
+        want = max(0, frames) * 4
+        raw = b""
+        while len(raw) < want and (chunk := self._proc.stdout.read(want - len(raw))):
+            raw += chunk
+        return np.frombuffer(raw[: len(raw) // 4 * 4], dtype="<f4")
+
+
+    def skip(self, frames: int):
+        if self._wav:
+            pos = min(self._wav.tell() + frames, self._wav.getnframes())
+            self._wav.setpos(pos)
+            return
+        while frames > 0:
+            n = min(frames, self.rate * 10)
+            if len(self.read(n)) < n:
+                return
+            frames -= n
+
+
+    def close(self):
+        if self._wav:
+            self._wav.close()
+        if self._proc:
+            self._proc.kill()
+            self._proc.wait()
+
+
+def _read_window(track: Track, rate: int, start: int, frames: int) -> np.ndarray:
+    pad = max(0, -start)
+    reader = TrackReader(track.path, rate)
+    try:
+        if start > 0:
+            reader.skip(start)
+        data = reader.read(frames - pad)
+    finally:
+        reader.close()
+    if pad:
+        data = np.concatenate([np.zeros(pad, dtype=np.float32), data])
+    return data
+
+
+def _track_frames(track: Track, rate: int) -> int:
+    info = wav_info(track.path)
+    if info and info[0] == rate:
+        with wave.open(track.path, "rb") as w:
+            return w.getnframes()
+    # no cheap length for compressed files, count the decoded stream
+    reader = TrackReader(track.path, rate)
+    total = 0
+    try:
+        while n := len(reader.read(rate * 10)):
+            total += n
+    finally:
+        reader.close()
+    return total
+
+
+# lag (in frames) of `x` relative to `ref`, searched in [-max_lag, max_lag].
+# Returns (lag, normalized correlation at the peak).
+def _xcorr_lag(ref: np.ndarray, x: np.ndarray, max_lag: int):
+    n = len(ref)
+    if n == 0 or len(x) < n + 2 * max_lag:
+        return 0, 0.0
+    ref = ref - ref.mean()
+    x = x - x.mean()
+    size = 1 << int(np.ceil(np.log2(n + len(x))))
+    corr = np.fft.irfft(np.fft.rfft(x, size) * np.conj(np.fft.rfft(ref, size)), size)[: 2 * max_lag + 1]
+
+    # energy of every x window, for a normalized coefficient
+    csum = np.concatenate([[0.0], np.cumsum(x.astype(np.float64) ** 2)])
+    energy = csum[n: n + 2 * max_lag + 1] - csum[: 2 * max_lag + 1]
+    denom = np.sqrt(energy * float(np.dot(ref, ref))) + 1e-12
+    coeff = corr / denom
+
+    k = int(np.argmax(coeff))
+    return k - max_lag, float(coeff[k])
+
+
+# mixes `tracks` into a 16-bit mono wav at `out_path`, block by block. Memory
+# is bounded by one block per track whatever the length of the recordings.
+# `progress` is called with the fraction of blocks mixed so far.
+def merge_tracks(
+    tracks: List[Track],
+    out_path: str,
+    refine: bool = False,
+    max_lag_ms: float = 200,
+    normalize: bool = True,
+    progress: Optional[Callable[[float], None]] = None
+) -> MergeResult:
+    if not tracks:
+        raise MergeError("nothing to merge")
+    began = time.perf_counter()
+
+    rate = next((info[0] for t in tracks if (info := wav_info(t.path))), DEFAULT_RATE)
+    origin = min(t.start_ms for t in tracks)
+    offsets = {t.rec_id: round((t.start_ms - origin) * rate / 1000) for t in tracks}
+    lengths = {t.rec_id: _track_frames(t, rate) for t in tracks}
+
+    refined: Dict[str, float] = {}
+    if refine and len(tracks) > 1:
+        ref = tracks[0]
+        max_lag = int(max_lag_ms * rate / 1000)
+        window = int(REFINE_WINDOW_S * rate)
+        for t in tracks[1:]:
+            # compare from where both tracks have audio
+            at = max(offsets[ref.rec_id], offsets[t.rec_id]) + max_lag
+            a = _read_window(ref, rate, at - offsets[ref.rec_id], window)
+            b = _read_window(t, rate, at - offsets[t.rec_id] - max_lag, len(a) + 2 * max_lag)
+            lag, corr = _xcorr_lag(a, b, max_lag)
+            if lag and corr >= REFINE_MIN_CORR:
+                offsets[t.rec_id] -= lag
+                refined[t.rec_id] = round(-lag * 1000 / rate, 3)
+
+        # a refined offset may have become negative
+        shift = min(offsets.values())
+        if shift < 0:
+            offsets = {k: v - shift for k, v in offsets.items()}
+
+    total = max(offsets[t.rec_id] + lengths[t.rec_id] for t in tracks)
+    block = int(BLOCK_S * rate)
+    # normalizing mixes everything twice, once to find the peak
+    steps = -(-total // block) * (2 if normalize else 1)
+    done = 0
+
+    gain = 1.0
+    if normalize:
+        peak = 0.0
+        for mixed in _mix(tracks, rate, offsets, total, block):
+            peak = max(peak, float(np.abs(mixed).max()))
+            done += 1
+            if progress:
+                progress(done / steps)
+        if peak > 0:
+            gain = PEAK_TARGET / peak
+
+    tmp = out_path + ".part"
+    with wave.open(tmp, "wb") as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(rate)
+        for mixed in _mix(tracks, rate, offsets, total, block):
+            pcm = np.clip(mixed * gain, -1.0, 1.0)
+            out.writeframes((pcm * 32767).astype("<i2").tobytes())
+            done += 1
+            if progress:
+                progress(done / steps)
+    os.replace(tmp, out_path)
+
+    return MergeResult(
+        id=os.path.splitext(os.path.basename(out_path))[0],
+        filename=os.path.basename(out_path),
+        sample_rate=rate,
+        duration_s=round(total / rate, 3),
+        offsets_ms={k: round(v * 1000 / rate, 3) for k, v in offsets.items()},
+        refined_ms=refined,
+        elapsed_s=round(time.perf_counter() - began, 3),
+        created=int(time.time() * 1000)
+    )
+
+
+def _mix(tracks: List[Track], rate: int, offsets: Dict[str, int], total: int, block: int):
+    readers = [(TrackReader(t.path, rate), offsets[t.rec_id]) for t in tracks]
+    try:
+        for pos in range(0, total, block):
+            n = min(block, total - pos)
+            mixed = np.zeros(n, dtype=np.float32)
+            for reader, offset in readers:
+                begin = max(0, offset - pos) # silence before the track starts
+                if begin >= n:
+                    continue
+                data = reader.read(n - begin)
+                mixed[begin: begin + len(data)] += data
+            yield mixed
+    finally:
+        for reader, _ in readers:
+            reader.close()
@@ -0,0 +1,101 @@
+from typing import List, Optional, Tuple
+import math
+import os
+import struct
+import numpy as np
+from backend.merge import wav_info, DEFAULT_RATE
+from backend.mixdown import TrackReader
+
+
+BASE_SPP = 256 # samples per min/max pair at the finest level
+MIN_PAIRS = 512 # levels stop halving below this many pairs
+BLOCK_PAIRS = 4096 # pairs computed per read
+
+# like audiowaveform's .dat: a header, the pair count of every level, then
+# each level as interleaved int8 (min, max) pairs, finest first
+_MAGIC = b"PEAK"
+_VERSION = 1
+_HEADER = struct.Struct("<4sHIIQH") # magic, version, sample rate, base spp, frames, levels
+
+
+
+def _to_int8(x: np.ndarray, round_up: bool) -> np.ndarray:
+    scaled = np.ceil(x * 127) if round_up else np.floor(x * 127)
+    return np.clip(scaled, -128, 127).astype(np.int8)
+
+
+def _halve(mins: np.ndarray, maxs: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    if len(mins) % 2:
+        mins = np.append(mins, mins[-1])
+        maxs = np.append(maxs, maxs[-1])
+    return mins.reshape(-1, 2).min(axis=1), maxs.reshape(-1, 2).max(axis=1)
+
+
+# one pass over the decoded audio for the finest level, the coarser ones
+# are halvings of it
+def build_peaks(src: str, out: str):
+    info = wav_info(src)
+    rate = info[0] if info else DEFAULT_RATE
+    reader = TrackReader(src, rate)
+    mins: List[np.ndarray] = []
+    maxs: List[np.ndarray] = []
+    frames = 0
+    try:
+        while True:
+            block = reader.read(BASE_SPP * BLOCK_PAIRS)
+            if not len(block):
+                break
+            frames += len(block)
+            pad = -len(block) % BASE_SPP
+            if pad:
+                block = np.append(block, np.full(pad, block[-1]))
+            pairs = block.reshape(-1, BASE_SPP)
+            mins.append(_to_int8(pairs.min(axis=1), round_up=False))
+            maxs.append(_to_int8(pairs.max(axis=1), round_up=True))
+    finally:
+        reader.close()
+
+    levels = [(np.concatenate(mins), np.concatenate(maxs))] if mins else [(np.zeros(0, np.int8), np.zeros(0, np.int8))]
+    while len(levels[-1][0]) > MIN_PAIRS:
+        levels.append(_halve(*levels[-1]))
+
+    tmp = out + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(_HEADER.pack(_MAGIC, _VERSION, rate, BASE_SPP, frames, len(levels)))
+        f.write(struct.pack(f"<{len(levels)}I", *(len(lo) for lo, _ in levels)))
+        for lo, hi in levels:
+            f.write(np.stack([lo, hi], axis=1).tobytes())
+    os.replace(tmp, out)
+
+
+# the pairs covering [start, end) seconds at the coarsest level that still
+# gives `width` pairs or more. ValueError for anything but a whole index.
+def read_peaks(path: str, start: float, end: Optional[float], width: int):
+    with open(path, "rb") as f:
+        try:
+            magic, version, rate, base_spp, frames, nlevels = _HEADER.unpack(f.read(_HEADER.size))
+            if magic != _MAGIC or version != _VERSION or not rate or not base_spp or not nlevels:
+                raise ValueError(f"not a peak index: {path}")
+            counts = struct.unpack(f"<{nlevels}I", f.read(4 * nlevels))
+        except struct.error:
+            raise ValueError(f"truncated peak index: {path}") from None
+        # every level must be all there, a file cut short by a crash is rebuilt
+        if os.fstat(f.fileno()).st_size != _HEADER.size + 4 * nlevels + 2 * sum(counts):
+            raise ValueError(f"truncated peak index: {path}")
+
+        first = max(0, int(start * rate))
+        last = frames if end is None else min(frames, int(math.ceil(end * rate)))
+        span = max(0, last - first)
+        level = 0
+        while level + 1 < nlevels and base_spp << (level + 1) <= span / width:
+            level += 1
+        spp = base_spp << level
+
+        lo = first // spp
+        hi = min(counts[level], -(-last // spp))
+        f.seek(_HEADER.size + 4 * nlevels + 2 * sum(counts[:level]) + 2 * lo)
+        raw = f.read(2 * max(0, hi - lo))
+        if len(raw) != 2 * max(0, hi - lo):
+            raise ValueError(f"truncated peak index: {path}")
+        data = np.frombuffer(raw, dtype=np.int8)
+    return rate, spp, lo * spp / rate, frames / rate, data
@@ -1,23 +1,47 @@
+from collections import deque
 from enum import Enum
-from typing import Optional, List, Dict, Union, Literal
+from types import MappingProxyType
+from typing import TYPE_CHECKING, Any, Awaitable, Deque, Optional, List, Dict, Mapping, Tuple, Union, Literal, Callable
 import asyncio
+import hmac
+import os
+import secrets
 import socket
 import time
 from fastapi import WebSocket
-from pydantic import BaseModel, Field, ValidationError
-from zeroconf.asyncio import AsyncZeroconf, AsyncServiceInfo
-from backend.utils import get_local_ip, get_random_name
-
-
+from pydantic import BaseModel, ConfigDict, Field, TypeAdapter, ValidationError
+from backend.utils import get_local_ip, get_random_name, spawn
+from backend.qr import QRCache
+from backend.recordings import RecordingsHandler, Recording, RecordingStatus, JobStatus
+from backend.enhance import EnhanceScheduler, EnhanceJob
+from backend.media import PreviewCache
+from backend.live import LiveIngest, LiveLevels
+from backend import metrics, wire
+from backend.waveform import WaveformStore
+from backend.transcription import TranscriptionService, TranscriptJob, TranscriptSegment, MergedTranscript
+from backend.merge import Exporter, MergeJob
+from backend.clock import ClockEstimator, SyncEstimate, TriggerScheduler, TriggerPlan, now_us
+from backend.clock import DELIVERY_PROBABILITY, MAX_SYNC_AGE_MS, SAFETY_MS
+
+if TYPE_CHECKING:
+    from zeroconf.asyncio import AsyncZeroconf, AsyncServiceInfo
+
+
+# never changed in place, a change is a new copy, so the same instance can be
+# handed to any number of readers (see SessionsHandler)
 class SessionMetadata(BaseModel):
+    model_config = ConfigDict(frozen=True)
+
     id: str
     name: str = Field(min_length=1, max_length=50)
     ip: str
     battery: int = -1
     device: str
-    theta: float = -1
+    theta: float = -1 # filtered offset, see backend.clock
     last_rtt: float = -1
     last_sync: Optional[int] = None
+    drift_ppm: float = 0
+    sync_confidence: float = 0 # 0..1
 
 class ServerInfo(BaseModel):
     name: str = Field(min_length=1, max_length=50)
@@ -38,6 +62,7 @@ class SessionStageRequestMsg(BaseModel):
 class SessionStageResponseMsg(BaseModel): # server -> session
     event: Literal[RESTEvents.SESSION_STAGED] = RESTEvents.SESSION_STAGED
     body: SessionMetadata
+    resume_token: str # kept by the recorder for SESSION_RESUME
 
 
 
@@ -48,6 +73,17 @@ class Rename(BaseModel):
 class WSActionTarget(BaseModel):
     session_id: str
     trigger_time: Optional[int] = None
+    theta: Optional[float] = None # server's filtered offset of the target at trigger_time
+
+# session -> server, first message on a new /ws/control after the old one
+# dropped, instead of SESSION_ACTIVATE
+class SessionResume(BaseModel):
+    session_id: str
+    resume_token: str
+
+class WSGroupTarget(BaseModel):
+    session_ids: Optional[List[str]] = None # None targets every active session
+    trigger_time: Optional[int] = None
 
 class WSKind(str, Enum):
     ACTION = "action"
@@ -65,10 +101,23 @@ class WSErrors(str, Enum):
 class WSEvents(str, Enum): # these are facts that should be notified
     DASHBOARD_INIT = "dashboard_init" # dashboard[None]::server 
     DASHBOARD_RENAME = "dashboard_rename" # dashboard[Rename]::server::session
+    DASHBOARD_CONTROL = "dashboard_control" # server[DashboardControl]::dashboard, on every election
     SESSION_UPDATE = "session_update" # session[SessionMetadata]::server::dashboard
     SESSION_ACTIVATE = "session_activate" # session[SessionMetadata]::
     SESSION_ACTIVATED = "session_activated" # server[SessionMetadata]::dashboard
     SESSION_LEFT = "session_left" # server[SessionMetadata]::dashboard
+    SESSION_SUSPENDED = "session_suspended" # server[SessionMetadata]::dashboard, control socket lost, may resume
+    SESSION_RESUME = "session_resume" # session[SessionResume]::server
+    SESSION_RESUMED = "session_resumed" # server[SessionMetadata]::session::dashboard
+    SESSION_BATCH = "session_batch" # server[SessionBatch]::dashboard, coalesced SESSION_UPDATEs
+    GROUP_STATUS = "group_status" # server[WSGroupStatus]::dashboard
+    RECORDING_UPDATE = "recording_update" # server[Recording]::dashboard
+    TRANSCRIPT_UPDATE = "transcript_update" # server[TranscriptJob]::dashboard
+    TRANSCRIPT_SEGMENT = "transcript_segment" # server[TranscriptSegment]::dashboard
+    TRANSCRIPT_MERGED = "transcript_merged" # server[MergedTranscript]::dashboard
+    ENHANCE_UPDATE = "enhance_update" # server[EnhanceJob]::dashboard
+    MERGE_UPDATE = "merge_update" # server[MergeJob]::dashboard
+    LIVE_LEVELS = "live_levels" # server[LiveLevels]::dashboard, while a take streams in
     SUCCESS="success" # session[SessionMetadata]::server::dashboard
     FAIL="failed" # session[SessionMetadata]::server::dashboard
 
@@ -77,20 +126,50 @@ class WSActions(str, Enum): # these are intents of session or dashboard
     STOP = "stop" # dashboard[WSActionTarget]::server::target_session
     STARTED = "started" # session[session_id]::server::dashboard
     STOPPED = "stopped" # session[session_id]::server::dashboard
+    START_GROUP = "start_group" # dashboard[WSGroupTarget]::server::target_sessions
+    STOP_GROUP = "stop_group" # dashboard[WSGroupTarget]::server::target_sessions
+
+
+# a dashboard connects as /ws/control?role=monitor to never be given control
+class DashboardRole(str, Enum):
+    CONTROLLER = "controller" # may START/STOP
+    MONITOR = "monitor" # read only
+
+class DashboardControl(BaseModel):
+    role: DashboardRole
+    dashboards: int # subscribed right now, this one included
+
+
+# latest metadata of every session that changed since the last batch
+class SessionBatch(BaseModel):
+    sessions: List[SessionMetadata]
+
+
+# aggregated acknowledgements of a group action
+class WSGroupStatus(BaseModel):
+    action: WSActions
+    trigger_time: Optional[int] = None
+    acked: List[str] = []
+    pending: List[str] = []
+    failed: List[str] = [] # not active or evicted while sending
+    stale: List[str] = [] # started without a fresh clock sync
 
 
 class WSPayload(BaseModel):
     kind: WSKind
     msg_type: Union[WSActions, WSEvents, WSErrors]
-    body: Optional[Union[SessionMetadata, WSActionTarget, Rename]] = None
+    body: Optional[Union[SessionMetadata, WSActionTarget, WSGroupTarget, WSGroupStatus, Recording, TranscriptJob, TranscriptSegment, MergedTranscript, EnhanceJob, MergeJob, LiveLevels, SessionBatch, DashboardControl, Rename]] = None
 
 
 
 # Clock Sync Models : endpoint => /ws/sync, no timestamps or versioning
+# /ws/sync/{id}?precision=us switches t2/t3 to microseconds, and the client
+# then reports theta and rtt in microseconds too. ?encoding=binary replaces
+# these three with the struct frames of wire.SYNC_*.
 class SyncRequest(BaseModel): # client -> server (The ping)
     t1: int
 
-class SyncResponse(BaseModel): # server -> client (The pong)
+class SyncResponse(BaseModel): # server -> client (The pong), hand-encoded in SyncHandler
     type: str = "SYNC_RESPONSE" # to distingush on client side
     t1: int
     t2: int
@@ -110,75 +189,314 @@ class QRData(BaseModel):
 
 
 async def send_error(ws: WebSocket, type: WSErrors):
-    msg = WSPayload(kind=WSKind.ERROR, msg_type=type).model_dump()
-    print(msg)
-    await ws.send_json(msg)
+    msg = WSPayload(kind=WSKind.ERROR, msg_type=type)
+    print(msg.model_dump())
+    await wire.send(ws, wire.encode(msg, wire.encoding_of(ws)))
 
 def now_ms():
-    return time.time_ns() // 1_000_000
+    return now_us() // 1_000
+
+
+SEND_TIMEOUT_S = 2.0 # a recorder that can't take a frame within this is evicted
+RESUME_GRACE_S = 30.0 # a session that lost its control socket may resume within this
+
+SESSION_SEND = metrics.histogram("vocalink_session_send_seconds", "time to send a frame to one session, or to every target of a fan-out", ("op",))
+SESSION_SEND_ONE = SESSION_SEND.labels("one")
+SESSION_SEND_FANOUT = SESSION_SEND.labels("fanout")
+SESSION_SEND_FAILURES = metrics.counter("vocalink_session_send_failures_total", "frames a session failed to take in time").labels()
+FANOUT_TARGETS = metrics.counter("vocalink_fanout_frames_total", "frames sent by fan-outs").labels()
+DASHBOARD_PUBLISH = metrics.histogram("vocalink_dashboard_publish_seconds", "time to encode and queue a payload for every dashboard").labels()
+DASHBOARD_DELIVERY = metrics.histogram("vocalink_dashboard_delivery_seconds", "time from queueing a frame to a dashboard having taken it").labels()
+DASHBOARD_DROPPED = metrics.counter("vocalink_dashboard_dropped_total", "superseded frames dropped from a full dashboard queue").labels()
+DASHBOARD_EVICTED = metrics.counter("vocalink_dashboard_evicted_total", "dashboards cut off for not keeping up").labels()
+SYNC_PING = metrics.histogram("vocalink_sync_ping_seconds", "time from a sync ping arriving to its pong being sent").labels()
+SYNC_RTT = metrics.histogram("vocalink_sync_rtt_seconds", "round trip times reported by recorders").labels()
+TRIGGER_PLAN = metrics.histogram("vocalink_trigger_plan_seconds", "time to plan the trigger time of a START").labels()
+TRIGGER_STALE = metrics.counter("vocalink_trigger_stale_total", "sessions started without a fresh clock sync").labels()
+SUSPENSIONS = metrics.counter("vocalink_session_suspensions_total", "sessions that lost their control socket, by how that ended", ("outcome",))
+SUSPENSIONS_RESUMED = SUSPENSIONS.labels("resumed")
+SUSPENSIONS_EXPIRED = SUSPENSIONS.labels("expired")
+CONTROL_DISPATCH = metrics.histogram("vocalink_control_dispatch_seconds", "time to handle one /ws/control message", ("msg_type",))
+
+async def _send_frame(ws: WebSocket, frame: wire.Frame, timeout: float) -> bool:
+    try:
+        await asyncio.wait_for(wire.send(ws, frame), timeout)
+        return True
+    except Exception:
+        return False
+
+
+# serializes payload once per encoding in use and sends it to every target
+# concurrently. returns the ids whose send failed or timed out.
+async def fan_out(
+    targets: List[Tuple[str, WebSocket]],
+    payload: WSPayload,
+    timeout: float = SEND_TIMEOUT_S
+) -> List[str]:
+    if not targets:
+        return []
+    frames: Dict[wire.Encoding, wire.Frame] = {}
+    for _, ws in targets:
+        enc = wire.encoding_of(ws)
+        if enc not in frames:
+            frames[enc] = wire.encode(payload, enc)
+    return await fan_out_frames([(sid, ws, frames[wire.encoding_of(ws)]) for sid, ws in targets], timeout)
+
+
+# same as fan_out, but every target gets its own pre-encoded frame
+async def fan_out_frames(
+    targets: List[Tuple[str, WebSocket, wire.Frame]],
+    timeout: float = SEND_TIMEOUT_S
+) -> List[str]:
+    if not targets:
+        return []
+    with SESSION_SEND_FANOUT.time():
+        results = await asyncio.gather(
+            *(_send_frame(ws, frame, timeout) for _, ws, frame in targets)
+        )
+    FANOUT_TARGETS.inc(len(targets))
+    failed = [sid for (sid, _, _), ok in zip(targets, results) if not ok]
+    SESSION_SEND_FAILURES.inc(len(failed))
+    return failed
 
 
+async def _close_quietly(ws: WebSocket, code: int = 1000):
+    try:
+        await asyncio.wait_for(ws.close(code=code), SEND_TIMEOUT_S)
+    except Exception:
+        pass
 
+
+
+DASHBOARD_UPDATE_HZ = 4 # session updates reach the dashboards in at most this many frames a second
+DASHBOARD_QUEUE_SIZE = 64 # frames buffered per dashboard before the slow consumer policy kicks in
+
+
+class _Subscriber:
+    __slots__ = ('ws', 'encoding', 'monitor_only', 'frames', 'ready', 'writer', 'dropped')
+    def __init__(self, ws: WebSocket):
+        self.ws: WebSocket = ws
+        self.encoding: wire.Encoding = wire.encoding_of(ws)
+        self.monitor_only: bool = ws.query_params.get("role") == DashboardRole.MONITOR.value
+        self.frames: Deque[Tuple[wire.Frame, bool, int]] = deque() # (frame, droppable, queued at ns), oldest first
+        self.ready: asyncio.Event = asyncio.Event()
+        self.writer: Optional[asyncio.Task] = None
+        self.dropped: int = 0 # superseded batches thrown away for being slow
+
+
+# any number of dashboards subscribe, one of them is the elected controller:
+# the first that didn't ask to be a monitor, then the oldest such one left.
+# A publish is encoded once per encoding and only queued; every subscriber
+# has its own writer, so a slow tablet never holds up the control path. A
+# full queue first loses its oldest session batch (a later one supersedes
+# it), and a dashboard that can't even keep up with the rest is cut off.
 class DashboardHandler:
-    def __init__(self):
-        self._dashboard: Optional[WebSocket] = None
-        self.lock = asyncio.Lock()
+    def __init__(self, update_hz: float = DASHBOARD_UPDATE_HZ, queue_size: int = DASHBOARD_QUEUE_SIZE):
+        self._subs: Dict[WebSocket, _Subscriber] = {} # oldest first
+        self._controller: Optional[WebSocket] = None
+        self.queue_size = queue_size
+        self.update_interval = 1 / update_hz
+        self._pending: Dict[str, SessionMetadata] = {} # session_id -> latest unsent update
+        self._flush: Optional[asyncio.Task] = None
+        self._last_flush = 0.0
 
 
-    def ws(self) -> Optional[WebSocket]:
-        return self._dashboard
+    def is_subscribed(self, ws: WebSocket) -> bool:
+        return ws in self._subs
 
 
-    async def assign(self, ws: WebSocket):
-        async with self.lock:
-            if self._dashboard and self._dashboard != ws:
-                try:
-                    await self._dashboard.close()
-                except Exception:
-                    pass 
-            self._dashboard = ws
+    def is_controller(self, ws: WebSocket) -> bool:
+        return ws == self._controller
 
 
-    async def drop(self, ws: WebSocket):
-        async with self.lock:
-            if self._dashboard == ws:
-                self._dashboard = None
+    def available(self) -> bool:
+        return bool(self._subs)
 
 
-    async def notify(self, payload: WSPayload):
-        if not self._dashboard:
-            return 
-        try:
-            await self._dashboard.send_json(payload.model_dump())
-        except Exception:
-            await self.drop(self._dashboard)
+    def count(self) -> int:
+        return len(self._subs)
 
 
-    async def available(self) -> bool:
-        async with self.lock:
-            return self._dashboard is not None
+    async def subscribe(self, ws: WebSocket):
+        if ws in self._subs:
+            return
+        sub = self._subs[ws] = _Subscriber(ws)
+        sub.writer = asyncio.create_task(self._write(sub))
+        if self._controller is None and not sub.monitor_only:
+            self._controller = ws
+        self._announce()
+
+
+    async def unsubscribe(self, ws: WebSocket):
+        self._remove(ws)
+
+
+    def _remove(self, ws: WebSocket):
+        sub = self._subs.pop(ws, None)
+        if not sub:
+            return
+        if sub.writer and sub.writer is not asyncio.current_task():
+            sub.writer.cancel()
+        if self._controller == ws:
+            self._controller = next((s.ws for s in self._subs.values() if not s.monitor_only), None)
+            if self._controller:
+                print("dashboard control handed to the next dashboard.")
+        self._announce()
+
+
+    # tells every dashboard its role, after each change of the electorate
+    def _announce(self):
+        for sub in list(self._subs.values()):
+            role = DashboardRole.CONTROLLER if sub.ws == self._controller else DashboardRole.MONITOR
+            payload = WSPayload(
+                kind=WSKind.EVENT,
+                msg_type=WSEvents.DASHBOARD_CONTROL,
+                body=DashboardControl(role=role, dashboards=len(self._subs))
+            )
+            self._enqueue(sub, wire.encode(payload, sub.encoding), droppable=False)
+
+
+    def _publish(self, payload: WSPayload, droppable: bool = False):
+        if not self._subs:
+            return
+        with DASHBOARD_PUBLISH.time():
+            frames: Dict[wire.Encoding, wire.Frame] = {}
+            for sub in list(self._subs.values()):
+                if sub.encoding not in frames:
+                    frames[sub.encoding] = wire.encode(payload, sub.encoding)
+                self._enqueue(sub, frames[sub.encoding], droppable)
+
+
+    def _enqueue(self, sub: _Subscriber, frame: wire.Frame, droppable: bool):
+        if sub.ws not in self._subs: # cut off earlier in this same publish
+            return
+        if len(sub.frames) >= self.queue_size:
+            stale = next((i for i, (_, d, _) in enumerate(sub.frames) if d), None)
+            if stale is None:
+                print(f"[warn] dashboard {sub.ws.client} can't keep up, disconnecting it")
+                DASHBOARD_EVICTED.inc()
+                self._remove(sub.ws)
+                spawn(_close_quietly(sub.ws, 1013))
+                return
+            del sub.frames[stale]
+            sub.dropped += 1
+            DASHBOARD_DROPPED.inc()
+        sub.frames.append((frame, droppable, time.perf_counter_ns()))
+        sub.ready.set()
+
+
+    async def _write(self, sub: _Subscriber):
+        while True:
+            await sub.ready.wait()
+            while sub.frames:
+                frame, _, queued = sub.frames.popleft()
+                if not await _send_frame(sub.ws, frame, SEND_TIMEOUT_S):
+                    self._remove(sub.ws)
+                    return
+                DASHBOARD_DELIVERY.record_us((time.perf_counter_ns() - queued) // 1000)
+            sub.ready.clear()
+
+
+    # queued right away. A session that left or was suspended takes its
+    # unsent update with it, so no dashboard hears of it after SESSION_LEFT or
+    # SESSION_SUSPENDED. Droppable payloads are the ones a later one supersedes.
+    async def notify(self, payload: WSPayload, droppable: bool = False):
+        if payload.msg_type in (WSEvents.SESSION_LEFT, WSEvents.SESSION_SUSPENDED) and isinstance(payload.body, SessionMetadata):
+            self._pending.pop(payload.body.id, None)
+        self._publish(payload, droppable)
+
+
+    # metadata changes (sync reports, battery) are merged per session and
+    # flushed as one SESSION_BATCH frame, at most update_hz times a second
+    def update(self, meta: SessionMetadata):
+        if not self._subs:
+            return
+        self._pending[meta.id] = meta
+        if not self._flush:
+            self._flush = asyncio.create_task(self._flush_pending())
+
+
+    async def _flush_pending(self):
+        loop = asyncio.get_running_loop()
+        await asyncio.sleep(max(0.0, self._last_flush + self.update_interval - loop.time()))
+        self._flush = None
+        self._last_flush = loop.time()
+        pending, self._pending = self._pending, {}
+        if pending:
+            self._publish(
+                WSPayload(
+                    kind=WSKind.EVENT,
+                    msg_type=WSEvents.SESSION_BATCH,
+                    body=SessionBatch(sessions=list(pending.values()))
+                ),
+                droppable=True
+            )
 
 
 
 class Session:
-    __slots__ = ('meta', 'ws') 
-    def __init__(self, meta: SessionMetadata, ws: WebSocket):
+    __slots__ = ('meta', 'ws', 'clock', 'token', 'expiry') 
+    def __init__(self, meta: SessionMetadata, ws: WebSocket, token: str):
         self.meta: SessionMetadata = meta
         self.ws: WebSocket = ws
+        self.clock: ClockEstimator = ClockEstimator()
+        self.token: str = token # proves a resuming recorder is this session's
+        self.expiry: Optional[asyncio.Task] = None # while suspended
+
+
+OnExpired = Callable[[SessionMetadata], Awaitable[None]]
+
+# writers take the lock and never mutate what readers can see: the session
+# tables are copied, changed and swapped in as a whole. Readers take no lock,
+# they read whatever table is current and share its (frozen)
+# SessionMetadata instances instead of copying them. A metadata update (a
+# sync report, a battery level) only replaces its session's meta and drops
+# the metadata snapshot, which the next reader rebuilds: O(1) per update
+# however many sessions there are, O(N) at most once per read.
+#
+# A session whose control socket drops (or is evicted) is suspended, not
+# dropped: it leaves the tables, but its id, metadata, clock and sync channel
+# are kept for resume_grace_s. The recorder takes it back with the token it
+# was staged with, else on_expired is called and it is gone.
+class SessionsHandler:
+    def __init__(self, resume_grace_s: float = RESUME_GRACE_S, on_expired: Optional[OnExpired] = None):
+        self._active: Mapping[str, Session] = MappingProxyType({})
+        self._by_ws: Mapping[WebSocket, str] = MappingProxyType({}) # reverse index of _active, ws -> session_id
+        self._metas: Optional[Mapping[str, SessionMetadata]] = MappingProxyType({}) # session_id -> meta of _active, None once stale
+        self._staging: Dict[str, Tuple[SessionMetadata, str]] = {} # session_id -> meta, resume token
+        self._suspended: Dict[str, Session] = {} # session_id -> session
+        self._lock = asyncio.Lock()
+        self.resume_grace_s = resume_grace_s
+        self.on_expired = on_expired
 
 
-class SessionsHandler: # thread safe
-    def __init__(self):
-        self._active: Dict[str, Session] = {}
-        self._staging: Dict[str, SessionMetadata] = {} # session_id, meta
-        self._lock = asyncio.Lock()
+    # the tables below are only ever replaced, under self._lock
+    def _set_meta(self, session: Session, meta: SessionMetadata):
+        session.meta = meta
+        self._metas = None
+
+
+    def _set_active(self, active: Dict[str, Session], by_ws: Dict[WebSocket, str]):
+        self._active = MappingProxyType(active)
+        self._by_ws = MappingProxyType(by_ws)
+        self._metas = None
+
+
+    # read only view of every active session's metadata, as of now. Built
+    # without awaiting, so no writer can get in between.
+    def snapshot(self) -> Mapping[str, SessionMetadata]:
+        metas = self._metas
+        if metas is None:
+            metas = self._metas = MappingProxyType({sid: s.meta for sid, s in self._active.items()})
+        return metas
+
 
     async def updateMeta(self, new_meta: SessionMetadata) -> SessionMetadata | None:
         async with self._lock:
             session = self._active.get(new_meta.id)
             if session:
                 update_data = new_meta.model_dump(exclude_unset=True)
-                session.meta = session.meta.model_copy(update=update_data)
+                self._set_meta(session, session.meta.model_copy(update=update_data))
                 return session.meta
             return None
                 
@@ -187,124 +505,292 @@ class SessionsHandler: # thread safe
         async with self._lock:
             session = self._active.get(session_id)
             if session:
-                session.meta.name = new_name
+                self._set_meta(session, session.meta.model_copy(update={"name": new_name}))
 
 
     async def getActiveCount(self) -> int:
-        async with self._lock:
-            return len(self._active)
+        return len(self._active)
 
 
     async def is_active(self, session_id: str) -> bool:
-        async with self._lock:
-            return session_id in self._active
+        return session_id in self._active
 
 
     async def exists(self, session_id: str) -> bool:
-        async with self._lock:
-            return (session_id in self._active or session_id in self._staging)
+        return (session_id in self._active or session_id in self._staging or session_id in self._suspended)
+
+
+    async def is_suspended(self, session_id: str) -> bool:
+        return session_id in self._suspended
+
+
+    def count(self) -> int:
+        return len(self._active)
+
+
+    def suspended_count(self) -> int:
+        return len(self._suspended)
 
 
     async def getMetaFromAllActive(self) -> List[SessionMetadata]:
-        async with self._lock:
-            return [s.meta.model_copy() for s in self._active.values()]
+        return list(self.snapshot().values())
 
 
     async def getMetaFromActive(self, session_id: str) -> Optional[SessionMetadata]:
-        async with self._lock:
-            s = self._active.get(session_id)
-            return s.meta.model_copy() if s else None
+        session = self._active.get(session_id)
+        return session.meta if session else None
 
 
-    # puts metadata into staging
-    async def stage(self, meta: SessionMetadata) -> None:
+    # puts metadata into staging, returns the session's resume token
+    async def stage(self, meta: SessionMetadata) -> str:
+        token = secrets.token_urlsafe(16)
         async with self._lock:
-            self._staging[meta.id] = meta
+            self._staging[meta.id] = (meta, token)
+        return token
 
 
-    # release session_id entry from staging and put it into active 
+    # release session_id entry from staging and put it into active. An
+    # active session is only moved to another socket by resume(), which
+    # checks its token: activating it again is a no-op on its own socket
+    # and refused on any other.
     async def commit(self, session_id: str, session_ws: WebSocket) -> Optional[SessionMetadata]:
         async with self._lock:
-            meta = self._staging.pop(session_id, None)
-        
-            if not meta:
-                if session_id in self._active:
-                    self._active[session_id].ws = session_ws
-                    return self._active[session_id].meta
+            staged = self._staging.pop(session_id, None)
+            if not staged:
+                session = self._active.get(session_id)
+                return session.meta if session and session.ws is session_ws else None
+
+            active, by_ws = dict(self._active), dict(self._by_ws)
+            meta, token = staged
+            active[meta.id] = Session(meta, session_ws, token)
+            by_ws[session_ws] = meta.id
+            self._set_active(active, by_ws)
+            return meta
+
+
+    # the session of ws, if it is still its socket, leaves the tables and
+    # waits for a resume. None if there was nothing to suspend.
+    async def suspend(self, session_id: str, ws: WebSocket) -> Optional[SessionMetadata]:
+        async with self._lock:
+            session = self._active.get(session_id)
+            if not session or session.ws is not ws:
                 return None
+            active, by_ws = dict(self._active), dict(self._by_ws)
+            del active[session_id]
+            by_ws.pop(ws, None)
+            self._suspend(session)
+            self._set_active(active, by_ws)
+            return session.meta
 
-            self._active[meta.id] = Session(meta, session_ws)
-            return meta
 
+    # under self._lock
+    def _suspend(self, session: Session):
+        self._suspended[session.meta.id] = session
+        session.expiry = asyncio.create_task(self._expire(session))
 
-    async def drop(self, session_id: str):
+
+    async def _expire(self, session: Session):
+        await asyncio.sleep(self.resume_grace_s)
         async with self._lock:
-            if session_id in self._active:
-                del self._active[session_id]
-            elif session_id in self._staging:
-                del self._staging[session_id]
+            if self._suspended.get(session.meta.id) is not session:
+                return
+            del self._suspended[session.meta.id]
+            session.expiry = None
+        SUSPENSIONS_EXPIRED.inc()
+        if self.on_expired:
+            await self.on_expired(session.meta)
 
 
-    async def send_to_one(self, session_id, payload):
+    @staticmethod
+    def _cancel_expiry(session: Session):
+        if session.expiry:
+            session.expiry.cancel()
+            session.expiry = None
+
+
+    # at shutdown, nobody resumes any more
+    async def close(self):
         async with self._lock:
-            session = self._active.get(session_id)
-            ws = session.ws if session else None
+            tasks = [s.expiry for s in self._suspended.values() if s.expiry]
+            for session in self._suspended.values():
+                self._cancel_expiry(session)
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+    # puts a suspended session back on ws, with everything it had. A session
+    # that is still active is moved to ws too: its old socket may be half
+    # open and not noticed as dead yet. Returns the session's metadata and
+    # the socket it was taken from, None if the token doesn't match.
+    async def resume(
+        self,
+        session_id: str,
+        token: str,
+        ws: WebSocket
+    ) -> Optional[Tuple[SessionMetadata, Optional[WebSocket]]]:
+        async with self._lock:
+            session = self._suspended.get(session_id) or self._active.get(session_id)
+            if not session or not hmac.compare_digest(session.token, token):
+                return None
+            if self._by_ws.get(ws, session_id) != session_id:
+                return None # ws belongs to another session
+
+            active, by_ws = dict(self._active), dict(self._by_ws)
+            replaced = None
+            if session_id in self._suspended:
+                del self._suspended[session_id]
+                self._cancel_expiry(session)
+                SUSPENSIONS_RESUMED.inc()
+            elif session.ws is not ws:
+                replaced = session.ws
+                by_ws.pop(session.ws, None)
+            session.ws = ws
+            active[session_id] = session
+            by_ws[ws] = session_id
+            self._set_active(active, by_ws)
+            return session.meta, replaced
+
+
+    async def send_to_one(self, session_id, payload):
+        session = self._active.get(session_id)
+        ws = session.ws if session else None
 
         if not ws:
             return
 
         try:
-            await ws.send_json(payload.model_dump())
+            with SESSION_SEND_ONE.time():
+                await wire.send(ws, wire.encode(payload, wire.encoding_of(ws)))
         except Exception as e:
+            SESSION_SEND_FAILURES.inc()
             print(e)
 
 
-    async def broadcast(self, data: WSPayload) -> None:
+    # sends data to every active session concurrently. Sessions that failed
+    # to take the frame in time are evicted and their metadata returned.
+    async def broadcast(self, data: WSPayload) -> List[SessionMetadata]:
+        targets = [(sid, s.ws) for sid, s in self._active.items()]
+
+        failed = await fan_out(targets, data)
+        return await self.evict(failed)
+
+
+    # resolves a group against one snapshot, returning the (session_id, ws)
+    # pairs found and the ids that are not active.
+    async def group(
+        self,
+        session_ids: Optional[List[str]] = None
+    ) -> Tuple[List[Tuple[str, WebSocket]], List[str]]:
+        active = self._active
+        if session_ids is None:
+            return [(sid, s.ws) for sid, s in active.items()], []
+
+        found, missing = [], []
+        for sid in dict.fromkeys(session_ids):
+            session = active.get(sid)
+            if session:
+                found.append((sid, session.ws))
+            else:
+                missing.append(sid)
+        return found, missing
+
+
+    # sends build(session_id) to each target concurrently, evicting failures
+    async def send_each(
+        self,
+        targets: List[Tuple[str, WebSocket]],
+        build: Callable[[str], WSPayload]
+    ) -> List[SessionMetadata]:
+        frames = [(sid, ws, wire.encode(build(sid), wire.encoding_of(ws))) for sid, ws in targets]
+        failed = await fan_out_frames(frames)
+        return await self.evict(failed)
+
+
+    async def evict(self, session_ids: List[str]) -> List[SessionMetadata]:
+        if not session_ids:
+            return []
+
+        evicted: List[Session] = []
         async with self._lock:
-            targets = [(sid, s.ws) for sid, s in self._active.items()]
-        
-        payload = data.model_dump()
-        for sid, ws in targets:
-            try:
-                await ws.send_json(payload)
-            except Exception:
-                pass
+            active, by_ws = dict(self._active), dict(self._by_ws)
+            for sid in session_ids:
+                session = active.pop(sid, None)
+                if not session:
+                    continue
+                if by_ws.get(session.ws) == sid:
+                    del by_ws[session.ws]
+                evicted.append(session)
+                self._suspend(session)
+            if evicted:
+                self._set_active(active, by_ws)
+
+        for session in evicted:
+            print(f"[warn] evicting unresponsive session {session.meta.name} [{session.meta.id}], suspended")
+            spawn(_close_quietly(session.ws, code=1011))
+        return [s.meta for s in evicted]
 
     
+    # a suspended session's clock keeps learning while its sync channel is
+    # up, quietly: None is returned as for an unknown one
     async def update_sync(self, session_id: str, report: SyncReport) -> SessionMetadata | None:
         async with self._lock:
-            session = self._active.get(session_id)
+            session = self._active.get(session_id) or self._suspended.get(session_id)
             if session:
-                session.meta.theta = report.theta
-                session.meta.last_rtt = report.rtt
-                session.meta.last_sync = now_ms()
+                now = now_ms()
+                if report.rtt >= 0:
+                    SYNC_RTT.record_us(int(report.rtt * 1000))
+                est = session.clock.add(now, report.theta, report.rtt)
+                update: Dict[str, Any] = {"last_rtt": report.rtt, "last_sync": now}
+                if est:
+                    update.update(
+                        theta=round(est.theta_at(now), 3),
+                        drift_ppm=round(est.drift_ppm, 2),
+                        sync_confidence=round(est.confidence, 3)
+                    )
+                meta = session.meta.model_copy(update=update)
+                if session_id in self._suspended:
+                    session.meta = meta
+                    return None
+                self._set_meta(session, meta)
                 return session.meta
             return None
 
 
+    async def getSyncEstimates(self) -> Dict[str, SyncEstimate]:
+        return {
+            sid: s.clock.estimate
+            for sid, s in self._active.items()
+            if s.clock.estimate
+        }
+
+
     async def session_id(self, ws: WebSocket) -> Optional[str]:
-        async with self._lock:
-            for session_id, session in self._active.items():
-                if session.ws is ws:
-                    return session_id
-        return None
+        return self._by_ws.get(ws)
         
 
 
 class SyncHandler:
     def __init__(self):
         self._channels: Dict[str, WebSocket] = {} # session_id -> ws
+        self._micros: set[str] = set() # channels running at microsecond precision
+        self._binary: set[str] = set() # channels using the struct frames of wire.SYNC_*
         self.lock = asyncio.Lock()
 
 
-    async def add(self, session_id: str, ws: WebSocket):
+    async def add(self, session_id: str, ws: WebSocket, micros: bool = False, binary: bool = False):
         async with self.lock:
             self._channels[session_id] = ws
+            for flags, on in ((self._micros, micros), (self._binary, binary)):
+                if on:
+                    flags.add(session_id)
+                else:
+                    flags.discard(session_id)
 
 
     async def remove(self, session_id: str):
         async with self.lock:
             ws = self._channels.pop(session_id, None)
+            self._micros.discard(session_id)
+            self._binary.discard(session_id)
 
         if ws:
             try:
@@ -318,20 +804,142 @@ class SyncHandler:
             return self._channels.get(session_id)
 
 
-    async def handle_ping(self, session_id: str, req: SyncRequest):
-        ws = await self.get(session_id)
-        t2_ms = now_ms() 
+    # t2_us is taken by the caller the moment the frame arrived. The reply is
+    # encoded by hand so that t3 is read right before the bytes go out.
+    async def handle_ping(self, session_id: str, t1: int, t2_us: int):
+        async with self.lock:
+            ws = self._channels.get(session_id)
+            micros = session_id in self._micros
+            binary = session_id in self._binary
         if not ws:
             return
-        try:
-            t3_ms = now_ms()
-            await ws.send_json(SyncResponse(
-                t1=req.t1, 
-                t2=t2_ms,
-                t3=t3_ms
-            ).model_dump())
-        except Exception:
-            await ws.send_json({"error": "MALFORMED_T1"})
+
+        t3_us = now_us()
+        if micros:
+            t2, t3 = t2_us, t3_us
+        else:
+            t2, t3 = t2_us // 1_000, t3_us // 1_000
+        if binary:
+            await ws.send_bytes(wire.SYNC_PONG.pack(t1, t2, t3))
+        else:
+            await ws.send_text(f'{{"type":"SYNC_RESPONSE","t1":{t1},"t2":{t2},"t3":{t3}}}')
+        SYNC_PING.record_us(now_us() - t2_us)
+
+
+
+GROUP_ACK_TIMEOUT_MS = 3_000 # after trigger time, stop waiting for acks
+
+# action sent to each recorder, and the ack it answers with
+GROUP_ACTIONS: Dict[WSActions, Tuple[WSActions, WSActions]] = {
+    WSActions.START_GROUP: (WSActions.START, WSActions.STARTED),
+    WSActions.STOP_GROUP: (WSActions.STOP, WSActions.STOPPED),
+}
+
+
+class GroupAcks:
+    def __init__(self):
+        self._open: Dict[WSActions, WSGroupStatus] = {} # awaited ack -> group
+        self.lock = asyncio.Lock()
+
+
+    # opens a group awaiting `ack`; returns the group it replaced, if any
+    async def open(self, ack: WSActions, status: WSGroupStatus) -> Optional[WSGroupStatus]:
+        async with self.lock:
+            replaced = self._open.get(ack)
+            self._open[ack] = status
+            return replaced
+
+
+    # returns (belongs to an open group, the group if it just completed)
+    async def ack(self, ack: WSActions, session_id: str) -> Tuple[bool, Optional[WSGroupStatus]]:
+        async with self.lock:
+            status = self._open.get(ack)
+            if not status or session_id not in status.pending:
+                return False, None
+
+            status.pending.remove(session_id)
+            status.acked.append(session_id)
+            if status.pending:
+                return True, None
+            del self._open[ack]
+            return True, status
+
+
+    async def fail(self, ack: WSActions, session_id: str) -> Optional[WSGroupStatus]:
+        async with self.lock:
+            status = self._open.get(ack)
+            if not status or session_id not in status.pending:
+                return None
+
+            status.pending.remove(session_id)
+            status.failed.append(session_id)
+            if status.pending:
+                return None
+            del self._open[ack]
+            return status
+
+
+    # closes the group if it is still open; returns it when it was
+    async def close(self, ack: WSActions, status: WSGroupStatus) -> Optional[WSGroupStatus]:
+        async with self.lock:
+            if self._open.get(ack) is status:
+                del self._open[ack]
+                return status
+            return None
+
+
+
+# who may send a control message
+class Origin(str, Enum):
+    DASHBOARD = "dashboard"
+    SESSION = "session"
+
+
+class Inbound:
+    __slots__ = ('ws', 'msg_type', 'body', 'session_id')
+    def __init__(self, ws: WebSocket, msg_type: Union[WSActions, WSEvents], body: Any, session_id: Optional[str]):
+        self.ws: WebSocket = ws
+        self.msg_type: Union[WSActions, WSEvents] = msg_type
+        self.body: Any = body # already validated against the route's body type
+        self.session_id: Optional[str] = session_id # sender, for routes with an origin
+
+
+class Route:
+    __slots__ = ('handler', 'msg_type', 'body', 'origin', 'close_on_invalid')
+    def __init__(
+        self,
+        handler: Callable[..., Awaitable[None]],
+        msg_type: Union[WSActions, WSEvents],
+        body: Optional[TypeAdapter],
+        origin: Optional[Origin],
+        close_on_invalid: bool
+    ):
+        self.handler = handler
+        self.msg_type = msg_type
+        self.body = body
+        self.origin = origin
+        self.close_on_invalid = close_on_invalid
+
+
+# (kind, msg_type) -> route. Both are str enums, so the raw strings of a
+# frame look them up directly.
+ROUTES: Dict[Tuple[WSKind, Union[WSActions, WSEvents]], Route] = {}
+_EVENT_TYPES = {e.value for e in WSEvents}
+_ACTION_TYPES = {a.value for a in WSActions}
+
+def route(
+    kind: WSKind,
+    *msg_types: Union[WSActions, WSEvents],
+    body: Any = None,
+    origin: Optional[Origin] = None,
+    close_on_invalid: bool = False
+):
+    adapter = TypeAdapter(body) if body is not None else None
+    def register(handler):
+        for msg_type in msg_types:
+            ROUTES[(kind, msg_type)] = Route(handler, msg_type, adapter, origin, close_on_invalid)
+        return handler
+    return register
 
 
 
@@ -340,7 +948,12 @@ class AppState:
         self,
         port: int,
         ip: Optional[str] = None,
-        server_name: Optional[str] = None
+        server_name: Optional[str] = None,
+        storage_dir: str = "recordings",
+        resume_grace_s: float = RESUME_GRACE_S,
+        delivery_probability: float = DELIVERY_PROBABILITY,
+        safety_ms: int = SAFETY_MS,
+        max_sync_age_ms: int = MAX_SYNC_AGE_MS
     ):
 
         self.ip:str = ip or get_local_ip()
@@ -348,41 +961,77 @@ class AppState:
         self.name:str = server_name or get_random_name()
 
         self.dashboard: DashboardHandler = DashboardHandler()
-        self.sessions: SessionsHandler = SessionsHandler()
+        self.sessions: SessionsHandler = SessionsHandler(resume_grace_s, on_expired=self.on_session_expired)
         self.clock: SyncHandler = SyncHandler()
-
-        self.mdns: AsyncZeroconf = AsyncZeroconf()
+        self.groups: GroupAcks = GroupAcks()
+        self.scheduler: TriggerScheduler = TriggerScheduler(
+            delivery_probability=delivery_probability,
+            max_sync_age_ms=max_sync_age_ms,
+            safety_ms=safety_ms
+        )
+        self.qr: QRCache = QRCache()
+        self.recordings: RecordingsHandler = RecordingsHandler(storage_dir)
+        self.exports: Exporter = Exporter(os.path.join(storage_dir, "exports"), on_update=self.notify_merge)
+        self.transcripts: TranscriptionService = TranscriptionService(
+            os.path.join(storage_dir, "transcripts"),
+            on_segment=self.notify_segment,
+            on_job=self.notify_transcript,
+            on_merged=self.notify_merged_transcript
+        )
+        self.enhancer: EnhanceScheduler = EnhanceScheduler(on_update=self.notify_enhance)
+        self.previews: PreviewCache = PreviewCache(os.path.join(storage_dir, "previews"))
+        self.waveforms: WaveformStore = WaveformStore()
+        self.live: LiveIngest = LiveIngest(self.recordings, on_levels=self.notify_levels)
+
+        metrics.gauge("vocalink_sessions_active", "recorders connected", self.sessions.count)
+        metrics.gauge("vocalink_sessions_suspended", "recorders that may still resume", self.sessions.suspended_count)
+        metrics.gauge("vocalink_dashboards", "dashboards subscribed", self.dashboard.count)
+        self.takes: Dict[str, WSActionTarget] = {} # session_id -> last START sent to it
+
+        # made in start_mdns, zeroconf binds to the loop it is created in
+        self.mdns: Optional[AsyncZeroconf] = None
         self.mdns_conf: Optional[AsyncServiceInfo] = None
+        self._mdns_task: Optional[asyncio.Task] = None
 
 
-    async def _eval_trigger_time(self) -> int:
-        SAFETY_MS = 200
-        MIN_DELAY = 500
-        DEFAULT_DELAY = 800
-        MAX_SYNC_AGE = 10_000  # ms
+    async def _eval_trigger_time(
+        self,
+        session_ids: List[str],
+        estimates: Optional[Dict[str, SyncEstimate]] = None
+    ) -> TriggerPlan:
+        with TRIGGER_PLAN.time():
+            if estimates is None:
+                estimates = await self.sessions.getSyncEstimates()
+            plan = self.scheduler.plan(now_ms(), session_ids, estimates)
+        TRIGGER_STALE.inc(len(plan.stale))
+        if plan.stale:
+            print(f"[warn] {len(plan.stale)} session(s) have no fresh clock sync, trigger in {plan.lead_ms}ms")
+        return plan
+
+
+    # START targets are remembered, so an upload can be linked to its take
+    def _action_target(
+        self,
+        session_id: str,
+        trigger: Optional[int],
+        estimates: Dict[str, SyncEstimate]
+    ) -> WSActionTarget:
+        target = WSActionTarget(
+            session_id=session_id,
+            trigger_time=trigger,
+            theta=self._theta_at(estimates, session_id, trigger)
+        )
+        if trigger is not None:
+            self.takes[session_id] = target
+        return target
 
-        metas = await self.sessions.getMetaFromAllActive()
-        valid_rtts = []
-        now = now_ms()
 
-        for meta in metas:
-            if not meta:
-                continue
-            if meta.last_rtt is None:
-                continue
-            if meta.last_sync is None:
-                continue
-            if now - meta.last_sync > MAX_SYNC_AGE:
-                continue
-            valid_rtts.append(meta.last_rtt)
-
-        if not valid_rtts:
-            delay = DEFAULT_DELAY
-        else:
-            max_rtt = max(valid_rtts)
-            delay = max(MIN_DELAY, int(max_rtt * 2) + SAFETY_MS)
-
-        return now + delay
+    @staticmethod
+    def _theta_at(estimates: Dict[str, SyncEstimate], session_id: str, at: Optional[int]) -> Optional[float]:
+        est = estimates.get(session_id)
+        if not est or at is None:
+            return None
+        return round(est.theta_at(at), 3)
 
 
     async def server_info(self) -> ServerInfo:
@@ -392,7 +1041,8 @@ class AppState:
             active_sessions = await self.sessions.getActiveCount()
         )
 
-    def _make_mdns_conf(self) -> AsyncServiceInfo:
+    def _make_mdns_conf(self) -> "AsyncServiceInfo":
+        from zeroconf.asyncio import AsyncServiceInfo
         return AsyncServiceInfo(
             type_="_vocalink._tcp.local.",
             name=f"{self.name}._vocalink._tcp.local.",
@@ -405,21 +1055,37 @@ class AppState:
         )
 
 
+    # zeroconf probes the network for about a second before announcing, the
+    # server answers meanwhile. It runs without mDNS too, recorders then
+    # need the QR code.
     async def start_mdns(self):
-        self.mdns_conf = self._make_mdns_conf()
-        await self.mdns.async_register_service(self.mdns_conf)
+        self._mdns_task = asyncio.create_task(self._register_mdns())
+
+
+    async def _register_mdns(self):
+        from zeroconf.asyncio import AsyncZeroconf
+        try:
+            self.mdns = AsyncZeroconf()
+            self.mdns_conf = self._make_mdns_conf()
+            await self.mdns.async_register_service(self.mdns_conf)
+        except Exception as e:
+            self.mdns_conf = None
+            print(f"[SERVER] mDNS unavailable: {e}")
 
 
     async def rename(self, data: Rename):
         old_name = self.name
         self.name = data.new_name
+        self.qr.clear()
 
         try:
-            if self.mdns_conf:
-                await self.mdns.async_unregister_service(self.mdns_conf)
-        
-            self.mdns_conf = self._make_mdns_conf()
-            await self.mdns.async_register_service(self.mdns_conf)
+            if self._mdns_task:
+                await self._mdns_task
+            if self.mdns:
+                if self.mdns_conf:
+                    await self.mdns.async_unregister_service(self.mdns_conf)
+                self.mdns_conf = self._make_mdns_conf()
+                await self.mdns.async_register_service(self.mdns_conf)
             print(f"[SERVER] Renamed from '{old_name}' to '{self.name}'")
 
         except Exception as e:
@@ -427,175 +1093,406 @@ class AppState:
             print(f"[SERVER] mDNS Rename Failed: {e}")
             return
     
-        await self.sessions.broadcast(WSPayload(
+        evicted = await self.sessions.broadcast(WSPayload(
                             kind=WSKind.EVENT,
                             msg_type=WSEvents.DASHBOARD_RENAME,
                             body=data
                         ))
+        await self.report_evicted(evicted)
+
+
+    # evaluates one trigger time for the whole group and fans the action out
+    # concurrently. Acks are collected and reported as a single GROUP_STATUS.
+    async def run_group_action(self, action: WSActions, group: WSGroupTarget):
+        single, ack = GROUP_ACTIONS[action]
+        targets, missing = await self.sessions.group(group.session_ids)
+
+        trigger = None
+        stale: List[str] = []
+        estimates: Dict[str, SyncEstimate] = {}
+        if single == WSActions.START and targets:
+            estimates = await self.sessions.getSyncEstimates()
+            plan = await self._eval_trigger_time([sid for sid, _ in targets], estimates)
+            trigger, stale = plan.trigger_time, plan.stale
+
+        status = WSGroupStatus(
+            action=action,
+            trigger_time=trigger,
+            pending=[sid for sid, _ in targets],
+            failed=missing,
+            stale=stale
+        )
+        if not targets:
+            await self.notify_group(status)
+            return
 
-    
-    async def shutdown(self):
-        if self.mdns_conf:
-            await self.mdns.async_unregister_service(self.mdns_conf)
-        await self.mdns.async_close()
+        replaced = await self.groups.open(ack, status)
+        if replaced:
+            await self.notify_group(replaced)
+
+        evicted = await self.sessions.send_each(
+            targets,
+            lambda sid: WSPayload(
+                kind=WSKind.ACTION,
+                msg_type=single,
+                body=self._action_target(sid, trigger, estimates)
+            )
+        )
+        await self.report_evicted(evicted)
 
+        deadline = (trigger or now_ms()) + GROUP_ACK_TIMEOUT_MS
+        spawn(self._expire_group(ack, status, deadline))
 
-    async def handle_ws_events(self, payload: WSPayload, ws: WebSocket):
-        if payload.kind != WSKind.EVENT:
-            return
 
-        event_type = payload.msg_type
+    async def _expire_group(self, ack: WSActions, status: WSGroupStatus, deadline: int):
+        await asyncio.sleep(max(0, deadline - now_ms()) / 1000)
+        expired = await self.groups.close(ack, status)
+        if expired:
+            await self.notify_group(expired)
 
-        if event_type == WSEvents.DASHBOARD_INIT:
-            await self.dashboard.assign(ws)            
-            print("dashboard online.")
 
-        elif event_type == WSEvents.DASHBOARD_RENAME:
-            try:
-                rename = Rename.model_validate(payload.body)
-            except ValidationError:
-                await send_error(ws, WSErrors.INVALID_BODY)
-                try:
-                    await ws.close(code=1007)
-                except Exception:
-                    pass
-                return
+    async def _fail_in_groups(self, session_id: str):
+        for _, ack in GROUP_ACTIONS.values():
+            completed = await self.groups.fail(ack, session_id)
+            if completed:
+                await self.notify_group(completed)
 
-            await self.rename(rename)
 
+    async def notify_recording(self, rec: Recording):
+        await self.dashboard.notify(
+            WSPayload(
+                kind=WSKind.EVENT,
+                msg_type=WSEvents.RECORDING_UPDATE,
+                body=rec
+            )
+        )
 
-        elif event_type == WSEvents.SESSION_UPDATE:
-            try:
-                incoming_meta = SessionMetadata.model_validate(payload.body)
-            except ValidationError:
-                await send_error(ws, WSErrors.INVALID_BODY)
-                return
 
-            updated_meta = await self.sessions.updateMeta(incoming_meta)
-            if updated_meta:
-                payload.body = updated_meta
-                await self.dashboard.notify(payload)
-            else:
-                await send_error(ws, WSErrors.SESSION_NOT_FOUND)
+    async def notify_levels(self, levels: LiveLevels):
+        await self.dashboard.notify(
+            WSPayload(kind=WSKind.EVENT, msg_type=WSEvents.LIVE_LEVELS, body=levels),
+            droppable=True
+        )
 
 
-        elif event_type == WSEvents.SESSION_ACTIVATE:
-            try:
-                meta = SessionMetadata.model_validate(payload.body)
-            except ValidationError:
-                await send_error(ws, WSErrors.INVALID_BODY)
-                try:
-                    await ws.close(code=1007)
-                except Exception:
-                    pass
-                return
+    async def notify_transcript(self, job: TranscriptJob):
+        rec = await self.recordings.update(job.recording_id, transcript=job.status)
+        if rec:
+            await self.notify_recording(rec)
+        await self.dashboard.notify(
+            WSPayload(
+                kind=WSKind.EVENT,
+                msg_type=WSEvents.TRANSCRIPT_UPDATE,
+                body=job
+            )
+        )
 
-            session_id = meta.id
-            sessionMeta = await self.sessions.commit(session_id, ws)
-            if not sessionMeta:
-                send_error(ws, WSErrors.SESSION_NOT_FOUND)
-                try:
-                    await ws.close(code=1007)
-                except Exception:
-                    pass
-                return
 
-            await self.dashboard.notify(
-                    WSPayload(
-                          kind=WSKind.EVENT,
-                          msg_type=WSEvents.SESSION_ACTIVATED,
-                          body=sessionMeta
-                      )
-                )
+    async def notify_segment(self, segment: TranscriptSegment):
+        await self.dashboard.notify(
+            WSPayload(
+                kind=WSKind.EVENT,
+                msg_type=WSEvents.TRANSCRIPT_SEGMENT,
+                body=segment
+            )
+        )
 
-        elif event_type in (WSEvents.SUCCESS, WSEvents.FAIL):
-            await self.dashboard.notify(payload)
 
-        else:
-            await send_error(ws, WSErrors.INVALID_EVENT)
-            try:
-                await ws.close(code=1007)
-            except Exception:
-                pass
+    # builds the peak index of a finished file, so the dashboard's first
+    # waveform request doesn't wait for a pass over the audio
+    async def index_waveform(self, rec: Recording, enhanced: bool = False):
+        src = self.recordings.enhanced_path(rec.id) if enhanced else self.recordings.path(rec)
+        try:
+            await self.waveforms.build(src, self.recordings.peaks_path(rec.id, enhanced))
+        except Exception as e:
+            print(f"[waveform] {rec.id}: {e}")
+
+
+    # the recording follows its enhancement: processing while it runs,
+    # enhanced when done, and back to what it was otherwise
+    async def notify_enhance(self, job: EnhanceJob):
+        status = None
+        if job.status == JobStatus.PROCESSING:
+            status = RecordingStatus.PROCESSING
+        elif job.status == JobStatus.DONE:
+            status = RecordingStatus.ENHANCED
+        elif job.status in (JobStatus.FAILED, JobStatus.CANCELLED):
+            enhanced = os.path.exists(self.recordings.enhanced_path(job.recording_id))
+            status = RecordingStatus.ENHANCED if enhanced else RecordingStatus.ORIGINAL
+
+        rec = await self.recordings.get(job.recording_id)
+        if rec and status and rec.status != status:
+            rec = await self.recordings.update(job.recording_id, status=status)
+            if rec:
+                await self.notify_recording(rec)
+        if rec and job.status == JobStatus.DONE:
+            spawn(self.index_waveform(rec, enhanced=True))
+        await self.dashboard.notify(
+            WSPayload(
+                kind=WSKind.EVENT,
+                msg_type=WSEvents.ENHANCE_UPDATE,
+                body=job
+            )
+        )
 
 
-    async def handle_ws_actions(self, payload: WSPayload, ws: WebSocket):
-        if payload.kind != WSKind.ACTION:
-            return
+    async def notify_merge(self, job: MergeJob):
+        await self.dashboard.notify(
+            WSPayload(
+                kind=WSKind.EVENT,
+                msg_type=WSEvents.MERGE_UPDATE,
+                body=job
+            )
+        )
+
+
+    async def notify_merged_transcript(self, merged: MergedTranscript):
+        await self.dashboard.notify(
+            WSPayload(
+                kind=WSKind.EVENT,
+                msg_type=WSEvents.TRANSCRIPT_MERGED,
+                body=merged
+            )
+        )
 
-        from_session_id = await self.sessions.session_id(ws)
-        is_dashboard = (ws == self.dashboard.ws())
-        
-        if not is_dashboard and not from_session_id:
-            print("[error] Unauthenticated action sender")
-            await send_error(ws, WSErrors.ACTION_NOT_ALLOWED)
-            return
 
-        action_type = payload.msg_type
+    async def notify_group(self, status: WSGroupStatus):
+        await self.dashboard.notify(
+            WSPayload(
+                kind=WSKind.EVENT,
+                msg_type=WSEvents.GROUP_STATUS,
+                body=status
+            )
+        )
+
+
+    # sessions dropped by a fan-out never reach handle_disconnect with their
+    # id still active, so the dashboard and sync channel are cleaned up here.
+    # evicted sessions are suspended, they may resume like dropped ones
+    async def report_evicted(self, metas: List[SessionMetadata]):
+        for meta in metas:
+            await self.report_suspended(meta)
+
+
+    async def report_suspended(self, meta: SessionMetadata):
+        await self.dashboard.notify(
+            WSPayload(
+                kind=WSKind.EVENT,
+                msg_type=WSEvents.SESSION_SUSPENDED,
+                body=meta
+            )
+        )
+        # whatever it was asked to ack over the lost socket is failed now, a
+        # late ack after resuming reaches the dashboard on its own
+        await self._fail_in_groups(meta.id)
+
+
+    async def on_session_expired(self, meta: SessionMetadata):
+        await self.dashboard.notify(
+            WSPayload(
+                kind=WSKind.EVENT,
+                msg_type=WSEvents.SESSION_LEFT,
+                body=meta
+            )
+        )
+        await self.clock.remove(meta.id)
+        print(f"Session [{meta.id}] did not resume, it has left.")
+
+    
+    async def shutdown(self):
+        if self._mdns_task and not self._mdns_task.done():
+            self._mdns_task.cancel()
+            await asyncio.gather(self._mdns_task, return_exceptions=True)
+        if self.mdns:
+            if self.mdns_conf:
+                await self.mdns.async_unregister_service(self.mdns_conf)
+            await self.mdns.async_close()
+            self.mdns, self.mdns_conf = None, None
+        await self.sessions.close()
+        self.recordings.close()
+        self.transcripts.close()
+        self.enhancer.close()
+
+
+    # routes one decoded /ws/control frame. The handler is found by a dict
+    # lookup on the raw strings and its body validated once, by its own
+    # adapter, instead of trying every model of the WSPayload body union.
+    async def dispatch(self, data: Any, ws: WebSocket):
+        msg_type = data.get("msg_type") if isinstance(data, dict) else None
+        known = isinstance(msg_type, str) and (msg_type in _EVENT_TYPES or msg_type in _ACTION_TYPES)
+        label = msg_type if known else "other"
+        with CONTROL_DISPATCH.labels(label).time():
+            await self._dispatch(data, ws)
+
+
+    async def _dispatch(self, data: Any, ws: WebSocket):
+        if not isinstance(data, dict):
+            print(f"[error] control frame is not an object: {data!r}")
+            return
+        kind, msg_type = data.get("kind"), data.get("msg_type")
+        route = None
+        if isinstance(kind, str) and isinstance(msg_type, str):
+            route = ROUTES.get((kind, msg_type))
+
+        if not route:
+            # known events nobody may send close the socket, any action that
+            # can't be run is refused, anything else is dropped
+            if kind == WSKind.EVENT and msg_type in _EVENT_TYPES:
+                await send_error(ws, WSErrors.INVALID_EVENT)
+                await _close_quietly(ws, 1007)
+            elif kind == WSKind.ACTION:
+                if msg_type not in _ACTION_TYPES:
+                    print(f"[error] unknown action: {msg_type!r}")
+                await send_error(ws, WSErrors.INVALID_ACTION)
+            elif kind != WSKind.ERROR: # errors from clients: todo
+                print(f"[error] unknown control message: {kind!r}/{msg_type!r}")
+            return
 
-        if action_type in (WSActions.START, WSActions.STOP):
-            if not is_dashboard:
-                print(f"[warn] Session {from_session_id} attempted to issue command {action_type}")
+        session_id = None
+        if route.origin:
+            session_id = await self.sessions.session_id(ws)
+            is_dashboard = self.dashboard.is_subscribed(ws)
+            if not is_dashboard and not session_id:
+                print("[error] Unauthenticated action sender")
                 await send_error(ws, WSErrors.ACTION_NOT_ALLOWED)
                 return
+            if route.origin == Origin.DASHBOARD and not self.dashboard.is_controller(ws):
+                if is_dashboard:
+                    print(f"[warn] Monitor dashboard attempted to issue command {route.msg_type.value}")
+                else:
+                    print(f"[warn] Session {session_id} attempted to issue command {route.msg_type.value}")
+                await send_error(ws, WSErrors.ACTION_NOT_ALLOWED)
+                return
+            if route.origin == Origin.SESSION and not session_id:
+                print("[warn] Dashboard attempted to fake a status update")
+                return
 
+        body = None
+        if route.body:
             try:
-                target = WSActionTarget.model_validate(payload.body)
+                body = route.body.validate_python(data.get("body"))
             except ValidationError as e:
-                print(f"[error] Invalid action body: {e}")
+                print(f"[error] Invalid {route.msg_type.value} body: {e}")
                 await send_error(ws, WSErrors.INVALID_BODY)
+                if route.close_on_invalid:
+                    await _close_quietly(ws, 1007)
                 return
 
-            if action_type == WSActions.START:
-                trigger = await self._eval_trigger_time()
-                target.trigger_time = trigger
-                payload.body = target
+        await route.handler(self, Inbound(ws, route.msg_type, body, session_id))
+
+
+    @route(WSKind.EVENT, WSEvents.DASHBOARD_INIT)
+    async def on_dashboard_init(self, msg: Inbound):
+        await self.dashboard.subscribe(msg.ws)
+        print("dashboard online.")
+
+
+    @route(WSKind.EVENT, WSEvents.DASHBOARD_RENAME, body=Rename, origin=Origin.DASHBOARD, close_on_invalid=True)
+    async def on_dashboard_rename(self, msg: Inbound):
+        await self.rename(msg.body)
 
-            if await self.sessions.is_active(target.session_id):
-                await self.sessions.send_to_one(target.session_id, payload)
+
+    @route(WSKind.EVENT, WSEvents.SESSION_UPDATE, body=SessionMetadata)
+    async def on_session_update(self, msg: Inbound):
+        updated_meta = await self.sessions.updateMeta(msg.body)
+        if updated_meta:
+            self.dashboard.update(updated_meta)
+        else:
+            await send_error(msg.ws, WSErrors.SESSION_NOT_FOUND)
+
+
+    @route(WSKind.EVENT, WSEvents.SESSION_ACTIVATE, body=SessionMetadata, close_on_invalid=True)
+    async def on_session_activate(self, msg: Inbound):
+        sessionMeta = await self.sessions.commit(msg.body.id, msg.ws)
+        if not sessionMeta:
+            if await self.sessions.is_active(msg.body.id):
+                # already active on another socket, only its token moves it
+                print(f"[warn] session_activate for active session {msg.body.id}, it must use session_resume")
+                await send_error(msg.ws, WSErrors.ACTION_NOT_ALLOWED)
             else:
-                await send_error(ws, WSErrors.SESSION_NOT_FOUND)
+                await send_error(msg.ws, WSErrors.SESSION_NOT_FOUND)
+            await _close_quietly(msg.ws, 1007)
+            return
 
-        elif action_type in (WSActions.STARTED, WSActions.STOPPED):
-            if not from_session_id:
-                print("[warn] Dashboard attempted to fake a status update")
-                return
+        await self.dashboard.notify(
+            WSPayload(
+                kind=WSKind.EVENT,
+                msg_type=WSEvents.SESSION_ACTIVATED,
+                body=sessionMeta
+            )
+        )
 
-            try:
-                status_update = WSActionTarget.model_validate(payload.body)
-            except ValidationError:
-                await send_error(ws, WSErrors.INVALID_BODY)
-                return
 
-            if status_update.session_id != from_session_id:
-                print(f"[warn] Spoofing attempt: {from_session_id} tried to report for {status_update.session_id}")
-                return
+    # a recorder back on a new socket, with the token it was staged with
+    @route(WSKind.EVENT, WSEvents.SESSION_RESUME, body=SessionResume, close_on_invalid=True)
+    async def on_session_resume(self, msg: Inbound):
+        resumed = await self.sessions.resume(msg.body.session_id, msg.body.resume_token, msg.ws)
+        if not resumed:
+            # expired, unknown or a wrong token: the recorder stages again
+            await send_error(msg.ws, WSErrors.SESSION_NOT_FOUND)
+            await _close_quietly(msg.ws, 1007)
+            return
 
-            await self.dashboard.notify(payload)
+        meta, replaced = resumed
+        if replaced:
+            spawn(_close_quietly(replaced, 1000))
+        payload = WSPayload(kind=WSKind.EVENT, msg_type=WSEvents.SESSION_RESUMED, body=meta)
+        await self.sessions.send_to_one(meta.id, payload)
+        await self.dashboard.notify(payload)
+        print(f"Session [{meta.id}] resumed.")
+
+
+    @route(WSKind.EVENT, WSEvents.SUCCESS, WSEvents.FAIL, body=Optional[SessionMetadata])
+    async def on_session_result(self, msg: Inbound):
+        await self.dashboard.notify(WSPayload(kind=WSKind.EVENT, msg_type=msg.msg_type, body=msg.body))
+
+
+    @route(WSKind.ACTION, WSActions.START, WSActions.STOP, body=WSActionTarget, origin=Origin.DASHBOARD)
+    async def on_start_stop(self, msg: Inbound):
+        target: WSActionTarget = msg.body
+        if msg.msg_type == WSActions.START:
+            estimates = await self.sessions.getSyncEstimates()
+            plan = await self._eval_trigger_time([target.session_id], estimates)
+            target = self._action_target(target.session_id, plan.trigger_time, estimates)
+
+        if await self.sessions.is_active(target.session_id):
+            await self.sessions.send_to_one(
+                target.session_id,
+                WSPayload(kind=WSKind.ACTION, msg_type=msg.msg_type, body=target)
+            )
         else:
-            await send_error(ws, WSErrors.INVALID_ACTION)
+            await send_error(msg.ws, WSErrors.SESSION_NOT_FOUND)
+
+
+    @route(WSKind.ACTION, *GROUP_ACTIONS, body=WSGroupTarget, origin=Origin.DASHBOARD)
+    async def on_group_action(self, msg: Inbound):
+        await self.run_group_action(msg.msg_type, msg.body)
+
+
+    @route(WSKind.ACTION, WSActions.STARTED, WSActions.STOPPED, body=WSActionTarget, origin=Origin.SESSION)
+    async def on_started_stopped(self, msg: Inbound):
+        status_update: WSActionTarget = msg.body
+        if status_update.session_id != msg.session_id:
+            print(f"[warn] Spoofing attempt: {msg.session_id} tried to report for {status_update.session_id}")
+            return
+
+        grouped, completed = await self.groups.ack(msg.msg_type, msg.session_id)
+        if completed:
+            await self.notify_group(completed)
+        elif not grouped:
+            await self.dashboard.notify(WSPayload(kind=WSKind.ACTION, msg_type=msg.msg_type, body=status_update))
                 
         
 
     async def handle_disconnect(self, ws: WebSocket):
-        if await self.dashboard.available() and ws == self.dashboard.ws():
-            await self.dashboard.drop(ws)
+        if self.dashboard.is_subscribed(ws):
+            await self.dashboard.unsubscribe(ws)
             print("Dashboard went offline (refresh or close).")
             return
 
         session_id = await self.sessions.session_id(ws)
         if session_id:
-            meta = await self.sessions.getMetaFromActive(session_id)
-        
-            if meta and await self.dashboard.available():
-                await self.dashboard.notify(
-                    WSPayload(
-                        kind=WSKind.EVENT,
-                        msg_type=WSEvents.SESSION_LEFT,
-                        body=meta
-                    )
-                )
-
-            await self.sessions.drop(session_id)
-            await self.clock.remove(session_id)
-            print(f"Session [{session_id}] disconnected.")
+            meta = await self.sessions.suspend(session_id, ws)
+            if meta:
+                await self.report_suspended(meta)
+                print(f"Session [{session_id}] disconnected, may resume within {self.sessions.resume_grace_s:g}s.")
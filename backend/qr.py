@@ -0,0 +1,73 @@
+from typing import Dict, Tuple
+import asyncio
+import hashlib
+import io
+
+
+QR_FORMATS = {"png": "image/png", "svg": "image/svg+xml"}
+DEFAULT_BOX_SIZE = 20
+MIN_BOX_SIZE = 1
+MAX_BOX_SIZE = 40
+
+
+class RenderedQR:
+    __slots__ = ('body', 'media_type', 'etag')
+    def __init__(self, body: bytes, media_type: str):
+        self.body: bytes = body
+        self.media_type: str = media_type
+        self.etag: str = '"' + hashlib.sha1(body).hexdigest() + '"'
+
+
+def _render(data: str, fmt: str, box_size: int) -> RenderedQR:
+    import qrcode # pulls in PIL, only the first QR pays for it
+    import qrcode.image.svg
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_M,
+        box_size=box_size,
+        border=2
+    )
+    qr.add_data(data)
+    qr.make(fit=True)
+
+    buf = io.BytesIO()
+    if fmt == "svg":
+        qr.make_image(image_factory=qrcode.image.svg.SvgPathImage).save(buf)
+    else:
+        qr.make_image(fill_color="black", back_color="white").save(buf, format="PNG")
+    return RenderedQR(buf.getvalue(), QR_FORMATS[fmt])
+
+
+# rendered images keyed by (name, ip, port, format, box size). The key changes
+# on rename, and clear() drops the images of the old name.
+class QRCache:
+    def __init__(self):
+        self._images: Dict[Tuple[str, str, int, str, int], RenderedQR] = {}
+        self._lock = asyncio.Lock()
+
+
+    async def get(
+        self,
+        name: str,
+        ip: str,
+        port: int,
+        data: str,
+        fmt: str = "png",
+        box_size: int = DEFAULT_BOX_SIZE
+    ) -> RenderedQR:
+        key = (name, ip, port, fmt, box_size)
+        image = self._images.get(key)
+        if image:
+            return image
+
+        async with self._lock:
+            image = self._images.get(key)
+            if not image:
+                # encoding is CPU bound, keep it off the event loop
+                image = await asyncio.to_thread(_render, data, fmt, box_size)
+                self._images[key] = image
+            return image
+
+
+    def clear(self):
+        self._images.clear()
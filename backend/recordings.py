@@ -0,0 +1,561 @@
+from enum import Enum
+from concurrent.futures import ThreadPoolExecutor
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
+import asyncio
+import hashlib
+import json
+import math
+import os
+import re
+import time
+import uuid
+from pydantic import BaseModel, Field, ValidationError
+from backend.media import MEDIA_TYPES
+
+
+CHUNK_SIZE = 1 << 20 # bytes written to disk per write
+MAX_INGEST = 8 # uploads written concurrently, the rest get 429
+IO_WORKERS = 4 # threads doing the file writes and hashing
+MAX_RETRY_AFTER_S = 30
+OTHER_EXT = ".bin" # stored extension of files that aren't known audio
+
+
+class RecordingStatus(str, Enum):
+    UPLOADING = "uploading"
+    ORIGINAL = "original"
+    PROCESSING = "processing"
+    ENHANCED = "enhanced"
+    FAILED = "failed"
+
+
+# state of background work on a recording (transcription, enhancement)
+class JobStatus(str, Enum):
+    QUEUED = "queued"
+    PROCESSING = "processing"
+    DONE = "done"
+    FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+class RecordingCreateRequest(BaseModel): # session -> server
+    session_id: str
+    filename: str = Field(min_length=1, max_length=255)
+    size: Optional[int] = Field(default=None, ge=0) # total bytes of the file, None while a live take is still recording
+    sha256: Optional[str] = None # hex digest of the whole file, verified on completion
+    trigger_time: Optional[int] = None # defaults to the last START the server sent
+    client_theta: Optional[float] = None # offset the recorder applied to trigger_time
+
+
+class Recording(BaseModel):
+    id: str
+    session_id: str
+    session_name: Optional[str] = None
+    filename: str
+    size: Optional[int] = None # known once the take ended, see backend.live
+    received: int = 0
+    sha256: Optional[str] = None
+    trigger_time: Optional[int] = None
+    theta: Optional[float] = None # server's offset estimate of the recorder at trigger_time
+    client_theta: Optional[float] = None
+    created: int
+    status: RecordingStatus = RecordingStatus.UPLOADING
+    transcript: Optional[JobStatus] = None
+
+    # server time of the first sample. The recorder started when its clock
+    # read trigger_time - client_theta, which is off by the difference of
+    # its own offset estimate and the server's filtered one.
+    def start_ms(self) -> float:
+        if self.trigger_time is None:
+            return 0.0
+        if self.theta is not None and self.client_theta is not None:
+            return self.trigger_time + self.theta - self.client_theta
+        return float(self.trigger_time)
+
+
+
+class UploadError(Exception):
+    def __init__(
+        self,
+        status_code: int,
+        detail: str,
+        offset: Optional[int] = None,
+        retry_after: Optional[int] = None
+    ):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.offset = offset # current offset, for the client to resume from
+        self.retry_after = retry_after # seconds, with 429
+
+
+_RANGE = re.compile(r"bytes (\d+)-(\d+)/(\d+|\*)")
+
+# parses "bytes start-end/total", end inclusive
+def parse_content_range(value: str) -> Tuple[int, int, Optional[int]]:
+    m = _RANGE.fullmatch(value.strip())
+    if not m:
+        raise UploadError(400, "malformed Content-Range")
+    start, end = int(m.group(1)), int(m.group(2))
+    total = None if m.group(3) == "*" else int(m.group(3))
+    if end < start:
+        raise UploadError(400, "malformed Content-Range")
+    return start, end, total
+
+
+
+class Upload:
+    __slots__ = ('rec', 'hasher', 'lock')
+    def __init__(self, rec: Recording, hasher):
+        self.rec: Recording = rec
+        self.hasher = hasher # sha256 of rec.received bytes
+        self.lock = asyncio.Lock()
+
+
+
+# recordings live in `root` as <id><ext> plus a <id>.json sidecar with their
+# metadata. Unfinished uploads are <id>.part until the last byte arrives.
+# <ext> is the client's only if it is a known audio one, else .bin: a take
+# named x.json or x.peaks must not land on the server's own files.
+class RecordingsHandler:
+    def __init__(
+        self,
+        root: str = "recordings",
+        max_ingest: int = MAX_INGEST,
+        io_workers: int = IO_WORKERS
+    ):
+        self.root = root
+        self._recordings: Dict[str, Recording] = {}
+        self._uploads: Dict[str, Upload] = {}
+        self._lock = asyncio.Lock()
+
+        # disk work never runs on the event loop that serves /ws/control and /ws/sync
+        self._io = ThreadPoolExecutor(max_workers=io_workers, thread_name_prefix="ingest")
+        self.max_ingest = max_ingest
+        self._ingesting = 0
+        self._remaining = 0 # bytes still expected by the uploads in flight
+        self._rate = 0.0 # bytes/s written, smoothed
+
+
+    async def _run(self, fn, *args):
+        return await asyncio.get_running_loop().run_in_executor(self._io, fn, *args)
+
+
+    def close(self):
+        self._io.shutdown(wait=False, cancel_futures=True)
+
+
+    # takes an ingest slot or rejects with a Retry-After estimated from how
+    # long the uploads already in flight need at the current disk rate
+    def _admit(self, expected: int, offset: int):
+        if self._ingesting >= self.max_ingest:
+            retry = MAX_RETRY_AFTER_S
+            if self._rate > 0:
+                retry = math.ceil(self._remaining / self.max_ingest / self._rate)
+            raise UploadError(
+                429, "ingest busy",
+                offset=offset,
+                retry_after=max(1, min(MAX_RETRY_AFTER_S, retry))
+            )
+        self._ingesting += 1
+        self._remaining += expected
+
+
+    def _release(self, expected: int):
+        self._ingesting -= 1
+        self._remaining -= expected
+
+
+    def _observe(self, nbytes: int, seconds: float):
+        if seconds <= 0:
+            return
+        rate = nbytes / seconds
+        self._rate = rate if self._rate == 0 else 0.8 * self._rate + 0.2 * rate
+
+
+    def _meta_path(self, rec_id: str) -> str:
+        return os.path.join(self.root, f"{rec_id}.json")
+
+
+    def _part_path(self, rec_id: str) -> str:
+        return os.path.join(self.root, f"{rec_id}.part")
+
+
+    def path(self, rec: Recording) -> str:
+        if rec.status == RecordingStatus.UPLOADING:
+            return self._part_path(rec.id)
+        ext = os.path.splitext(rec.filename)[1].lower()
+        if ext not in MEDIA_TYPES:
+            ext = OTHER_EXT
+        return os.path.join(self.root, f"{rec.id}{ext}")
+
+
+    def enhanced_path(self, rec_id: str) -> str:
+        return os.path.join(self.root, f"{rec_id}.enhanced.wav")
+
+
+    def peaks_path(self, rec_id: str, enhanced: bool = False) -> str:
+        return os.path.join(self.root, f"{rec_id}.enhanced.peaks" if enhanced else f"{rec_id}.peaks")
+
+
+    # the file to play, merge or transcribe: the enhanced one once there is one
+    def audio_path(self, rec: Recording) -> str:
+        if rec.status == RecordingStatus.ENHANCED:
+            return self.enhanced_path(rec.id)
+        return self.path(rec)
+
+
+    def _save(self, rec: Recording):
+        tmp = self._meta_path(rec.id) + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(rec.model_dump_json())
+        os.replace(tmp, self._meta_path(rec.id))
+
+
+    def _create_files(self, rec: Recording):
+        os.makedirs(self.root, exist_ok=True)
+        open(self._part_path(rec.id), "wb").close()
+        self._save(rec)
+
+
+    # reads the sidecars back after a restart
+    def load(self):
+        os.makedirs(self.root, exist_ok=True)
+        for entry in os.listdir(self.root):
+            if not entry.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.root, entry), encoding="utf-8") as f:
+                    rec = Recording.model_validate(json.load(f))
+            except (OSError, ValueError, ValidationError) as e:
+                print(f"[recordings] skipping {entry}: {e}")
+                continue
+            if rec.status == RecordingStatus.UPLOADING:
+                part = self._part_path(rec.id)
+                rec.received = os.path.getsize(part) if os.path.exists(part) else 0
+            elif rec.status == RecordingStatus.PROCESSING:
+                # its enhancement died with the previous process
+                enhanced = os.path.exists(self.enhanced_path(rec.id))
+                rec.status = RecordingStatus.ENHANCED if enhanced else RecordingStatus.ORIGINAL
+                self._save(rec)
+            self._recordings[rec.id] = rec
+
+
+    async def create(
+        self,
+        req: RecordingCreateRequest,
+        created: int,
+        session_name: Optional[str] = None,
+        theta: Optional[float] = None
+    ) -> Recording:
+        rec = Recording(
+            id=str(uuid.uuid4()),
+            session_id=req.session_id,
+            session_name=session_name,
+            filename=os.path.basename(req.filename),
+            size=req.size,
+            sha256=req.sha256.lower() if req.sha256 else None,
+            trigger_time=req.trigger_time,
+            theta=theta,
+            client_theta=req.client_theta,
+            created=created
+        )
+        await self._run(self._create_files, rec)
+
+        async with self._lock:
+            self._recordings[rec.id] = rec
+            self._uploads[rec.id] = Upload(rec, hashlib.sha256())
+        if rec.size == 0:
+            await self._finish(self._uploads[rec.id])
+        return rec.model_copy()
+
+
+    async def get(self, rec_id: str) -> Optional[Recording]:
+        async with self._lock:
+            rec = self._recordings.get(rec_id)
+            return rec.model_copy() if rec else None
+
+
+    async def list(self) -> List[Recording]:
+        async with self._lock:
+            return [r.model_copy() for r in self._recordings.values()]
+
+
+    async def update(self, rec_id: str, **changes) -> Optional[Recording]:
+        async with self._lock:
+            rec = self._recordings.get(rec_id)
+            if not rec:
+                return None
+            for field, value in changes.items():
+                setattr(rec, field, value)
+            rec = rec.model_copy()
+        await self._run(self._save, rec)
+        return rec
+
+
+    async def delete(self, rec_id: str) -> bool:
+        async with self._lock:
+            rec = self._recordings.pop(rec_id, None)
+            self._uploads.pop(rec_id, None)
+        if not rec:
+            return False
+        await self._run(self._remove_files, rec)
+        return True
+
+
+    def _remove_files(self, rec: Recording):
+        for p in (
+            self.path(rec),
+            self._part_path(rec.id),
+            self.enhanced_path(rec.id),
+            self.peaks_path(rec.id),
+            self.peaks_path(rec.id, enhanced=True),
+            self._meta_path(rec.id)
+        ):
+            try:
+                os.remove(p)
+            except FileNotFoundError:
+                pass
+
+
+    async def delete_all(self) -> int:
+        async with self._lock:
+            ids = list(self._recordings)
+        return sum([await self.delete(rec_id) for rec_id in ids])
+
+
+    # the upload of an unfinished recording, rebuilding the hash state from
+    # the partial file if the server restarted in between
+    async def _upload(self, rec_id: str) -> Upload:
+        async with self._lock:
+            rec = self._recordings.get(rec_id)
+            if not rec:
+                raise UploadError(404, "recording not found")
+            if rec.status != RecordingStatus.UPLOADING:
+                raise UploadError(409, "upload already complete", offset=rec.received)
+            upload = self._uploads.get(rec_id)
+            if upload:
+                return upload
+
+        hasher, received = await self._run(self._rehash, self._part_path(rec_id))
+        async with self._lock:
+            upload = self._uploads.get(rec_id)
+            if not upload:
+                rec.received = received
+                upload = self._uploads[rec_id] = Upload(rec, hasher)
+            return upload
+
+
+    @staticmethod
+    def _rehash(part: str):
+        hasher = hashlib.sha256()
+        received = 0
+        with open(part, "rb") as f:
+            while block := f.read(CHUNK_SIZE):
+                hasher.update(block)
+                received += len(block)
+        return hasher, received
+
+
+    # appends the body stream at `start`, which must be the current offset.
+    # A chunk whose bytes don't match chunk_sha256 is rolled back.
+    async def write(
+        self,
+        rec_id: str,
+        stream: AsyncIterator[bytes],
+        content_range: Optional[str] = None,
+        chunk_sha256: Optional[str] = None
+    ) -> Recording:
+        upload = await self._upload(rec_id)
+        if upload.lock.locked():
+            raise UploadError(409, "another upload to this recording is in progress", offset=upload.rec.received)
+
+        async with upload.lock:
+            rec = upload.rec
+            start, end = rec.received, None
+            if content_range:
+                start, end, total = parse_content_range(content_range)
+                if rec.size is None and total is not None:
+                    # the rest of a live take whose stream broke off
+                    if total < rec.received:
+                        raise UploadError(400, f"total size {total} < {rec.received} already received", offset=rec.received)
+                    rec.size = total
+                if total is not None and total != rec.size:
+                    raise UploadError(400, f"total size {total} != {rec.size}", offset=rec.received)
+                if rec.size is not None and end >= rec.size:
+                    raise UploadError(416, "range past end of file", offset=rec.received)
+            if rec.size is None:
+                raise UploadError(400, "size unknown, send Content-Range with the total", offset=rec.received)
+            if start != rec.received:
+                raise UploadError(409, "range does not start at the upload offset", offset=rec.received)
+
+            limit = (end + 1 if end is not None else rec.size) - start
+            self._admit(limit, start)
+            try:
+                await self._ingest(upload, stream, start, limit, chunk_sha256)
+            finally:
+                self._release(limit)
+
+            if rec.received == rec.size:
+                await self._finish(upload)
+            return rec.model_copy()
+
+
+    async def _ingest(
+        self,
+        upload: Upload,
+        stream: AsyncIterator[bytes],
+        start: int,
+        limit: int,
+        chunk_sha256: Optional[str]
+    ):
+        rec = upload.rec
+        checkpoint = upload.hasher.copy()
+        chunk_hasher = hashlib.sha256() if chunk_sha256 else None
+        hashers = [upload.hasher] + ([chunk_hasher] if chunk_hasher else [])
+
+        written = 0
+        def advance(n: int):
+            nonlocal written
+            written += n
+
+        f = await self._run(open, self._part_path(rec.id), "r+b")
+        try:
+            await self._run(f.seek, start)
+            async for block in _rechunk(stream, CHUNK_SIZE):
+                if written + len(block) > limit:
+                    raise UploadError(413, "body longer than the declared range", offset=start)
+                await self._write(f, block, hashers, advance)
+            if chunk_hasher and chunk_hasher.hexdigest() != chunk_sha256.lower():
+                raise UploadError(422, "chunk checksum mismatch", offset=start)
+            await self._run(f.flush)
+        except UploadError:
+            await self._run(f.close)
+            await self._run(self._truncate, rec.id, start)
+            upload.hasher = checkpoint
+            rec.received = start
+            raise
+        except BaseException:
+            # client went away mid chunk, keep what made it to disk and was hashed
+            await self._run(f.close)
+            await self._run(self._truncate, rec.id, start + written)
+            rec.received = start + written
+            raise
+        await self._run(f.close)
+        rec.received = start + written
+
+
+    # writes and hashes a block in a worker thread, then calls on_written. The
+    # thread can't be stopped: a cancelled caller waits for it, so the offset
+    # still matches the file and the hash when the cancellation goes on.
+    async def _write(self, f, block: bytes, hashers: list, on_written: Callable[[int], None]):
+        async def write():
+            began = time.perf_counter()
+            await self._run(_write_block, f, block, hashers)
+            self._observe(len(block), time.perf_counter() - began)
+            on_written(len(block))
+
+        task = asyncio.ensure_future(write())
+        try:
+            await asyncio.shield(task)
+        except asyncio.CancelledError:
+            await asyncio.wait([task])
+            if not task.cancelled():
+                task.exception() # the cancellation is what the caller sees
+            raise
+
+
+    # a live take: the recorder streams the file while it records and the
+    # caller appends it (see backend.live). The upload stays locked, so a PUT
+    # can't interleave, until end_live.
+    async def begin_live(self, rec_id: str) -> Upload:
+        upload = await self._upload(rec_id)
+        if upload.lock.locked():
+            raise UploadError(409, "another upload to this recording is in progress", offset=upload.rec.received)
+        await upload.lock.acquire()
+        return upload
+
+
+    async def open_part(self, upload: Upload):
+        f = await self._run(open, self._part_path(upload.rec.id), "r+b")
+        await self._run(f.seek, upload.rec.received)
+        return f
+
+
+    async def append(self, upload: Upload, f, block: bytes):
+        rec = upload.rec
+        if rec.size is not None and rec.received + len(block) > rec.size:
+            raise UploadError(413, "more bytes than the declared size", offset=rec.received)
+        def advance(n: int):
+            rec.received += n
+        await self._write(f, block, [upload.hasher], advance)
+
+
+    # size (and sha256) come with the end of the take; without them the take
+    # stays resumable with HEAD and PUT
+    async def end_live(
+        self,
+        upload: Upload,
+        f,
+        size: Optional[int] = None,
+        sha256: Optional[str] = None
+    ) -> Recording:
+        rec = upload.rec
+        try:
+            await self._run(f.close)
+            if size is not None:
+                if size < rec.received:
+                    raise UploadError(400, f"size {size} < {rec.received} already received", offset=rec.received)
+                rec.size = size
+                rec.sha256 = sha256.lower() if sha256 else rec.sha256
+            if rec.size is not None and rec.received == rec.size:
+                await self._finish(upload)
+            else:
+                await self._run(self._save, rec)
+            return rec.model_copy()
+        finally:
+            upload.lock.release()
+
+
+    def _truncate(self, rec_id: str, offset: int):
+        with open(self._part_path(rec_id), "r+b") as f:
+            f.truncate(offset)
+
+
+    async def _finish(self, upload: Upload):
+        rec = upload.rec
+        digest = upload.hasher.hexdigest()
+        async with self._lock:
+            self._uploads.pop(rec.id, None)
+
+        if rec.sha256 and rec.sha256 != digest:
+            print(f"[recordings] checksum mismatch for {rec.id}")
+            rec.status = RecordingStatus.FAILED
+            await self._run(self._save, rec)
+        else:
+            rec.sha256 = digest
+            rec.status = RecordingStatus.ORIGINAL
+            await self._run(self._complete_files, rec)
+
+
+    def _complete_files(self, rec: Recording):
+        os.replace(self._part_path(rec.id), self.path(rec))
+        self._save(rec)
+
+
+
+def _write_block(f, block: bytes, hashers: list):
+    f.write(block)
+    for h in hashers:
+        h.update(block)
+
+
+# regroups an incoming byte stream into blocks of `size` bytes
+async def _rechunk(stream: AsyncIterator[bytes], size: int) -> AsyncIterator[bytes]:
+    buf = bytearray()
+    async for piece in stream:
+        buf += piece
+        while len(buf) >= size:
+            yield bytes(buf[:size])
+            del buf[:size]
+    if buf:
+        yield bytes(buf)
@@ -0,0 +1,384 @@
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+import asyncio
+import json
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from pydantic import BaseModel
+from backend.recordings import JobStatus, Recording
+
+
+MODEL_NAME = "small"
+CPU_THREADS_PER_WORKER = 2
+SENTINEL_TIMEOUT_S = 5 # to drain segments still queued after a job returned
+
+# what workers report on the events queue, each as (job id, kind, ...)
+_STARTED = "started"
+_SEGMENT = "segment" # + start, end, text
+_DRAINED = "drained" # the last one of a job
+
+
+class TranscriptSegment(BaseModel):
+    job_id: str
+    recording_id: str
+    start: float # seconds into the recording
+    end: float
+    text: str
+
+
+class TranscriptJob(BaseModel):
+    id: str
+    recording_id: str
+    status: JobStatus = JobStatus.QUEUED
+    language: Optional[str] = None
+    duration_s: Optional[float] = None
+    segments: int = 0
+    error: Optional[str] = None
+    created: int
+    finished: Optional[int] = None
+
+
+class Transcript(BaseModel):
+    job: TranscriptJob
+    segments: List[TranscriptSegment] = []
+
+
+class MergeTranscriptRequest(BaseModel):
+    recording_ids: Optional[List[str]] = None # None merges every finished recording
+    language: Optional[str] = "en"
+
+
+class TranscriptLine(BaseModel):
+    speaker: str
+    recording_id: str
+    start: float # seconds from the first sample of the earliest track
+    end: float
+    text: str
+
+
+# transcripts of several single-speaker tracks interleaved on the server clock
+class MergedTranscript(BaseModel):
+    id: str
+    status: JobStatus = JobStatus.QUEUED
+    recording_ids: List[str]
+    speakers: Dict[str, str] # recording id -> speaker label
+    origin_ms: Optional[float] = None # server time of t=0
+    lines: List[TranscriptLine] = []
+    error: Optional[str] = None
+    created: int
+    finished: Optional[int] = None
+
+
+
+############## worker process side ##############
+_model = None
+_events = None
+
+def _init_worker(model_name: str, cpu_threads: int, events):
+    global _model, _events
+    from faster_whisper import WhisperModel # heavy, and only needed in workers
+    _model = WhisperModel(model_name, device="cpu", compute_type="int8", cpu_threads=cpu_threads)
+    _events = events
+
+
+def _transcribe(job_id: str, path: str, language: Optional[str]):
+    assert _model is not None and _events is not None
+    _events.put((job_id, _STARTED))
+    try:
+        segments, info = _model.transcribe(
+            path,
+            beam_size=1,
+            language=language,
+            vad_filter=True,
+            vad_parameters=dict(min_silence_duration_ms=500)
+        )
+        # segments is a generator, each one is pushed as soon as it decodes
+        for seg in segments:
+            _events.put((job_id, _SEGMENT, seg.start, seg.end, seg.text.strip()))
+        return info.language, info.duration
+    finally:
+        _events.put((job_id, _DRAINED))
+
+
+
+############## server side ##############
+OnSegment = Callable[[TranscriptSegment], Awaitable[None]]
+OnJob = Callable[[TranscriptJob], Awaitable[None]]
+OnMerged = Callable[[MergedTranscript], Awaitable[None]]
+
+# keeps whisper loaded in a pool of worker processes. Jobs run in parallel,
+# one per worker, and their segments are handed to on_segment as they decode.
+class TranscriptionService:
+    def __init__(
+        self,
+        root: str,
+        on_segment: OnSegment,
+        on_job: OnJob,
+        on_merged: OnMerged,
+        workers: Optional[int] = None,
+        model_name: str = MODEL_NAME
+    ):
+        self.root = root
+        self.on_segment = on_segment
+        self.on_job = on_job
+        self.on_merged = on_merged
+        self.merged: Optional[MergedTranscript] = None
+        self.workers = workers or max(1, (os.cpu_count() or 1) // CPU_THREADS_PER_WORKER)
+        self.model_name = model_name
+
+        self._jobs: Dict[str, TranscriptJob] = {}
+        self._segments: Dict[str, List[TranscriptSegment]] = {}
+        self._drained: Dict[str, asyncio.Event] = {}
+        self._tasks: Dict[str, asyncio.Task] = {} # job id -> running job
+        self._notifications: Set[asyncio.Task] = set() # callbacks and merges in flight
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._events = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+    # the pool and its models are created on the first job, not at startup
+    def _ensure_pool(self) -> ProcessPoolExecutor:
+        if self._pool:
+            return self._pool
+        self._events = multiprocessing.get_context("spawn").Queue()
+        self._loop = asyncio.get_running_loop()
+        self._pool = self._new_pool()
+        threading.Thread(target=self._pump, args=(self._events,), daemon=True, name="transcript-pump").start()
+        return self._pool
+
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(self.model_name, CPU_THREADS_PER_WORKER, self._events)
+        )
+
+
+    # a worker that died (killed, out of memory) breaks the whole pool: the
+    # jobs in it fail and the next ones get a new pool
+    def _renew_pool(self, broken: ProcessPoolExecutor):
+        if self._pool is not broken:
+            return # another job already replaced it
+        print("[transcription] worker pool broke, starting a new one")
+        broken.shutdown(wait=False, cancel_futures=True)
+        self._pool = self._new_pool()
+
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._notifications.add(task)
+        task.add_done_callback(self._notifications.discard)
+
+
+    def _pump(self, events):
+        while True:
+            item = events.get()
+            if item is None:
+                return
+            assert self._loop
+            self._loop.call_soon_threadsafe(self._dispatch, *item)
+
+
+    def _dispatch(self, job_id: str, kind: str, *args):
+        job = self._jobs.get(job_id)
+        if not job:
+            return
+        if kind == _STARTED:
+            # queued until a worker picks it up
+            if job.status == JobStatus.QUEUED:
+                job.status = JobStatus.PROCESSING
+                self._spawn(self.on_job(job.model_copy()))
+            return
+        if kind == _DRAINED:
+            drained = self._drained.get(job_id)
+            if drained:
+                drained.set()
+            return
+
+        segments = self._segments.get(job_id)
+        if segments is None:
+            return # late, the job already ended and is being saved
+        start, end, text = args
+        seg = TranscriptSegment(job_id=job_id, recording_id=job.recording_id, start=start, end=end, text=text)
+        segments.append(seg)
+        job.segments += 1
+        self._spawn(self.on_segment(seg))
+
+
+    def _path(self, recording_id: str) -> str:
+        return os.path.join(self.root, f"{recording_id}.transcript.json")
+
+
+    # a recording already being transcribed returns its running job
+    async def submit(self, recording_id: str, path: str, language: Optional[str] = "en") -> TranscriptJob:
+        running = self._running(recording_id)
+        if running:
+            return running.model_copy()
+        job = TranscriptJob(id=str(uuid.uuid4()), recording_id=recording_id, created=int(time.time() * 1000))
+        self._jobs[job.id] = job
+        self._segments[job.id] = []
+        self._drained[job.id] = asyncio.Event()
+        task = self._tasks[job.id] = asyncio.create_task(self._run(job, path, language))
+        task.add_done_callback(lambda _: self._tasks.pop(job.id, None))
+        return job.model_copy()
+
+
+    async def _run(self, job: TranscriptJob, path: str, language: Optional[str]) -> TranscriptJob:
+        loop = asyncio.get_running_loop()
+        pool = self._ensure_pool()
+        await self.on_job(job.model_copy())
+
+        try:
+            try:
+                future = loop.run_in_executor(pool, _transcribe, job.id, path, language)
+            except BrokenProcessPool:
+                self._renew_pool(pool) # broke while idle, nothing was lost
+                pool = self._pool
+                future = loop.run_in_executor(pool, _transcribe, job.id, path, language)
+            try:
+                job.language, job.duration_s = await future
+            except BrokenProcessPool:
+                self._renew_pool(pool)
+                raise
+            try:
+                await asyncio.wait_for(self._drained[job.id].wait(), SENTINEL_TIMEOUT_S)
+            except asyncio.TimeoutError:
+                pass
+            job.status = JobStatus.DONE
+        except Exception as e:
+            print(f"[transcription] {job.recording_id} failed: {e}")
+            job.status = JobStatus.FAILED
+            job.error = str(e)
+
+        job.finished = int(time.time() * 1000)
+        self._drained.pop(job.id, None)
+        segments = self._segments.pop(job.id)
+        if job.status == JobStatus.DONE:
+            await asyncio.to_thread(self._save, job.recording_id, Transcript(job=job, segments=segments))
+        self._jobs.pop(job.id, None) # finished transcripts are read back from disk
+        await self.on_job(job.model_copy())
+        return job
+
+
+    # the finished transcript of a recording, transcribing it first if needed
+    async def complete(self, recording_id: str, path: str, language: Optional[str] = "en") -> Transcript:
+        transcript = await self.transcript(recording_id)
+        if not transcript or transcript.job.status == JobStatus.FAILED:
+            await self.submit(recording_id, path, language)
+            transcript = await self.transcript(recording_id)
+        assert transcript
+        if transcript.job.status in (JobStatus.QUEUED, JobStatus.PROCESSING):
+            job = await self._tasks[transcript.job.id]
+            if job.status != JobStatus.DONE:
+                raise RuntimeError(f"{recording_id}: {job.error}")
+            transcript = await self.transcript(recording_id)
+            assert transcript
+        return transcript
+
+
+    # transcribes every track at once, one per worker, so the wall time is
+    # about that of the longest track. Each track is one speaker, labeled by
+    # `speakers`, and placed on the server clock by Recording.start_ms().
+    async def merge(
+        self,
+        tracks: List[Tuple[Recording, str]],
+        speakers: Dict[str, str],
+        language: Optional[str] = "en"
+    ) -> MergedTranscript:
+        merged = MergedTranscript(
+            id=str(uuid.uuid4()),
+            recording_ids=[rec.id for rec, _ in tracks],
+            speakers=speakers,
+            created=int(time.time() * 1000)
+        )
+        self.merged = merged
+        self._spawn(self._merge(merged, tracks, language))
+        return merged.model_copy()
+
+
+    async def _merge(self, merged: MergedTranscript, tracks: List[Tuple[Recording, str]], language: Optional[str]):
+        merged.status = JobStatus.PROCESSING
+        await self.on_merged(merged.model_copy())
+
+        try:
+            transcripts = await asyncio.gather(*(
+                self.complete(rec.id, path, language) for rec, path in tracks
+            ))
+            starts = {rec.id: rec.start_ms() for rec, _ in tracks}
+            origin = min(starts.values(), default=0.0)
+            merged.origin_ms = origin
+            lines: List[TranscriptLine] = []
+            for (rec, _), transcript in zip(tracks, transcripts):
+                shift = (starts[rec.id] - origin) / 1000
+                lines += [
+                    TranscriptLine(
+                        speaker=merged.speakers[rec.id],
+                        recording_id=rec.id,
+                        start=round(seg.start + shift, 3),
+                        end=round(seg.end + shift, 3),
+                        text=seg.text
+                    )
+                    for seg in transcript.segments
+                ]
+            merged.lines = sorted(lines, key=lambda line: (line.start, line.end))
+            merged.status = JobStatus.DONE
+        except Exception as e:
+            print(f"[transcription] merge failed: {e}")
+            merged.status = JobStatus.FAILED
+            merged.error = str(e)
+
+        merged.finished = int(time.time() * 1000)
+        await self.on_merged(merged.model_copy())
+
+
+    def _save(self, recording_id: str, transcript: Transcript):
+        os.makedirs(self.root, exist_ok=True)
+        tmp = self._path(recording_id) + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(transcript.model_dump_json())
+        os.replace(tmp, self._path(recording_id))
+
+
+    def _running(self, recording_id: str) -> Optional[TranscriptJob]:
+        for job in self._jobs.values():
+            if job.recording_id == recording_id and job.status in (JobStatus.QUEUED, JobStatus.PROCESSING):
+                return job
+        return None
+
+
+    # the live transcript of a running job, or the saved one
+    async def transcript(self, recording_id: str) -> Optional[Transcript]:
+        job = self._running(recording_id)
+        if job:
+            return Transcript(job=job.model_copy(), segments=list(self._segments[job.id]))
+
+        path = self._path(recording_id)
+        if not os.path.exists(path):
+            return None
+        return await asyncio.to_thread(self._load, path)
+
+
+    @staticmethod
+    def _load(path: str) -> Transcript:
+        with open(path, encoding="utf-8") as f:
+            return Transcript.model_validate(json.load(f))
+
+
+    def delete(self, recording_id: str):
+        try:
+            os.remove(self._path(recording_id))
+        except FileNotFoundError:
+            pass
+
+
+    def close(self):
+        if self._pool:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+        if self._events:
+            self._events.put(None)
@@ -1,18 +1,65 @@
+import asyncio
+import ipaddress
+import os
 import random
 import socket
+import struct
 
-def get_local_ip() -> str:
-    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+NAMES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "server_names.txt")
+SIOCGIFADDR = 0x8915 # linux ioctl, the ipv4 address of an interface
+
+
+# ipv4 addresses of the local interfaces, without sending anything anywhere
+def _interface_ips() -> list:
+    ips = []
     try:
-        s.connect(("8.8.8.8", 80))
-        ip = s.getsockname()[0]
-    finally:
-        s.close()
-    return ip
+        import fcntl
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as s:
+            for _, name in socket.if_nameindex():
+                try:
+                    req = struct.pack("256s", name.encode()[:15])
+                    ips.append(socket.inet_ntoa(fcntl.ioctl(s.fileno(), SIOCGIFADDR, req)[20:24]))
+                except OSError:
+                    continue # down or without an ipv4 address
+    except (ImportError, OSError, AttributeError):
+        pass
+    if not ips:
+        # not linux: whatever the host name resolves to locally
+        try:
+            ips = [info[4][0] for info in socket.getaddrinfo(socket.gethostname(), None, socket.AF_INET)]
+        except OSError:
+            pass
+    return ips
+
+
+# the address recorders on the LAN reach this machine at: a private one if
+# there is one, else any non loopback one, else loopback
+def get_local_ip() -> str:
+    ips = [ipaddress.ip_address(ip) for ip in dict.fromkeys(_interface_ips())]
+    ips = [ip for ip in ips if not ip.is_loopback and not ip.is_link_local]
+    ips.sort(key=lambda ip: not ip.is_private)
+    return str(ips[0]) if ips else "127.0.0.1"
 
-def get_random_name(file_path="backend/server_names.txt") -> str:
+def get_random_name(file_path=NAMES_FILE) -> str:
     with open(file_path, "r", encoding="utf-8") as f:
         names = [line.strip() for line in f if line.strip()]
     if not names:
         return "VLServer"
     return random.choice(names)
+
+
+# fire and forget: the loop only keeps weak references to tasks, so this set
+# holds them until they finish, and a failure is logged instead of lost
+_background: set = set()
+
+def spawn(coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    _background.add(task)
+    task.add_done_callback(_finished)
+    return task
+
+
+def _finished(task: asyncio.Task):
+    _background.discard(task)
+    if not task.cancelled() and task.exception():
+        print(f"[error] background task {task.get_coro().__qualname__} failed: {task.exception()!r}")
@@ -0,0 +1,61 @@
+from typing import Dict, List, Optional
+import asyncio
+import os
+from pydantic import BaseModel
+
+
+MAX_WIDTH = 10_000
+
+
+class Waveform(BaseModel):
+    recording_id: str
+    sample_rate: int
+    samples_per_pixel: int
+    start: float # seconds, of the first pair
+    duration: float # seconds, of the whole recording
+    data: List[int] # min, max, min, max, ... in -128..127
+
+
+
+# builds every index once, however many requests ask for it meanwhile
+class WaveformStore:
+    def __init__(self):
+        self._pending: Dict[str, asyncio.Task] = {} # index path -> build
+
+
+    async def build(self, src: str, out: str):
+        task = self._pending.get(out)
+        if not task:
+            from backend.peaks import build_peaks # numpy, loaded by the first index
+            task = self._pending[out] = asyncio.create_task(asyncio.to_thread(build_peaks, src, out))
+            task.add_done_callback(lambda _: self._pending.pop(out, None))
+        await asyncio.shield(task)
+
+
+    async def get(
+        self,
+        rec_id: str,
+        src: str,
+        out: str,
+        start: float = 0,
+        end: Optional[float] = None,
+        width: int = 1000
+    ) -> Waveform:
+        from backend.peaks import read_peaks
+        if not os.path.exists(out) or os.path.getmtime(out) < os.path.getmtime(src):
+            await self.build(src, out)
+        try:
+            rate, spp, first, duration, data = await asyncio.to_thread(read_peaks, out, start, end, width)
+        except (OSError, ValueError) as e:
+            # a damaged or half written index is built again, once
+            print(f"[waveform] rebuilding {out}: {e}")
+            await self.build(src, out)
+            rate, spp, first, duration, data = await asyncio.to_thread(read_peaks, out, start, end, width)
+        return Waveform(
+            recording_id=rec_id,
+            sample_rate=rate,
+            samples_per_pixel=spp,
+            start=round(first, 6),
+            duration=round(duration, 6),
+            data=data.tolist()
+        )
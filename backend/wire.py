@@ -0,0 +1,76 @@
+from enum import Enum
+from typing import Any, Union
+import json
+import struct
+from fastapi import WebSocket, WebSocketDisconnect
+from pydantic import BaseModel
+
+try:
+    import msgpack
+except ImportError: # optional, only clients asking for it need it
+    msgpack = None
+
+
+# encoding of what the server sends on /ws/control, chosen by the client
+# with ?encoding= when it connects. What it receives is decoded by frame
+# type: text frames are json, binary frames msgpack.
+class Encoding(str, Enum):
+    JSON = "json"
+    MSGPACK = "msgpack"
+
+
+Frame = Union[str, bytes]
+
+
+class WireError(ValueError):
+    pass
+
+
+def available(enc: Encoding) -> bool:
+    return enc != Encoding.MSGPACK or msgpack is not None
+
+
+def encoding_of(ws: WebSocket) -> Encoding:
+    return Encoding.MSGPACK if ws.query_params.get("encoding") == Encoding.MSGPACK.value else Encoding.JSON
+
+
+def encode(payload: BaseModel, enc: Encoding) -> Frame:
+    if enc == Encoding.MSGPACK:
+        assert msgpack
+        return msgpack.packb(payload.model_dump(mode="json"))
+    return payload.model_dump_json()
+
+
+def decode(msg: dict) -> Any:
+    try:
+        if msg.get("bytes") is not None:
+            if msgpack is None:
+                raise WireError("msgpack is not installed")
+            return msgpack.unpackb(msg["bytes"])
+        return json.loads(msg.get("text") or "")
+    except WireError:
+        raise
+    except Exception as e:
+        raise WireError(f"undecodable frame: {e!r}") from e
+
+
+async def receive(ws: WebSocket) -> dict:
+    msg = await ws.receive()
+    if msg["type"] == "websocket.disconnect":
+        raise WebSocketDisconnect(msg.get("code", 1000))
+    return msg
+
+
+async def send(ws: WebSocket, frame: Frame):
+    if isinstance(frame, bytes):
+        await ws.send_bytes(frame)
+    else:
+        await ws.send_text(frame)
+
+
+
+# /ws/sync?encoding=binary: fixed little endian frames, no parsing at all.
+# Timestamps are in the channel's precision (ms, or us with ?precision=us).
+SYNC_PING = struct.Struct("<q") # client -> server: t1
+SYNC_PONG = struct.Struct("<qqq") # server -> client: t1, t2, t3
+SYNC_REPORT = struct.Struct("<dd") # client -> server: theta, rtt
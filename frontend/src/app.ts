@@ -1,6 +1,6 @@
 import { VERSION, URL } from './env.js';
 import { ws, sendPayload } from './websockets.js';
-import { ServerInfo, WSKind, WSEvents, WSActions, WSActionTarget, WSPayload, Payloads, SessionMetadata } from './types.js';
+import { ServerInfo, WSKind, WSEvents, WSActions, WSActionTarget, WSGroupStatus, WSPayload, Payloads, SessionMetadata, SessionBatch, DashboardControl, DashboardRole, LiveLevels } from './types.js';
 import { SessionCard, SessionState } from './components/SessionCard.js';
 import { button } from './components/button.js';
 
@@ -25,6 +25,7 @@ class VLApp {
 
   private activeRecordings: number = 0;
   private masterToggleBtn!: HTMLElement;
+  private readOnly: boolean = false; // a monitor dashboard
 
   constructor() {
     this.viewSelector.innerHTML = `
@@ -49,20 +50,52 @@ class VLApp {
 	private startMaster(): void {
 		this.masterToggleBtn.classList.replace("accent", "immutable");
 		this.masterToggleBtn.innerText = "Stop All";
+		const ids: string[] = [];
   	this.sessions.forEach((session) => {
   		if (session.state == SessionState.IDLE) {
-        sendPayload(Payloads.action(WSActions.START, session.meta.id))
+  			ids.push(session.meta.id);
   		}
   	});
+  	// one group action, so every recorder gets the same trigger time
+  	sendPayload(Payloads.group(WSActions.START_GROUP, ids));
 	}
 	private stopMaster(): void {
 		this.masterToggleBtn.classList.replace("immutable", "accent");
 		this.masterToggleBtn.innerText = "Start All";
+		const ids: string[] = [];
   	this.sessions.forEach((session) => {
   		if (session.state == SessionState.RECORDING) {
-        sendPayload(Payloads.action(WSActions.STOP, session.meta.id));
+  			ids.push(session.meta.id);
   		}
   	});
+  	sendPayload(Payloads.group(WSActions.STOP_GROUP, ids));
+	}
+
+	private onStarted(id: string): void {
+		const session = this.sessions.get(id);
+		session?.start();
+		if (this.activeRecordings == 0) {
+			this.masterToggleBtn.classList.replace("accent", "immutable");
+			this.masterToggleBtn.innerText = "Stop All";
+		}
+		this.activeRecordings++;
+	}
+
+	private onStopped(id: string): void {
+		const s = this.sessions.get(id);
+		s?.stop();
+		this.activeRecordings--
+		if (this.activeRecordings == 0) {
+			this.masterToggleBtn.classList.replace("immutable", "accent");
+			this.masterToggleBtn.innerText = "Start All";
+		}
+	}
+
+	private addSession(meta: SessionMetadata): SessionCard {
+		const session = new SessionCard(meta);
+		session.setReadOnly(this.readOnly);
+		this.sessions.set(meta.id, session);
+		return session;
 	}
 
   private setActiveMenuItem(state: Views = this.currentView): void {
@@ -293,7 +326,7 @@ class VLApp {
       const sessionsResponse = await fetch(URL + "/sessions");
 	    const sessions: SessionMetadata[] = await sessionsResponse.json();
 	    sessions.forEach(meta => {
-	        this.sessions.set(meta.id, new SessionCard(meta));
+	        this.addSession(meta);
 	    });
 
       this.renderSidebar(); 
@@ -316,8 +349,7 @@ class VLApp {
 	      case WSEvents.SESSION_ACTIVATED: {
 	        payload.body = payload.body as SessionMetadata;
 	        if (!this.sessions.has(payload.body.id)) {
-	          const s = new SessionCard(payload.body);
-	          this.sessions.set(payload.body.id, s);
+	          this.addSession(payload.body);
 	          this.syncView(Views.DASHBOARD);
 	        }
 	        break;
@@ -326,6 +358,22 @@ class VLApp {
 	        this.sessions.delete(payload.body.id);
 	        this.syncView(Views.DASHBOARD);
 	        break;
+	      } case WSEvents.SESSION_SUSPENDED: {
+	        // lost its connection, the recorder may still resume
+	        const meta = payload.body as SessionMetadata;
+	        this.sessions.get(meta.id)?.setSuspended(true);
+	        break;
+	      } case WSEvents.SESSION_RESUMED: {
+	        const meta = payload.body as SessionMetadata;
+	        const session = this.sessions.get(meta.id);
+	        if (session) {
+	          session.setSuspended(false);
+	          session.updateMeta(meta);
+	        } else {
+	          this.addSession(meta);
+	          this.syncView(Views.DASHBOARD);
+	        }
+	        break;
 	      } case WSEvents.SESSION_UPDATE: {
 	        payload.body = payload.body as SessionMetadata;
 					const session = this.sessions.get(payload.body.id);
@@ -333,6 +381,32 @@ class VLApp {
 						session.updateMeta(payload.body);
 					}
 	      	break;
+	      } case WSEvents.SESSION_BATCH: {
+	        const batch = payload.body as SessionBatch;
+	        batch.sessions.forEach(meta => this.sessions.get(meta.id)?.updateMeta(meta));
+	        break;
+	      } case WSEvents.LIVE_LEVELS: {
+	        const levels = payload.body as LiveLevels;
+	        this.sessions.get(levels.session_id)?.updateLevels(levels);
+	        break;
+	      } case WSEvents.DASHBOARD_CONTROL: {
+	        // monitors can watch but not start or stop anything
+	        const control = payload.body as DashboardControl;
+	        this.readOnly = control.role !== DashboardRole.CONTROLLER;
+	        this.masterToggleBtn.toggleAttribute("disabled", this.readOnly);
+	        this.sessions.forEach(session => session.setReadOnly(this.readOnly));
+	        break;
+	      } case WSEvents.GROUP_STATUS: {
+	        const status = payload.body as WSGroupStatus;
+	        if (status.action === WSActions.START_GROUP) {
+	          status.acked.forEach(id => this.onStarted(id));
+	        } else {
+	          status.acked.forEach(id => this.onStopped(id));
+	        }
+	        if (status.pending.length || status.failed.length) {
+	          console.warn("Group action incomplete:", status);
+	        }
+	      	break;
 	      } case "success": case "failed":
 	        console.log("Session result:", payload.msg_type, payload.body);
 	        break;
@@ -346,25 +420,11 @@ class VLApp {
 	    switch (payload.msg_type) {
 	      case WSActions.STARTED: {
 	      	payload.body = payload.body as WSActionTarget;
-	        const id = payload.body.session_id;
-	        const session = this.sessions.get(id);
-	        session?.start();
-	        if (this.activeRecordings == 0) {
-						this.masterToggleBtn.classList.replace("accent", "immutable");
-						this.masterToggleBtn.innerText = "Stop All";
-	        }
-	        this.activeRecordings++;
+	        this.onStarted(payload.body.session_id);
 	        break;
 	      } case WSActions.STOPPED: {
 	      	payload.body = payload.body as WSActionTarget;
-	        const id = payload.body.session_id;
-	        const s = this.sessions.get(id);
-	        s?.stop();
-	        this.activeRecordings--
-	        if (this.activeRecordings == 0) {
-						this.masterToggleBtn.classList.replace("immutable", "accent");
-						this.masterToggleBtn.innerText = "Start All";
-	        }
+	        this.onStopped(payload.body.session_id);
 	        break;
 	      } default:
 	        console.warn("Unhandled action:", payload.msg_type, payload);
@@ -1,4 +1,4 @@
-import { SessionMetadata, WSActions, Payloads } from "../types.js";
+import { SessionMetadata, LiveLevels, WSActions, Payloads } from "../types.js";
 import { circleButton } from "./circleButton.js";
 import { sendPayload } from "../websockets.js";
 import { StopWatch } from "./StopWatch.js";
@@ -17,11 +17,16 @@ class SessionCard {
   public card: HTMLElement;
   public micBtn: HTMLElement;
   private statusRow: HTMLElement;
+  private levelMeter: HTMLMeterElement;
   private stopWatch = new StopWatch();
+  private readOnly: boolean = false;
 
   constructor(meta: SessionMetadata) {
     this.meta = meta;
     this.micBtn = circleButton({iconName:"record-icon",onClick:() => {
+      if (this.readOnly) {
+        return;
+      }
       if (this.state === SessionState.IDLE) {
         this.notify(WSActions.START);
       } else if (this.state === SessionState.RECORDING) {
@@ -43,8 +48,15 @@ class SessionCard {
 
     this.statusRow = document.createElement('div');
     this.statusRow.classList.add('status-row');
-    this.statusRow.innerText = `🔋${meta.battery}%  📶${meta.last_rtt}ms`;
+    this.statusRow.innerText = this.statusText();
     left.appendChild(this.statusRow);
+
+    // peak level of the take as it streams in, in dBFS
+    this.levelMeter = document.createElement('meter');
+    this.levelMeter.classList.add('level');
+    Object.assign(this.levelMeter, { min: -60, max: 0, low: -18, high: -6, optimum: -30, value: -60 });
+    this.levelMeter.hidden = true;
+    left.appendChild(this.levelMeter);
     
     const right = document.createElement('div');
     right.classList.add('right');
@@ -73,6 +85,29 @@ class SessionCard {
     this.micBtn.classList.add('record-icon');
     this.card.classList.remove('border-recording');
     this.stopWatch.resetTimer();
+    this.levelMeter.hidden = true;
+  }
+
+  public updateLevels(levels: LiveLevels): void {
+    this.levelMeter.value = levels.peak_db;
+    this.levelMeter.title = `rms ${levels.rms_db} dB, peak ${levels.peak_db} dB`;
+    this.levelMeter.hidden = false;
+  }
+
+  public setSuspended(suspended: boolean): void {
+    this.card.classList.toggle('suspended', suspended);
+    this.card.title = suspended ? 'Connection lost, waiting for the recorder to resume' : '';
+  }
+
+  // a monitor dashboard shows the button but can't press it
+  public setReadOnly(readOnly: boolean): void {
+    this.readOnly = readOnly;
+    this.micBtn.classList.toggle('disabled', readOnly);
+  }
+
+  private statusText(): string {
+    const sync = Math.round((this.meta.sync_confidence ?? 0) * 100);
+    return `🔋${this.meta.battery}%  📶${this.meta.last_rtt}ms  ⏱${sync}%`;
   }
 
   public updateMeta(newMeta: SessionMetadata): void {
@@ -80,8 +115,10 @@ class SessionCard {
     this.meta.last_rtt = newMeta.last_rtt;
     this.meta.theta = newMeta.theta;
     this.meta.last_sync = newMeta.last_sync;
+    this.meta.drift_ppm = newMeta.drift_ppm;
+    this.meta.sync_confidence = newMeta.sync_confidence;
 
-    this.statusRow.innerText = `🔋${this.meta.battery}%  📶${this.meta.last_rtt}ms`;
+    this.statusRow.innerText = this.statusText();
   }
 }
 
@@ -18,10 +18,17 @@ export enum WSErrors {
 export enum WSEvents {
   DASHBOARD_INIT = "dashboard_init",
   DASHBOARD_RENAME = "dashboard_rename",
+  DASHBOARD_CONTROL = "dashboard_control",
   SESSION_UPDATE = "session_update",
   SESSION_ACTIVATE = "session_activate",
   SESSION_ACTIVATED = "session_activated",
   SESSION_LEFT = "session_left",
+  SESSION_SUSPENDED = "session_suspended",
+  SESSION_RESUME = "session_resume",
+  SESSION_RESUMED = "session_resumed",
+  SESSION_BATCH = "session_batch",
+  LIVE_LEVELS = "live_levels",
+  GROUP_STATUS = "group_status",
   SESSION_SELF_START = "session_self_start",
   SESSION_SELF_STOP = "session_self_stop",
   SUCCESS = "success",
@@ -33,6 +40,19 @@ export enum WSActions {
   STOP = "stop",
   STARTED = "started",
   STOPPED = "stopped",
+  START_GROUP = "start_group",
+  STOP_GROUP = "stop_group",
+}
+
+// open the dashboard with ?role=monitor for a read only view
+export enum DashboardRole {
+  CONTROLLER = "controller",
+  MONITOR = "monitor",
+}
+
+export interface DashboardControl {
+  role: DashboardRole;
+  dashboards: number;
 }
 
 export interface SessionMetadata {
@@ -44,6 +64,22 @@ export interface SessionMetadata {
   theta: number; 
   last_rtt: number; 
   last_sync?: number | null;
+  drift_ppm: number;
+  sync_confidence: number; // 0..1
+}
+
+// coalesced SESSION_UPDATEs, the latest metadata of each changed session
+export interface SessionBatch {
+  sessions: SessionMetadata[];
+}
+
+// levels of a take while it streams in
+export interface LiveLevels {
+  recording_id: string;
+  session_id: string;
+  rms_db: number;
+  peak_db: number;
+  received: number;
 }
 
 export interface ServerInfo {
@@ -63,8 +99,23 @@ export interface Rename {
 export interface WSActionTarget {
   session_id: string;
   trigger_time?: number | null;
+  theta?: number | null;
 }
-type WSBodyTypes = SessionMetadata | WSActionTarget | Rename | null;
+
+export interface WSGroupTarget {
+  session_ids: string[] | null; // null targets every active session
+  trigger_time?: number | null;
+}
+
+export interface WSGroupStatus {
+  action: WSActions;
+  trigger_time?: number | null;
+  acked: string[];
+  pending: string[];
+  failed: string[];
+  stale: string[];
+}
+type WSBodyTypes = SessionMetadata | SessionBatch | DashboardControl | LiveLevels | WSActionTarget | WSGroupTarget | WSGroupStatus | Rename | null;
 type WSMsgTypes = WSActions | WSEvents | WSErrors;
 
 export interface WSPayload {
@@ -81,6 +132,12 @@ export const Payloads = {
     body: { session_id, trigger_time: null }
   }),
 
+  group: (type: WSActions, session_ids: string[] | null = null): WSPayload => ({
+    kind: WSKind.ACTION,
+    msg_type: type,
+    body: { session_ids, trigger_time: null }
+  }),
+
   rename: (newName: string): WSPayload => ({
     kind: WSKind.ACTION,
     msg_type: WSEvents.DASHBOARD_RENAME,
@@ -2,7 +2,8 @@ import { URL } from "./env.js";
 import { Payloads, WSEvents, WSPayload } from "./types.js";
 
 
-export const ws = new WebSocket(`${URL.replace(/^http/, 'ws')}/ws/control`);
+const role = new URLSearchParams(location.search).get("role");
+export const ws = new WebSocket(`${URL.replace(/^http/, 'ws')}/ws/control${role ? `?role=${role}` : ""}`);
 ws.onopen = ():void => ws.send(JSON.stringify(Payloads.event(WSEvents.DASHBOARD_INIT)));
 
 
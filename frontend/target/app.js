@@ -1,6 +1,6 @@
 import { VERSION, URL } from './env.js';
 import { ws, sendPayload } from './websockets.js';
-import { WSKind, WSEvents, WSActions, Payloads } from './types.js';
+import { WSKind, WSEvents, WSActions, Payloads, DashboardRole } from './types.js';
 import { SessionCard, SessionState } from './components/SessionCard.js';
 import { button } from './components/button.js';
 export var Views;
@@ -19,6 +19,7 @@ class VLApp {
     viewSelector = document.createElement('menu');
     activeRecordings = 0;
     masterToggleBtn;
+    readOnly = false;
     constructor() {
         this.viewSelector.innerHTML = `
       <li data-key="${Views.DASHBOARD}">Dashboard</li>
@@ -41,20 +42,48 @@ class VLApp {
     startMaster() {
         this.masterToggleBtn.classList.replace("accent", "immutable");
         this.masterToggleBtn.innerText = "Stop All";
+        const ids = [];
         this.sessions.forEach((session) => {
             if (session.state == SessionState.IDLE) {
-                sendPayload(Payloads.action(WSActions.START, session.meta.id));
+                ids.push(session.meta.id);
             }
         });
+        sendPayload(Payloads.group(WSActions.START_GROUP, ids));
     }
     stopMaster() {
         this.masterToggleBtn.classList.replace("immutable", "accent");
         this.masterToggleBtn.innerText = "Start All";
+        const ids = [];
         this.sessions.forEach((session) => {
             if (session.state == SessionState.RECORDING) {
-                sendPayload(Payloads.action(WSActions.STOP, session.meta.id));
+                ids.push(session.meta.id);
             }
         });
+        sendPayload(Payloads.group(WSActions.STOP_GROUP, ids));
+    }
+    onStarted(id) {
+        const session = this.sessions.get(id);
+        session?.start();
+        if (this.activeRecordings == 0) {
+            this.masterToggleBtn.classList.replace("accent", "immutable");
+            this.masterToggleBtn.innerText = "Stop All";
+        }
+        this.activeRecordings++;
+    }
+    onStopped(id) {
+        const s = this.sessions.get(id);
+        s?.stop();
+        this.activeRecordings--;
+        if (this.activeRecordings == 0) {
+            this.masterToggleBtn.classList.replace("immutable", "accent");
+            this.masterToggleBtn.innerText = "Start All";
+        }
+    }
+    addSession(meta) {
+        const session = new SessionCard(meta);
+        session.setReadOnly(this.readOnly);
+        this.sessions.set(meta.id, session);
+        return session;
     }
     setActiveMenuItem(state = this.currentView) {
         const options = this.viewSelector.querySelectorAll('li');
@@ -271,7 +300,7 @@ class VLApp {
             const sessionsResponse = await fetch(URL + "/sessions");
             const sessions = await sessionsResponse.json();
             sessions.forEach(meta => {
-                this.sessions.set(meta.id, new SessionCard(meta));
+                this.addSession(meta);
             });
             this.renderSidebar();
             this.syncView(this.currentView);
@@ -291,8 +320,7 @@ class VLApp {
                 case WSEvents.SESSION_ACTIVATED: {
                     payload.body = payload.body;
                     if (!this.sessions.has(payload.body.id)) {
-                        const s = new SessionCard(payload.body);
-                        this.sessions.set(payload.body.id, s);
+                        this.addSession(payload.body);
                         this.syncView(Views.DASHBOARD);
                     }
                     break;
@@ -303,6 +331,24 @@ class VLApp {
                     this.syncView(Views.DASHBOARD);
                     break;
                 }
+                case WSEvents.SESSION_SUSPENDED: {
+                    const meta = payload.body;
+                    this.sessions.get(meta.id)?.setSuspended(true);
+                    break;
+                }
+                case WSEvents.SESSION_RESUMED: {
+                    const meta = payload.body;
+                    const session = this.sessions.get(meta.id);
+                    if (session) {
+                        session.setSuspended(false);
+                        session.updateMeta(meta);
+                    }
+                    else {
+                        this.addSession(meta);
+                        this.syncView(Views.DASHBOARD);
+                    }
+                    break;
+                }
                 case WSEvents.SESSION_UPDATE: {
                     payload.body = payload.body;
                     const session = this.sessions.get(payload.body.id);
@@ -311,6 +357,37 @@ class VLApp {
                     }
                     break;
                 }
+                case WSEvents.SESSION_BATCH: {
+                    const batch = payload.body;
+                    batch.sessions.forEach(meta => this.sessions.get(meta.id)?.updateMeta(meta));
+                    break;
+                }
+                case WSEvents.LIVE_LEVELS: {
+                    const levels = payload.body;
+                    this.sessions.get(levels.session_id)?.updateLevels(levels);
+                    break;
+                }
+                case WSEvents.DASHBOARD_CONTROL: {
+                    // monitors can watch but not start or stop anything
+                    const control = payload.body;
+                    this.readOnly = control.role !== DashboardRole.CONTROLLER;
+                    this.masterToggleBtn.toggleAttribute("disabled", this.readOnly);
+                    this.sessions.forEach(session => session.setReadOnly(this.readOnly));
+                    break;
+                }
+                case WSEvents.GROUP_STATUS: {
+                    const status = payload.body;
+                    if (status.action === WSActions.START_GROUP) {
+                        status.acked.forEach(id => this.onStarted(id));
+                    }
+                    else {
+                        status.acked.forEach(id => this.onStopped(id));
+                    }
+                    if (status.pending.length || status.failed.length) {
+                        console.warn("Group action incomplete:", status);
+                    }
+                    break;
+                }
                 case "success":
                 case "failed":
                     console.log("Session result:", payload.msg_type, payload.body);
@@ -324,26 +401,12 @@ class VLApp {
             switch (payload.msg_type) {
                 case WSActions.STARTED: {
                     payload.body = payload.body;
-                    const id = payload.body.session_id;
-                    const session = this.sessions.get(id);
-                    session?.start();
-                    if (this.activeRecordings == 0) {
-                        this.masterToggleBtn.classList.replace("accent", "immutable");
-                        this.masterToggleBtn.innerText = "Stop All";
-                    }
-                    this.activeRecordings++;
+                    this.onStarted(payload.body.session_id);
                     break;
                 }
                 case WSActions.STOPPED: {
                     payload.body = payload.body;
-                    const id = payload.body.session_id;
-                    const s = this.sessions.get(id);
-                    s?.stop();
-                    this.activeRecordings--;
-                    if (this.activeRecordings == 0) {
-                        this.masterToggleBtn.classList.replace("immutable", "accent");
-                        this.masterToggleBtn.innerText = "Start All";
-                    }
+                    this.onStopped(payload.body.session_id);
                     break;
                 }
                 default:
@@ -13,10 +13,15 @@ class SessionCard {
     card;
     micBtn;
     statusRow;
+    levelMeter;
     stopWatch = new StopWatch();
+    readOnly = false;
     constructor(meta) {
         this.meta = meta;
         this.micBtn = circleButton({ iconName: "record-icon", onClick: () => {
+                if (this.readOnly) {
+                    return;
+                }
                 if (this.state === SessionState.IDLE) {
                     this.notify(WSActions.START);
                 }
@@ -36,8 +41,14 @@ class SessionCard {
         `;
         this.statusRow = document.createElement('div');
         this.statusRow.classList.add('status-row');
-        this.statusRow.innerText = `🔋${meta.battery}%  📶${meta.last_rtt}ms`;
+        this.statusRow.innerText = this.statusText();
         left.appendChild(this.statusRow);
+        // peak level of the take as it streams in, in dBFS
+        this.levelMeter = document.createElement('meter');
+        this.levelMeter.classList.add('level');
+        Object.assign(this.levelMeter, { min: -60, max: 0, low: -18, high: -6, optimum: -30, value: -60 });
+        this.levelMeter.hidden = true;
+        left.appendChild(this.levelMeter);
         const right = document.createElement('div');
         right.classList.add('right');
         right.appendChild(this.stopWatch.element);
@@ -61,13 +72,33 @@ class SessionCard {
         this.micBtn.classList.add('record-icon');
         this.card.classList.remove('border-recording');
         this.stopWatch.resetTimer();
+        this.levelMeter.hidden = true;
+    }
+    updateLevels(levels) {
+        this.levelMeter.value = levels.peak_db;
+        this.levelMeter.title = `rms ${levels.rms_db} dB, peak ${levels.peak_db} dB`;
+        this.levelMeter.hidden = false;
+    }
+    setSuspended(suspended) {
+        this.card.classList.toggle('suspended', suspended);
+        this.card.title = suspended ? 'Connection lost, waiting for the recorder to resume' : '';
+    }
+    setReadOnly(readOnly) {
+        this.readOnly = readOnly;
+        this.micBtn.classList.toggle('disabled', readOnly);
+    }
+    statusText() {
+        const sync = Math.round((this.meta.sync_confidence ?? 0) * 100);
+        return `🔋${this.meta.battery}%  📶${this.meta.last_rtt}ms  ⏱${sync}%`;
     }
     updateMeta(newMeta) {
         this.meta.battery = newMeta.battery;
         this.meta.last_rtt = newMeta.last_rtt;
         this.meta.theta = newMeta.theta;
         this.meta.last_sync = newMeta.last_sync;
-        this.statusRow.innerText = `🔋${this.meta.battery}%  📶${this.meta.last_rtt}ms`;
+        this.meta.drift_ppm = newMeta.drift_ppm;
+        this.meta.sync_confidence = newMeta.sync_confidence;
+        this.statusRow.innerText = this.statusText();
     }
 }
 export { SessionState, SessionCard };
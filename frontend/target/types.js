@@ -16,10 +16,17 @@ export var WSEvents;
 (function (WSEvents) {
     WSEvents["DASHBOARD_INIT"] = "dashboard_init";
     WSEvents["DASHBOARD_RENAME"] = "dashboard_rename";
+    WSEvents["DASHBOARD_CONTROL"] = "dashboard_control";
     WSEvents["SESSION_UPDATE"] = "session_update";
     WSEvents["SESSION_ACTIVATE"] = "session_activate";
     WSEvents["SESSION_ACTIVATED"] = "session_activated";
     WSEvents["SESSION_LEFT"] = "session_left";
+    WSEvents["SESSION_SUSPENDED"] = "session_suspended";
+    WSEvents["SESSION_RESUME"] = "session_resume";
+    WSEvents["SESSION_RESUMED"] = "session_resumed";
+    WSEvents["SESSION_BATCH"] = "session_batch";
+    WSEvents["LIVE_LEVELS"] = "live_levels";
+    WSEvents["GROUP_STATUS"] = "group_status";
     WSEvents["SESSION_SELF_START"] = "session_self_start";
     WSEvents["SESSION_SELF_STOP"] = "session_self_stop";
     WSEvents["SUCCESS"] = "success";
@@ -31,7 +38,15 @@ export var WSActions;
     WSActions["STOP"] = "stop";
     WSActions["STARTED"] = "started";
     WSActions["STOPPED"] = "stopped";
+    WSActions["START_GROUP"] = "start_group";
+    WSActions["STOP_GROUP"] = "stop_group";
 })(WSActions || (WSActions = {}));
+// open the dashboard with ?role=monitor for a read only view
+export var DashboardRole;
+(function (DashboardRole) {
+    DashboardRole["CONTROLLER"] = "controller";
+    DashboardRole["MONITOR"] = "monitor";
+})(DashboardRole || (DashboardRole = {}));
 export var RESTEvents;
 (function (RESTEvents) {
 })(RESTEvents || (RESTEvents = {}));
@@ -41,6 +56,11 @@ export const Payloads = {
         msg_type: type,
         body: { session_id, trigger_time: null }
     }),
+    group: (type, session_ids = null) => ({
+        kind: WSKind.ACTION,
+        msg_type: type,
+        body: { session_ids, trigger_time: null }
+    }),
     rename: (newName) => ({
         kind: WSKind.ACTION,
         msg_type: WSEvents.DASHBOARD_RENAME,
@@ -1,6 +1,7 @@
 import { URL } from "./env.js";
 import { Payloads, WSEvents } from "./types.js";
-export const ws = new WebSocket(`${URL.replace(/^http/, 'ws')}/ws/control`);
+const role = new URLSearchParams(location.search).get("role");
+export const ws = new WebSocket(`${URL.replace(/^http/, 'ws')}/ws/control${role ? `?role=${role}` : ""}`);
 ws.onopen = () => ws.send(JSON.stringify(Payloads.event(WSEvents.DASHBOARD_INIT)));
 export const sendPayload = (payload) => {
     if (ws.readyState === WebSocket.OPEN) {
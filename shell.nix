@@ -14,6 +14,9 @@ pkgs.mkShell {
     python3Packages.faster-whisper
     python3Packages.pillow
     python3Packages.pydub
+    python3Packages.numpy
+    python3Packages.msgpack
+    ffmpeg
     ty
     ruff
     vscode-css-languageserver
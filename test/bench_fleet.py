@@ -0,0 +1,516 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime
+import httpx
+import websockets
+
+# A fleet of simulated recorders against one server: each stages, activates,
+# keeps a sync loop going with its own skewed clock, acks START/STOP and
+# "starts recording" at trigger_time on its clock. Reports control message
+# throughput, START delivery latency, trigger skew, how fast the whole fleet
+# resumes after dropping its control sockets at once, and the server's cpu
+# and memory per session.
+#
+#   python test/bench_fleet.py -n 500 -o before.json --pid <server pid>
+#   python test/bench_fleet.py -n 500 -o after.json --spawn --compare before.json
+#   python test/bench_fleet.py --compare before.json after.json
+#
+# The whole fleet runs in this one process, so at high counts latencies
+# include the bench's own loop: compare runs on the same machine and size.
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+
+SYNC_INTERVAL_S = 1.0 # between pings of one recorder
+SYNC_WINDOW = 8 # pings the offset estimate is taken from, the lowest rtt wins
+MAX_CLOCK_OFFSET_MS = 500 # each recorder's clock is off the host's by up to this
+GROUP_TIMEOUT_S = 10.0
+NOISE = 0.05 # relative change below which a comparison calls it even
+
+# metric -> True if higher is better, for --compare
+DIRECTION = {
+    "join_s": False,
+    "control_msgs_per_s": True,
+    "start_latency_ms.p50": False,
+    "start_latency_ms.p99": False,
+    "ack_complete_ms.p50": False,
+    "ack_complete_ms.p99": False,
+    "trigger_skew_ms.p50": False,
+    "trigger_skew_ms.max": False,
+    "trigger_error_ms.p50": False,
+    "trigger_error_ms.p99": False,
+    "missed_triggers": False,
+    "resume_ms.p50": False,
+    "resume_ms.p99": False,
+    "resume_failures": False,
+    "sync_rtt_ms.p50": False,
+    "sync_rtt_ms.p99": False,
+    "server_cpu_pct": False,
+    "server_cpu_ms_per_session_s": False,
+    "server_rss_mb": False,
+    "server_rss_kb_per_session": False,
+}
+
+
+def log(msg):
+    print(f"[{datetime.now().strftime('%H:%M:%S')}] {msg}")
+
+
+def pct(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def summary(values, *qs):
+    out = {f"p{int(q * 100)}": pct(values, q) for q in qs}
+    out["max"] = max(values) if values else None
+    return out
+
+
+
+# ---------------------------------------------------
+# SERVER PROCESS: cpu and memory from /proc
+# ---------------------------------------------------
+
+class ServerProcess:
+    def __init__(self, pid):
+        self.pid = pid
+        self.ticks = os.sysconf("SC_CLK_TCK")
+
+
+    def cpu_s(self):
+        with open(f"/proc/{self.pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / self.ticks # utime + stime
+
+
+    def rss_bytes(self):
+        with open(f"/proc/{self.pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+        return 0
+
+
+def spawn_server(port):
+    cmd = [sys.executable, "-m", "uvicorn", "backend.main:api", "--port", str(port), "--log-level", "warning"]
+    return subprocess.Popen(cmd, cwd=ROOT)
+
+
+async def wait_for_server(base, timeout=20):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                (await client.get(f"{base}/dashboard")).raise_for_status()
+                return
+            except httpx.HTTPError:
+                await asyncio.sleep(0.2)
+    raise RuntimeError(f"server at {base} did not come up")
+
+
+# sum of every series of a metric family in /metrics, None if the server has none
+async def scrape(client, base, name):
+    try:
+        r = await client.get(f"{base}/metrics")
+    except httpx.HTTPError:
+        return None
+    if r.status_code != 200:
+        return None
+    total, found = 0.0, False
+    for line in r.text.splitlines():
+        if line.startswith(name + "{") or line.startswith(name + " "):
+            total += float(line.rsplit(" ", 1)[1])
+            found = True
+    return total if found else None
+
+
+
+# ---------------------------------------------------
+# SIMULATED RECORDER
+# ---------------------------------------------------
+
+class Recorder:
+    def __init__(self, fleet, index):
+        self.fleet = fleet
+        self.name = f"Bench-{index + 1}"
+        self.id = None
+        self.token = None
+        self.control = None
+        self.offset_ms = random.uniform(-MAX_CLOCK_OFFSET_MS, MAX_CLOCK_OFFSET_MS)
+        self.samples = [] # (rtt, theta) in ms
+        self.tasks = []
+
+
+    # this recorder's own, wrong, clock
+    def local_ms(self):
+        return time.time() * 1000 + self.offset_ms
+
+
+    def theta_ms(self):
+        if not self.samples:
+            return 0.0
+        return min(self.samples)[1]
+
+
+    async def join(self, client):
+        meta = {"id": "placeholder", "name": self.name, "ip": "127.0.0.1", "battery": 100, "device": "bench"}
+        r = await client.post(f"{self.fleet.base}/sessions", json={"event": "session_stage", "body": meta})
+        r.raise_for_status()
+        self.id = meta["id"] = r.json()["body"]["id"]
+        self.token = r.json().get("resume_token")
+
+        self.control = await websockets.connect(f"{self.fleet.ws}/ws/control", max_queue=None)
+        await self.control.send(json.dumps({"kind": "event", "msg_type": "session_activate", "body": meta}))
+        self.tasks = [
+            asyncio.create_task(self.run_control()),
+            asyncio.create_task(self.run_sync()),
+        ]
+
+
+    async def run_sync(self):
+        async with websockets.connect(f"{self.fleet.ws}/ws/sync/{self.id}?precision=us") as ws:
+            await asyncio.sleep(random.uniform(0, SYNC_INTERVAL_S))
+            while True:
+                t1 = int(self.local_ms() * 1000)
+                await ws.send(json.dumps({"t1": t1}))
+                reply = json.loads(await ws.recv())
+                t4 = int(self.local_ms() * 1000)
+                t2, t3 = reply["t2"], reply["t3"]
+                rtt = ((t4 - t1) - (t3 - t2)) / 1000
+                theta = ((t2 - t1) + (t3 - t4)) / 2 / 1000
+                self.fleet.sync_rtts.append(rtt)
+                self.samples = (self.samples + [(rtt, theta)])[-SYNC_WINDOW:]
+                await ws.send(json.dumps({"theta": self.theta_ms() * 1000, "rtt": rtt * 1000}))
+                await asyncio.sleep(SYNC_INTERVAL_S)
+
+
+    async def run_control(self):
+        async for raw in self.control:
+            arrived = time.time() * 1000
+            msg = json.loads(raw)
+            kind = msg.get("msg_type")
+            if kind == "start":
+                trigger = msg["body"].get("trigger_time")
+                self.fleet.on_start(self, arrived, trigger)
+                await self.ack("started")
+                if trigger is not None:
+                    asyncio.create_task(self.fire(trigger))
+            elif kind == "stop":
+                await self.ack("stopped")
+
+
+    async def ack(self, msg_type):
+        await self.control.send(json.dumps({"kind": "action", "msg_type": msg_type, "body": {"session_id": self.id}}))
+
+
+    # starts when the local clock reads trigger - theta, as a real recorder
+    # does, and notes when that was on the host clock
+    async def fire(self, trigger):
+        wait = (trigger - self.theta_ms() - self.local_ms()) / 1000
+        if wait > 0:
+            await asyncio.sleep(wait)
+        self.fleet.on_fire(self, time.time() * 1000, trigger)
+
+
+    async def chatter(self, until, hz):
+        meta = {"id": self.id, "name": self.name, "ip": "127.0.0.1", "device": "bench"}
+        await asyncio.sleep(random.uniform(0, 1 / hz))
+        while time.monotonic() < until:
+            meta["battery"] = random.randint(1, 100)
+            await self.control.send(json.dumps({"kind": "event", "msg_type": "session_update", "body": meta}))
+            self.fleet.sent += 1
+            await asyncio.sleep(1 / hz)
+
+
+    # drops the control socket, as a flaky access point does, and takes the
+    # session back with its token. ms until resumed, None if refused.
+    async def blip(self):
+        self.tasks[0].cancel()
+        await self.control.close()
+        began = time.perf_counter()
+        self.control = await websockets.connect(f"{self.fleet.ws}/ws/control", max_queue=None)
+        body = {"session_id": self.id, "resume_token": self.token}
+        await self.control.send(json.dumps({"kind": "event", "msg_type": "session_resume", "body": body}))
+        reply = json.loads(await self.control.recv())
+        if reply.get("msg_type") != "session_resumed":
+            return None
+        self.tasks[0] = asyncio.create_task(self.run_control())
+        return (time.perf_counter() - began) * 1000
+
+
+    async def close(self):
+        for task in self.tasks:
+            task.cancel()
+        await self.control.close()
+
+
+
+# ---------------------------------------------------
+# FLEET + DASHBOARD
+# ---------------------------------------------------
+
+class Fleet:
+    def __init__(self, base, ws):
+        self.base = base
+        self.ws = ws
+        self.recorders = []
+        self.sync_rtts = []
+        self.sent = 0
+        self.round_sent = 0.0
+        self.latencies = []
+        self.arrivals = {} # recorder -> (arrived, trigger) of this round
+        self.fires = {}
+        self.dashboard = None
+        self.statuses = asyncio.Queue()
+
+
+    def on_start(self, rec, arrived, trigger):
+        self.latencies.append(arrived - self.round_sent)
+        self.arrivals[rec] = (arrived, trigger)
+
+
+    def on_fire(self, rec, at, trigger):
+        self.fires[rec] = at
+
+
+    async def connect_dashboard(self):
+        self.dashboard = await websockets.connect(f"{self.ws}/ws/control", max_queue=None)
+        await self.dashboard.send(json.dumps({"kind": "event", "msg_type": "dashboard_init"}))
+        asyncio.create_task(self._read_dashboard())
+
+
+    async def _read_dashboard(self):
+        try:
+            async for raw in self.dashboard:
+                msg = json.loads(raw)
+                if msg.get("msg_type") == "group_status":
+                    await self.statuses.put((time.time() * 1000, msg["body"]))
+        except websockets.ConnectionClosed as e:
+            log(f"[warn] dashboard closed: {e}") # 1013 means the bench read too slowly
+
+
+    async def group(self, action):
+        while not self.statuses.empty():
+            self.statuses.get_nowait()
+        self.round_sent = time.time() * 1000
+        await self.dashboard.send(json.dumps({"kind": "action", "msg_type": action, "body": {"session_ids": None}}))
+        while True:
+            at, status = await asyncio.wait_for(self.statuses.get(), GROUP_TIMEOUT_S)
+            if status["action"] == action:
+                return at - self.round_sent, status
+
+
+    async def round(self):
+        self.arrivals, self.fires = {}, {}
+        done_ms, status = await self.group("start_group")
+        triggers = [t for _, t in self.arrivals.values() if t is not None]
+        if triggers:
+            # wait until every recorder should have fired
+            await asyncio.sleep(max(0, (max(triggers) - time.time() * 1000) / 1000) + MAX_CLOCK_OFFSET_MS / 1000 * 0.1 + 0.5)
+        fires = list(self.fires.values())
+        errors = [abs(self.fires[r] - t) for r, (_, t) in self.arrivals.items() if r in self.fires]
+        missed = sum(1 for a, t in self.arrivals.values() if t is not None and a > t)
+        await asyncio.sleep(0.2)
+        await self.group("stop_group")
+        return {
+            "ack_ms": done_ms,
+            "acked": len(status["acked"]),
+            "skew_ms": (max(fires) - min(fires)) if fires else None,
+            "errors_ms": errors,
+            "missed": missed,
+        }
+
+
+
+# ---------------------------------------------------
+# RUN
+# ---------------------------------------------------
+
+async def run(args):
+    base = f"http://{args.host}:{args.port}"
+    ws = f"ws://{args.host}:{args.port}"
+    proc = spawn_server(args.port) if args.spawn else None
+    try:
+        await wait_for_server(base)
+        pid = proc.pid if proc else args.pid
+        server = ServerProcess(pid) if pid else None
+        return await measure(args, base, ws, server)
+    finally:
+        if proc:
+            proc.terminate()
+            proc.wait()
+
+
+async def measure(args, base, ws, server):
+    fleet = Fleet(base, ws)
+    results = {"meta": {
+        "recorders": args.recorders,
+        "rounds": args.rounds,
+        "commit": subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True).stdout.strip(),
+        "time": datetime.now().isoformat(timespec="seconds"),
+    }}
+    rss_before = server.rss_bytes() if server else None
+
+    limits = httpx.Limits(max_connections=args.concurrency)
+    async with httpx.AsyncClient(timeout=30, limits=limits) as client:
+        await fleet.connect_dashboard()
+
+        log(f"joining {args.recorders} recorders")
+        began = time.perf_counter()
+        fleet.recorders = [Recorder(fleet, i) for i in range(args.recorders)]
+        gate = asyncio.Semaphore(args.concurrency)
+        async def join(rec):
+            async with gate:
+                await rec.join(client)
+        await asyncio.gather(*(join(rec) for rec in fleet.recorders))
+        results["join_s"] = round(time.perf_counter() - began, 3)
+
+        log(f"letting clocks settle for {args.settle:.0f}s")
+        await asyncio.sleep(args.settle)
+
+        log(f"chatter: session updates at {args.update_hz} Hz per recorder for {args.duration:.0f}s")
+        fleet.sync_rtts.clear()
+        handled_before = await scrape(client, base, "vocalink_control_dispatch_seconds_count")
+        cpu_before = server.cpu_s() if server else None
+        began = time.perf_counter()
+        until = time.monotonic() + args.duration
+        await asyncio.gather(*(rec.chatter(until, args.update_hz) for rec in fleet.recorders))
+        elapsed = time.perf_counter() - began
+        handled_after = await scrape(client, base, "vocalink_control_dispatch_seconds_count")
+        if handled_before is not None and handled_after is not None:
+            results["control_msgs_per_s"] = round((handled_after - handled_before) / elapsed, 1)
+        else:
+            results["control_msgs_per_s"] = round(fleet.sent / elapsed, 1) # sent, the server has no /metrics
+        if server:
+            cpu = server.cpu_s() - cpu_before
+            results["server_cpu_pct"] = round(100 * cpu / elapsed, 1)
+            results["server_cpu_ms_per_session_s"] = round(1000 * cpu / elapsed / args.recorders, 3)
+        results["sync_rtt_ms"] = summary(fleet.sync_rtts, 0.5, 0.99)
+
+        log(f"{args.rounds} START/STOP rounds")
+        rounds = []
+        for i in range(args.rounds):
+            rounds.append(await fleet.round())
+            log(f"round {i + 1}: acked {rounds[-1]['acked']}/{args.recorders}, skew {rounds[-1]['skew_ms']} ms")
+        results["start_latency_ms"] = summary(fleet.latencies, 0.5, 0.99)
+        results["ack_complete_ms"] = summary([r["ack_ms"] for r in rounds], 0.5, 0.99)
+        results["trigger_skew_ms"] = summary([r["skew_ms"] for r in rounds if r["skew_ms"] is not None], 0.5)
+        results["trigger_error_ms"] = summary([e for r in rounds for e in r["errors_ms"]], 0.5, 0.99)
+        results["missed_triggers"] = sum(r["missed"] for r in rounds)
+
+        if args.blip:
+            log("blip: every recorder drops its control socket at once and resumes")
+            times = await asyncio.gather(*(rec.blip() for rec in fleet.recorders))
+            results["resume_ms"] = summary([t for t in times if t is not None], 0.5, 0.99)
+            results["resume_failures"] = sum(t is None for t in times)
+
+        if server:
+            rss = server.rss_bytes()
+            results["server_rss_mb"] = round(rss / (1 << 20), 1)
+            results["server_rss_kb_per_session"] = round((rss - rss_before) / 1024 / args.recorders, 1)
+
+        await fleet.dashboard.close()
+        await asyncio.gather(*(rec.close() for rec in fleet.recorders), return_exceptions=True)
+    return results
+
+
+
+# ---------------------------------------------------
+# REPORT + COMPARE
+# ---------------------------------------------------
+
+def flatten(results):
+    flat = {}
+    for key, value in results.items():
+        if key == "meta":
+            continue
+        if isinstance(value, dict):
+            for sub, v in value.items():
+                flat[f"{key}.{sub}"] = v
+        else:
+            flat[key] = value
+    return flat
+
+
+def fmt(v):
+    return "-" if v is None else f"{v:.3f}".rstrip("0").rstrip(".") if isinstance(v, float) else str(v)
+
+
+def report(results):
+    meta = results["meta"]
+    print(f"\n{meta['recorders']} recorders, {meta['rounds']} rounds @ {meta['commit']} ({meta['time']})")
+    for key, value in flatten(results).items():
+        print(f"{key:<32} {fmt(value):>12}")
+
+
+def compare(old, new):
+    print(f"\n{'metric':<32} {old['meta']['commit']:>12} {new['meta']['commit']:>12} {'change':>9}")
+    a, b = flatten(old), flatten(new)
+    for key in [k for k in b if k in a] + [k for k in a if k not in b]:
+        before, after = a.get(key), b.get(key)
+        verdict, change = "", ""
+        if isinstance(before, (int, float)) and isinstance(after, (int, float)) and before:
+            rel = (after - before) / abs(before)
+            change = f"{rel * 100:+.1f}%"
+            if key in DIRECTION and abs(rel) >= NOISE:
+                verdict = "better" if (rel > 0) == DIRECTION[key] else "worse"
+        print(f"{key:<32} {fmt(before):>12} {fmt(after):>12} {change:>9} {verdict}")
+    if old["meta"]["recorders"] != new["meta"]["recorders"]:
+        print("\n[warn] runs used different fleet sizes, per session figures compare best")
+
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Simulated recorder fleet against a VocalLink server")
+    parser.add_argument("-n", "--recorders", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=5, help="START/STOP group rounds")
+    parser.add_argument("--duration", type=float, default=10, help="seconds of session update chatter")
+    parser.add_argument("--update-hz", type=float, default=2, help="session updates per recorder and second")
+    parser.add_argument("--settle", type=float, default=3, help="seconds of syncing before measuring")
+    parser.add_argument("--concurrency", type=int, default=50, help="recorders joining at once")
+    parser.add_argument("--no-blip", dest="blip", action="store_false", help="skip the drop and resume storm")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=6210)
+    parser.add_argument("--spawn", action="store_true", help="start the server from this checkout and measure it")
+    parser.add_argument("--pid", type=int, help="server process to measure cpu and memory of, without --spawn")
+    parser.add_argument("-o", "--out", help="write the results as json")
+    parser.add_argument("--compare", nargs="+", metavar="RESULTS",
+                        help="compare a saved run with this one, or two saved runs without running")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.compare and len(args.compare) == 2:
+        old, new = (json.load(open(p)) for p in args.compare)
+        compare(old, new)
+        return
+
+    # two sockets per recorder
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (max(soft, min(hard, 4 * args.recorders + 256)), hard))
+
+    results = asyncio.run(run(args))
+    report(results)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=2)
+        log(f"results written to {args.out}")
+    if args.compare:
+        compare(json.load(open(args.compare[0])), results)
+
+
+if __name__ == "__main__":
+    try:
+        main()
+    except KeyboardInterrupt:
+        log("Shutting down fleet...")
@@ -0,0 +1,60 @@
+import asyncio
+import sys
+import os
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from backend.protocols import SessionsHandler, SessionMetadata
+
+SESSION_COUNTS = [1, 10, 100, 1_000, 10_000]
+LOOKUPS = 20_000
+
+
+class FakeWS:
+    pass
+
+
+def make_meta(i: int) -> SessionMetadata:
+    return SessionMetadata(
+        id=f"session-{i}",
+        name=f"Client-{i}",
+        ip="127.0.0.1",
+        device="bench"
+    )
+
+
+# ---------------------------------------------------
+# per-message sender identification cost
+# ---------------------------------------------------
+
+async def bench_session_id(count: int) -> float:
+    sessions = SessionsHandler()
+    sockets = []
+
+    for i in range(count):
+        meta = make_meta(i)
+        ws = FakeWS()
+        await sessions.stage(meta)
+        await sessions.commit(meta.id, ws)
+        sockets.append(ws)
+
+    # the last activated recorder is the worst case for a linear scan
+    ws = sockets[-1]
+    start = time.perf_counter()
+    for _ in range(LOOKUPS):
+        await sessions.session_id(ws)
+    elapsed = time.perf_counter() - start
+
+    return elapsed / LOOKUPS * 1_000_000
+
+
+async def main():
+    print(f"{'sessions':>10} {'us/lookup':>12}")
+    for count in SESSION_COUNTS:
+        us = await bench_session_id(count)
+        print(f"{count:>10} {us:>12.3f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,45 +1,27 @@
-from pydub import AudioSegment
-import os
-
-# ----------------------------------------
-# MAIN PROGRAM
-# ----------------------------------------
-print("Enter audio file names (comma-separated):")
-files = [f.strip() for f in input().split(",")]
-
-audios = []
-
-print("⏳ Loading audio files...")
-for f in files:
-    audios.append(AudioSegment.from_file(f))
-
-# ----------------------------------------
-# FIND LONGEST AUDIO
-# ----------------------------------------
-max_length = max(len(audio) for audio in audios)
-
-# ----------------------------------------
-# CREATE BASE SILENCE (so nothing is cut)
-# ----------------------------------------
-mixed_audio = AudioSegment.silent(duration=max_length)
-
-# ----------------------------------------
-# CONVERGE (MIX ALL FULLY)
-# ----------------------------------------
-print("🔊 Mixing all audios fully at the same time...")
-
-for audio in audios:
-    mixed_audio = mixed_audio.overlay(audio)
-
-# Optional: normalize to avoid clipping
-mixed_audio = mixed_audio.normalize()
-
-# ----------------------------------------
-# SAVE OUTPUT (NO PLAYBACK)
-# ----------------------------------------
-output_name = input("Enter output file name (with extension): ")
-output_format = os.path.splitext(output_name)[1][1:]
-
-mixed_audio.export(output_name, format=output_format)
-
-print(f"✅ Converged audio saved as: {output_name}")
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from backend.merge import Track
+from backend.mixdown import merge_tracks
+
+# ----------------------------------------
+# MAIN PROGRAM
+# ----------------------------------------
+print("Enter audio file names (comma-separated):")
+files = [f.strip() for f in input().split(",")]
+
+# no trigger times here, so every file starts at t=0 and cross-correlation
+# corrects whatever offset is left between them
+tracks = [Track(f, f, 0.0) for f in files]
+
+output_name = input("Enter output file name (.wav): ")
+
+print("🔊 Aligning and mixing...")
+result = merge_tracks(tracks, output_name, refine=True)
+
+for f, ms in result.offsets_ms.items():
+    print(f"  {f}: starts at {ms:.1f} ms")
+
+print(f"✅ Converged audio saved as: {output_name} ({result.duration_s:.1f} s in {result.elapsed_s:.1f} s)")
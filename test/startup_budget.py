@@ -0,0 +1,119 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+import httpx
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+
+BUDGET_S = 1.0 # process start to the first answered request
+HEAVY = ("numpy", "qrcode", "PIL", "zeroconf", "faster_whisper") # loaded on first use, never at startup
+RUNS = 5
+
+# runs in a fresh interpreter: times importing and building the app, and
+# fails any connect to a non loopback address while doing so
+PROBE = """
+import json, socket, sys, time
+t0 = time.perf_counter()
+connects = []
+_connect = socket.socket.connect
+def connect(self, address):
+    if isinstance(address, tuple) and not str(address[0]).startswith("127."):
+        connects.append(str(address))
+    return _connect(self, address)
+socket.socket.connect = connect
+
+import backend.main
+t1 = time.perf_counter()
+backend.main.create_app()
+t2 = time.perf_counter()
+print(json.dumps({
+    "import_s": t1 - t0,
+    "create_s": t2 - t1,
+    "heavy": [m for m in HEAVY if m in sys.modules],
+    "connects": connects,
+}))
+"""
+
+
+def log(msg):
+    print(f"[{datetime.now().strftime('%H:%M:%S')}] {msg}")
+
+
+
+# ---------------------------------------------------
+# IN PROCESS: import + create_app
+# ---------------------------------------------------
+
+def probe():
+    code = f"HEAVY = {HEAVY!r}\n" + PROBE
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+
+# ---------------------------------------------------
+# COLD START: uvicorn until /dashboard answers
+# ---------------------------------------------------
+
+def cold_start(port, timeout=10.0):
+    began = time.perf_counter()
+    cmd = [sys.executable, "-m", "uvicorn", "backend.main:api", "--port", str(port), "--log-level", "warning"]
+    proc = subprocess.Popen(cmd, cwd=ROOT)
+    try:
+        with httpx.Client(timeout=1) as client:
+            while time.perf_counter() - began < timeout:
+                try:
+                    if client.get(f"http://127.0.0.1:{port}/dashboard").status_code == 200:
+                        return time.perf_counter() - began
+                except httpx.HTTPError:
+                    pass
+                if proc.poll() is not None:
+                    raise RuntimeError(f"server exited with {proc.returncode}")
+                time.sleep(0.01)
+        raise RuntimeError(f"server did not answer within {timeout}s")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fails if the server starts slower than its budget")
+    parser.add_argument("--budget", type=float, default=BUDGET_S, help="seconds from process start to first response")
+    parser.add_argument("--runs", type=int, default=RUNS)
+    parser.add_argument("--port", type=int, default=6219)
+    args = parser.parse_args()
+
+    failures = []
+    probes = [probe() for _ in range(args.runs)]
+    imports = statistics.median(p["import_s"] for p in probes)
+    creates = statistics.median(p["create_s"] for p in probes)
+    log(f"import backend.main: {imports * 1000:.0f}ms, create_app: {creates * 1000:.1f}ms (median of {args.runs})")
+
+    heavy = sorted({m for p in probes for m in p["heavy"]})
+    if heavy:
+        failures.append(f"loaded at startup: {', '.join(heavy)}")
+    connects = sorted({c for p in probes for c in p["connects"]})
+    if connects:
+        failures.append(f"connected out at startup: {', '.join(connects)}")
+
+    colds = [cold_start(args.port) for _ in range(args.runs)]
+    cold = statistics.median(colds)
+    log(f"cold start to first response: {cold * 1000:.0f}ms median, {max(colds) * 1000:.0f}ms worst, budget {args.budget * 1000:.0f}ms")
+    if cold > args.budget:
+        failures.append(f"cold start {cold * 1000:.0f}ms over the {args.budget * 1000:.0f}ms budget")
+
+    for failure in failures:
+        log(f"[FAIL] {failure}")
+    if failures:
+        sys.exit(1)
+    log("[OK] within budget")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+import asyncio
+import hashlib
+import json
+import os
+import random
+import sys
+import time
+import httpx
+import websockets
+from datetime import datetime
+
+BASE = "http://localhost:6210"
+WS = "ws://localhost:6210"
+
+CLIENTS = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+FILE_MB = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+PUT_SIZE = 4 << 20 # bytes per PUT, a dropped PUT resumes from HEAD
+
+
+def log(msg):
+    print(f"[{datetime.now().strftime('%H:%M:%S')}] {msg}")
+
+
+# ---------------------------------------------------
+# STAGE + ACTIVATE (same as tester.py)
+# ---------------------------------------------------
+
+async def join(client, name):
+    meta = {
+        "id": "placeholder",
+        "name": name,
+        "ip": "127.0.0.1",
+        "battery": random.randint(40, 100),
+        "device": "loadtest",
+    }
+    r = await client.post(f"{BASE}/sessions", json={"event": "session_stage", "body": meta})
+    r.raise_for_status()
+    meta["id"] = r.json()["body"]["id"]
+
+    ws = await websockets.connect(f"{WS}/ws/control")
+    await ws.send(json.dumps({"kind": "event", "msg_type": "session_activate", "body": meta}))
+    return meta["id"], ws
+
+
+# ---------------------------------------------------
+# UPLOAD WITH BACKOFF AND RESUME
+# ---------------------------------------------------
+
+async def upload(client, session_id, name, data, stats):
+    r = await client.post(f"{BASE}/recordings", json={
+        "session_id": session_id,
+        "filename": f"{name}.wav",
+        "size": len(data),
+        "sha256": hashlib.sha256(data).hexdigest()
+    })
+    r.raise_for_status()
+    rec_id = r.json()["id"]
+
+    offset = 0
+    while offset < len(data):
+        end = min(offset + PUT_SIZE, len(data)) - 1
+        r = await client.put(
+            f"{BASE}/recordings/{rec_id}",
+            content=data[offset:end + 1],
+            headers={"Content-Range": f"bytes {offset}-{end}/{len(data)}"}
+        )
+        if r.status_code == 429:
+            stats["throttled"] += 1
+            await asyncio.sleep(int(r.headers.get("retry-after", "1")))
+            continue
+        if r.status_code >= 400:
+            stats["errors"] += 1
+            offset = int((await client.head(f"{BASE}/recordings/{rec_id}")).headers["upload-offset"])
+            continue
+        offset = r.json()["received"]
+
+    status = r.json()["status"]
+    log(f"[{name}] upload {status}")
+    return status == "original"
+
+
+# ---------------------------------------------------
+# SYNC PROBE: the event loop must keep answering pings
+# ---------------------------------------------------
+
+async def sync_probe(session_id, done, rtts):
+    async with websockets.connect(f"{WS}/ws/sync/{session_id}") as ws:
+        while not done.is_set():
+            t1 = time.perf_counter()
+            await ws.send(json.dumps({"t1": int(time.time() * 1000)}))
+            await ws.recv()
+            rtts.append((time.perf_counter() - t1) * 1000)
+            await asyncio.sleep(0.05)
+
+
+def pct(values, q):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def main():
+    log(f"{CLIENTS} recorders uploading {FILE_MB} MB each")
+    stats = {"throttled": 0, "errors": 0}
+    data = os.urandom(FILE_MB << 20)
+
+    async with httpx.AsyncClient(timeout=120) as client:
+        joined = [await join(client, f"Client-{i + 1}") for i in range(CLIENTS)]
+
+        done = asyncio.Event()
+        rtts = []
+        probe = asyncio.create_task(sync_probe(joined[0][0], done, rtts))
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*(
+            upload(client, sid, f"Client-{i + 1}", data, stats)
+            for i, (sid, _) in enumerate(joined)
+        ))
+        elapsed = time.perf_counter() - start
+
+        done.set()
+        await probe
+        for _, ws in joined:
+            await ws.close()
+
+    total_mb = CLIENTS * FILE_MB
+    print()
+    print(f"completed    {sum(results)}/{CLIENTS}")
+    print(f"elapsed      {elapsed:.2f} s")
+    print(f"throughput   {total_mb / elapsed:.1f} MB/s")
+    print(f"throttled    {stats['throttled']} (429)")
+    print(f"errors       {stats['errors']}")
+    if rtts:
+        print(f"sync rtt     p50 {pct(rtts, 0.5):.2f} ms  p99 {pct(rtts, 0.99):.2f} ms  max {max(rtts):.2f} ms")
+
+
+if __name__ == "__main__":
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        log("Shutting down clients...")